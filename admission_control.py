@@ -0,0 +1,260 @@
+import os
+import math
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Any, Tuple
+
+from judge_metrics import metrics
+from code_executor import CancelToken
+
+# How long a judge queue depth reading is reused before it is queried again
+QUEUE_DEPTH_TTL = 1.0
+# Retry-After for requests turned away because every execution slot is busy
+BUSY_RETRY_AFTER = 2
+# Buckets kept before idle (full) ones are dropped
+MAX_TRACKED_BUCKETS = 10000
+# How long a new run waits for the run it superseded to release its slot
+SUPERSEDE_WAIT_SECONDS = 1.0
+
+
+class AdmissionRejected(Exception):
+    """A run or submission was turned away; retry_after is in whole seconds"""
+    
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = max(1, int(retry_after))
+
+
+def parse_rate(text: str) -> Tuple[int, float]:
+    """Parse a rate like "10/60" (10 requests per 60 seconds) into (count, seconds)"""
+    count, _, seconds = text.partition('/')
+    return int(count), float(seconds or 60)
+
+
+class RateLimiter:
+    """Per-key token buckets: capacity requests, refilled evenly over period seconds"""
+    
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.refill_per_second = capacity / period if period > 0 else float('inf')
+        self._buckets = {}
+        self._lock = threading.Lock()
+    
+    def acquire(self, key) -> float:
+        """Take a token for key; returns 0 on success, else seconds until one is available"""
+        if self.capacity <= 0:
+            return 0.0  # Unlimited
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.refill_per_second)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) / self.refill_per_second
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > MAX_TRACKED_BUCKETS:
+                self._forget_idle(now)
+        return 0.0
+    
+    def _forget_idle(self, now: float):
+        full_after = self.capacity / self.refill_per_second
+        for key, (tokens, updated) in list(self._buckets.items()):
+            if now - updated >= full_after:
+                del self._buckets[key]
+
+
+class AdmissionController:
+    """Admission control for judge work in this process.
+    
+    Executions share max_in_flight slots. Judging a submission may use every
+    slot and waits for one to free up; exploratory runs may only use the slots
+    left after reserved_for_submissions, never take a slot while a submission
+    is waiting for one, and are refused once the judge queue is backed up past
+    run_queue_limit. Runs and submissions are also rate limited per user. A
+    refusal raises AdmissionRejected immediately, so overload turns into fast
+    429s instead of requests piling up behind the sandbox.
+    
+    The slots, the submission priority and the rate limits are kept in memory
+    and cover this process only: each process runs submissions on its own
+    sandbox pool, so N processes admit up to N x max_in_flight executions and
+    a user gets the rate limits once per process. A submission only holds
+    back runs of its own process, i.e. runs in a web process whose embedded
+    judge workers are waiting; standalone judge_worker.py processes take no
+    runs. The queue limits are read from the database and hold across
+    processes.
+    """
+    
+    def __init__(self, max_in_flight: int = 4, reserved_for_submissions: int = 1,
+                 run_rate: Tuple[int, float] = (10, 60), submit_rate: Tuple[int, float] = (5, 60),
+                 max_queued: int = 500, run_queue_limit: int = 50):
+        self.max_in_flight = max_in_flight
+        self.run_slots = max(1, max_in_flight - reserved_for_submissions)
+        self.max_queued = max_queued
+        self.run_queue_limit = run_queue_limit
+        self.run_limiter = RateLimiter(*run_rate)
+        self.submit_limiter = RateLimiter(*submit_rate)
+        self.in_flight = 0
+        self.waiting_submissions = 0
+        self.rejected = {'rate_limited': 0, 'busy': 0, 'queue_full': 0}
+        self._condition = threading.Condition()
+        self._queue_depth = (0, 0.0)
+    
+    def _reject(self, reason: str, message: str, retry_after: float):
+        with self._condition:
+            self.rejected[reason] += 1
+        raise AdmissionRejected(message, math.ceil(retry_after))
+    
+    def _pending(self, queue_depth: Callable[[], int]) -> int:
+        """Judge queue depth, re-read at most every QUEUE_DEPTH_TTL seconds"""
+        depth, read_at = self._queue_depth
+        now = time.monotonic()
+        if now - read_at >= QUEUE_DEPTH_TTL:
+            depth = queue_depth()
+            self._queue_depth = (depth, now)
+        return depth
+    
+    @contextmanager
+    def admit_run(self, user_id, queue_depth: Callable[[], int]):
+        """Hold an execution slot for an exploratory run, or raise AdmissionRejected"""
+        if self._pending(queue_depth) >= self.run_queue_limit:
+            self._reject('queue_full', 'The judge is busy with submissions; try running again shortly',
+                         BUSY_RETRY_AFTER)
+        with self._condition:
+            admitted = self.waiting_submissions == 0 and self.in_flight < self.run_slots
+            if admitted:
+                self.in_flight += 1
+        if not admitted:
+            self._reject('busy', 'The judge is busy; try running again shortly', BUSY_RETRY_AFTER)
+        
+        # Rate limited last, so a run turned away for load does not use up a token
+        wait = self.run_limiter.acquire(user_id)
+        if wait:
+            self._release()
+            self._reject('rate_limited', f'Too many runs; try again in {math.ceil(wait)}s', wait)
+        try:
+            yield
+        finally:
+            self._release()
+    
+    def admit_submission(self, user_id, queue_depth: Callable[[], int]):
+        """Check that a submission may be queued, or raise AdmissionRejected"""
+        if self._pending(queue_depth) >= self.max_queued:
+            self._reject('queue_full', 'The judge queue is full; try submitting again shortly',
+                         BUSY_RETRY_AFTER)
+        wait = self.submit_limiter.acquire(user_id)
+        if wait:
+            self._reject('rate_limited', f'Too many submissions; try again in {math.ceil(wait)}s', wait)
+    
+    @contextmanager
+    def judge_slot(self):
+        """Hold an execution slot while judging a submission, waiting for one if needed"""
+        with self._condition:
+            self.waiting_submissions += 1
+            try:
+                while self.in_flight >= self.max_in_flight:
+                    self._condition.wait()
+            finally:
+                self.waiting_submissions -= 1
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            self._release()
+    
+    def _release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'scope': 'process',
+                'pid': os.getpid(),
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'run_slots': self.run_slots,
+                'waiting_submissions': self.waiting_submissions,
+                'rejected': dict(self.rejected)
+            }
+
+
+class RunTracker:
+    """The in-flight sample run of each (user, problem) in this process.
+    
+    Starting a run cancels the one it supersedes: its process group is killed,
+    the rest of its batch is skipped, and the newer run waits briefly for the
+    older one to give its execution slot back.
+    """
+    
+    def __init__(self):
+        self.superseded = 0
+        self._runs = {}
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def track(self, user_id, problem_id):
+        """Yield a CancelToken for a new run, cancelling the previous run for the same problem"""
+        key = (user_id, problem_id)
+        token = CancelToken()
+        finished = threading.Event()
+        with self._lock:
+            previous = self._runs.get(key)
+            self._runs[key] = (token, finished)
+            if previous is not None:
+                self.superseded += 1
+        if previous is not None:
+            previous[0].cancel()
+            previous[1].wait(SUPERSEDE_WAIT_SECONDS)
+        try:
+            yield token
+        finally:
+            finished.set()
+            with self._lock:
+                if self._runs.get(key, (None,))[0] is token:
+                    del self._runs[key]
+    
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._runs)
+
+
+# Global controller instance (one per process)
+admission_controller = None
+_controller_lock = threading.Lock()
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Return this process's admission controller, configured from the environment
+    
+    The per-process limits are JUDGE_PROCESS_MAX_IN_FLIGHT (default: CPU
+    count), JUDGE_PROCESS_RESERVED_SLOTS (1), JUDGE_PROCESS_RUN_RATE ("10/60")
+    and JUDGE_PROCESS_SUBMIT_RATE ("5/60"; a count of 0 disables a rate limit);
+    size them for the number of processes on a host. The queue limits,
+    JUDGE_MAX_QUEUED (500) and JUDGE_RUN_QUEUE_LIMIT (50), are global.
+    """
+    global admission_controller
+    with _controller_lock:
+        if admission_controller is None:
+            admission_controller = AdmissionController(
+                max_in_flight=int(os.environ.get('JUDGE_PROCESS_MAX_IN_FLIGHT', str(os.cpu_count() or 2))),
+                reserved_for_submissions=int(os.environ.get('JUDGE_PROCESS_RESERVED_SLOTS', '1')),
+                run_rate=parse_rate(os.environ.get('JUDGE_PROCESS_RUN_RATE', '10/60')),
+                submit_rate=parse_rate(os.environ.get('JUDGE_PROCESS_SUBMIT_RATE', '5/60')),
+                max_queued=int(os.environ.get('JUDGE_MAX_QUEUED', '500')),
+                run_queue_limit=int(os.environ.get('JUDGE_RUN_QUEUE_LIMIT', '50'))
+            )
+            metrics.register_gauge('judge_admission_in_flight', 'Judge executions currently admitted in this process',
+                                   lambda: admission_controller.in_flight)
+            for reason in admission_controller.rejected:
+                metrics.register_gauge(f'judge_admission_rejected_{reason}',
+                                       f'Requests refused by this process\'s admission control ({reason}) since start',
+                                       lambda reason=reason: admission_controller.rejected[reason])
+    return admission_controller
+
+
+# Global run tracker instance (one per process)
+run_tracker = RunTracker()
+metrics.register_gauge('judge_runs_superseded', 'Sample runs cancelled by a newer run since start',
+                       lambda: run_tracker.superseded)
@@ -0,0 +1,215 @@
+"""
+Judge throughput and latency benchmark
+
+Runs the reference submissions in benchmarks/submissions through
+CodeExecutor (with a warm worker pool unless --pool-size is 0) and prints a
+JSON report with tests/sec, submissions/sec and latency percentiles, overall
+and per language and expected verdict.
+
+    python benchmarks/judge_benchmark.py --concurrency 4 --rounds 3 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Any
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from code_executor import CodeExecutor  # noqa: E402
+from sandbox_pool import WarmWorkerPool, ConcurrencyLimits  # noqa: E402
+
+SUBMISSIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'submissions')
+
+LANGUAGE_EXTENSIONS = {'python': 'py', 'java': 'java', 'c': 'c', 'cpp': 'cpp'}
+
+# Reference submission name -> verdict the judge must produce for it
+CASE_VERDICTS = {
+    'ac': 'accepted',
+    'wa': 'wrong_answer',
+    'tle': 'time_limit_exceeded',
+    're': 'runtime_error',
+    'mle': 'memory_limit_exceeded',
+    'ce': 'compilation_error'
+}
+
+
+def load_submissions(languages: List[str], cases: List[str]) -> List[Dict[str, str]]:
+    """Read the reference submissions for the requested languages and cases"""
+    submissions = []
+    for language in languages:
+        for case in cases:
+            path = os.path.join(SUBMISSIONS_DIR, language, f'{case}.{LANGUAGE_EXTENSIONS[language]}')
+            with open(path) as f:
+                submissions.append({'language': language, 'case': case, 'code': f.read()})
+    return submissions
+
+
+def make_tests(count: int, seed: int) -> List[Dict[str, str]]:
+    """A+B tests; every reference submission reads two integers"""
+    rng = random.Random(seed)
+    tests = []
+    for _ in range(count):
+        a, b = rng.randint(1, 10 ** 9), rng.randint(1, 10 ** 9)
+        tests.append({'input': f'{a} {b}\n', 'expected': str(a + b)})
+    return tests
+
+
+def verdict_of(results: List[Dict[str, Any]]) -> str:
+    """Overall verdict of a submission from its per-test results"""
+    for result in results:
+        if result['status'] != 'success':
+            return result['status']
+        if not result.get('passed', False):
+            return 'wrong_answer'
+    return 'accepted'
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(samples: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Throughput and latency figures for a group of judged submissions"""
+    latencies = [s['latency'] for s in samples]
+    tests = sum(s['tests'] for s in samples)
+    return {
+        'submissions': len(samples),
+        'tests': tests,
+        'verdict_mismatches': sum(1 for s in samples if s['verdict'] != s['expected_verdict']),
+        'submissions_per_sec': round(len(samples) / elapsed, 3) if elapsed else 0.0,
+        'tests_per_sec': round(tests / elapsed, 3) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 2),
+            'p95': round(percentile(latencies, 95) * 1000, 2),
+            'p99': round(percentile(latencies, 99) * 1000, 2),
+            'max': round(max(latencies, default=0.0) * 1000, 2)
+        }
+    }
+
+
+def judge_one(executor: CodeExecutor, submission: Dict[str, str], tests: List[Dict[str, str]],
+              time_limit: int, memory_limit: int) -> Dict[str, Any]:
+    """Judge one submission and time it end to end"""
+    start = time.perf_counter()
+    results = executor.execute_batch(submission['code'], submission['language'],
+                                     [t['input'] for t in tests], time_limit, memory_limit,
+                                     expected_outputs=[t['expected'] for t in tests])
+    latency = time.perf_counter() - start
+    return {
+        'language': submission['language'],
+        'case': submission['case'],
+        'expected_verdict': CASE_VERDICTS[submission['case']],
+        'verdict': verdict_of(results),
+        'tests': len(tests),
+        'latency': latency
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    submissions = load_submissions(args.languages, args.cases)
+    tests = make_tests(args.tests, args.seed)
+    
+    pool = None
+    if args.pool_size > 0:
+        pool = WarmWorkerPool(size=args.pool_size,
+                              limits=ConcurrencyLimits.from_env(default_budget=args.pool_size))
+        pool.start()
+    executor = CodeExecutor(pool=pool)
+    
+    try:
+        # Warm-up round: fills the compile cache and faults in the workers
+        for submission in submissions:
+            judge_one(executor, submission, tests[:1], args.time_limit, args.memory_limit)
+        
+        jobs = [submission for _ in range(args.rounds) for submission in submissions]
+        random.Random(args.seed).shuffle(jobs)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as job_executor:
+            samples = list(job_executor.map(
+                lambda s: judge_one(executor, s, tests, args.time_limit, args.memory_limit), jobs))
+        elapsed = time.perf_counter() - start
+    finally:
+        if pool:
+            pool.shutdown()
+    
+    report = {
+        'meta': {
+            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'concurrency': args.concurrency,
+            'pool_size': args.pool_size,
+            'rounds': args.rounds,
+            'tests_per_submission': args.tests,
+            'time_limit': args.time_limit,
+            'memory_limit': args.memory_limit,
+            'elapsed_sec': round(elapsed, 3)
+        },
+        'overall': summarize(samples, elapsed),
+        'by_language': {},
+        'by_case': {}
+    }
+    # Per-group throughput is relative to the whole run, since groups interleave
+    for language in args.languages:
+        report['by_language'][language] = summarize(
+            [s for s in samples if s['language'] == language], elapsed)
+    for case in args.cases:
+        report['by_case'][case] = summarize([s for s in samples if s['case'] == case], elapsed)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark judge throughput and latency')
+    parser.add_argument('--concurrency', type=int, default=2, help='Submissions judged at once')
+    parser.add_argument('--pool-size', type=int, default=os.cpu_count() or 2,
+                        help='Warm sandbox workers; 0 runs without a pool')
+    parser.add_argument('--rounds', type=int, default=3, help='Times each reference submission is judged')
+    parser.add_argument('--tests', type=int, default=10, help='Tests per submission')
+    parser.add_argument('--time-limit', type=int, default=1, help='Time limit per test in seconds')
+    parser.add_argument('--memory-limit', type=int, default=128, help='Memory limit per test in MB')
+    parser.add_argument('--languages', nargs='+', default=list(LANGUAGE_EXTENSIONS),
+                        choices=list(LANGUAGE_EXTENSIONS))
+    parser.add_argument('--cases', nargs='+', default=list(CASE_VERDICTS), choices=list(CASE_VERDICTS))
+    parser.add_argument('--seed', type=int, default=1, help='Seed for test data and job order')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = run_benchmark(args)
+    
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 1 if report['overall']['verdict_mismatches'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,15 @@
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+int main(void) {
+    long long a, b;
+    scanf("%lld %lld", &a, &b);
+    for (;;) {
+        char *block = malloc(16 * 1024 * 1024);
+        if (block == NULL) {
+            return 1;
+        }
+        memset(block, 1, 16 * 1024 * 1024);
+    }
+}
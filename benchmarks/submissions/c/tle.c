@@ -0,0 +1,10 @@
+#include <stdio.h>
+
+int main(void) {
+    volatile long long a, b;
+    scanf("%lld %lld", (long long *)&a, (long long *)&b);
+    for (;;) {
+        a += b;
+    }
+    return 0;
+}
@@ -0,0 +1,12 @@
+#include <iostream>
+#include <vector>
+
+int main() {
+    long long a, b;
+    std::cin >> a >> b;
+    std::vector<std::vector<char>> blocks;
+    for (;;) {
+        blocks.emplace_back(16 * 1024 * 1024, 1);
+    }
+    return 0;
+}
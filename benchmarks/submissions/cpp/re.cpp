@@ -0,0 +1,10 @@
+#include <iostream>
+#include <vector>
+
+int main() {
+    long long a, b;
+    std::cin >> a >> b;
+    std::vector<long long> values;
+    std::cout << values.at(a) + b << std::endl;
+    return 0;
+}
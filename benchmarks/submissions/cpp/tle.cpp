@@ -0,0 +1,11 @@
+#include <iostream>
+
+int main() {
+    long long a, b;
+    std::cin >> a >> b;
+    volatile long long total = a;
+    for (;;) {
+        total += b;
+    }
+    return 0;
+}
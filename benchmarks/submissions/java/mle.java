@@ -0,0 +1,13 @@
+import java.util.Scanner;
+
+public class Main {
+    public static void main(String[] args) {
+        Scanner in = new Scanner(System.in);
+        long a = in.nextLong();
+        long b = in.nextLong();
+        java.util.List<long[]> blocks = new java.util.ArrayList<>();
+        while (true) {
+            blocks.add(new long[2 * 1024 * 1024]);
+        }
+    }
+}
@@ -0,0 +1,4 @@
+a, b = map(int, input().split())
+blocks = []
+while True:
+    blocks.append(bytearray(16 * 1024 * 1024))
@@ -0,0 +1,129 @@
+import os
+import json
+import shutil
+import struct
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+BUNDLE_MAGIC = b'CTB1'
+# Magic, then the length of the JSON header as an unsigned 64-bit integer
+HEADER_PREFIX = struct.Struct('<4sQ')
+# Where bundles used to be written; removed on start, since it held hidden tests
+LEGACY_BUNDLE_DIR = os.path.join(tempfile.gettempdir(), 'codetrack-test-bundles')
+
+
+class TestBundle:
+    """Test data of one problem version, packed into a single buffer.
+    
+    The buffer is laid out as magic + header length + JSON header + data. The
+    header lists each test's id, sample flag and the offsets of its input and
+    expected output within the data area; tests are decoded only when read.
+    """
+    
+    def __init__(self, content: bytes):
+        self._content = memoryview(content)
+        magic, header_length = HEADER_PREFIX.unpack_from(self._content, 0)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError('Not a test bundle')
+        header_end = HEADER_PREFIX.size + header_length
+        self.header = json.loads(bytes(self._content[HEADER_PREFIX.size:header_end]))
+        self._data_start = header_end
+        self.tests = {test['id']: test for test in self.header['tests']}
+        self.size = len(content)
+    
+    def _read(self, span: List[int]) -> str:
+        start = self._data_start + span[0]
+        return str(self._content[start:start + span[1]], 'utf-8')
+    
+    def input_data(self, test_id: int) -> str:
+        return self._read(self.tests[test_id]['input'])
+    
+    def expected_output(self, test_id: int) -> str:
+        return self._read(self.tests[test_id]['expected'])
+
+
+class TestBundleStore:
+    """Versioned test bundles in an in-process LRU.
+    
+    Bundles are keyed by (problem, test version), so bumping the version when
+    tests change makes the old bundle unreachable without any explicit
+    invalidation. They are held in the judge process's memory only and never
+    written to disk: submissions run under the judge's uid without filesystem
+    isolation, so any file the judge can read, a submission can read too, and
+    hidden inputs and expected outputs must not be among them. The LRU keeps
+    at most max_entries bundles and max_bytes of test data.
+    """
+    
+    def __init__(self, max_entries: int = 64, max_bytes: int = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._bundles = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    def get(self, problem_id: int, version: int) -> Optional[TestBundle]:
+        """The bundle for a problem version, or None if this process has not built it"""
+        key = (problem_id, version)
+        with self._lock:
+            bundle = self._bundles.get(key)
+            if bundle is not None:
+                self._bundles.move_to_end(key)
+            return bundle
+    
+    def build(self, problem_id: int, version: int, test_cases) -> TestBundle:
+        """Pack test cases into a bundle, keep it and return it"""
+        tests = []
+        chunks = []
+        offset = 0
+        for test_case in test_cases:
+            spans = {}
+            for field, text in (('input', test_case.input_data), ('expected', test_case.expected_output)):
+                data = text.encode('utf-8')
+                spans[field] = [offset, len(data)]
+                chunks.append(data)
+                offset += len(data)
+            tests.append({'id': test_case.id, 'is_sample': bool(test_case.is_sample), **spans})
+        
+        header = json.dumps({'problem_id': problem_id, 'version': version, 'tests': tests}).encode()
+        bundle = TestBundle(HEADER_PREFIX.pack(BUNDLE_MAGIC, len(header)) + header + b''.join(chunks))
+        self._remember(problem_id, version, bundle)
+        return bundle
+    
+    def _remember(self, problem_id: int, version: int, bundle: TestBundle):
+        with self._lock:
+            # Older versions of the problem can no longer be asked for
+            for key in [key for key in self._bundles if key[0] == problem_id]:
+                self._bytes -= self._bundles.pop(key).size
+            self._bundles[(problem_id, version)] = bundle
+            self._bytes += bundle.size
+            while len(self._bundles) > 1 and (len(self._bundles) > self.max_entries
+                                              or self._bytes > self.max_bytes):
+                self._bytes -= self._bundles.popitem(last=False)[1].size
+
+
+# Global store instance
+test_bundle_store = None
+_store_lock = threading.Lock()
+
+def get_test_bundle_store() -> Optional[TestBundleStore]:
+    """
+    Return the shared bundle store, or None when JUDGE_TEST_BUNDLE_CACHE is 0
+    
+    JUDGE_TEST_BUNDLE_CACHE (default 64) caps the number of bundles and
+    JUDGE_TEST_BUNDLE_MB (default 256) the test data they hold.
+    """
+    global test_bundle_store
+    max_entries = int(os.environ.get('JUDGE_TEST_BUNDLE_CACHE', '64'))
+    if max_entries <= 0:
+        return None
+    with _store_lock:
+        if test_bundle_store is None:
+            if os.path.isdir(LEGACY_BUNDLE_DIR):
+                logging.warning(f"Removing on-disk test bundles left in {LEGACY_BUNDLE_DIR}")
+                shutil.rmtree(LEGACY_BUNDLE_DIR, ignore_errors=True)
+            max_bytes = int(os.environ.get('JUDGE_TEST_BUNDLE_MB', '256')) * 1024 * 1024
+            test_bundle_store = TestBundleStore(max_entries, max_bytes)
+    return test_bundle_store
@@ -0,0 +1,135 @@
+"""
+Per-language time limit calibration
+
+Runs reference solutions for contest problems on this judge host and stores
+per-language time limits on each problem (ContestProblem.time_limit_calibration).
+Reference solutions are read from a directory with one sub-directory per
+problem id, holding any number of solutions named by extension:
+    
+    reference_solutions/12/main.cpp
+    reference_solutions/12/solution.py
+    reference_solutions/12/Main.java
+    
+    python calibrate_time_limits.py reference_solutions --rounds 5 --dry-run
+
+Run it on a judge host (with the same JUDGE_* settings as the judge workers)
+while the host is otherwise idle; the judge pool is not used, so runs do not
+compete with each other. Reference runs are timed on the same clock as
+JUDGE_TIME_LIMIT_MODE enforces (CPU time by default).
+"""
+import os
+import sys
+import json
+import socket
+import argparse
+import platform
+from datetime import datetime
+from typing import Dict, List, Any
+
+from app import app, db
+from models import ContestProblem
+from code_executor import CodeExecutor, TIME_LIMIT_MODE
+from judge_service import JudgeService
+from time_calibration import SAFETY_FACTOR, MAX_MULTIPLIER, derive_limits, measure_solution
+
+EXTENSION_LANGUAGES = {'.py': 'python', '.java': 'java', '.c': 'c', '.cpp': 'cpp', '.cc': 'cpp'}
+
+
+def find_solutions(root: str, problem_ids: List[int]) -> Dict[int, List[Dict[str, str]]]:
+    """Reference solutions per problem id, from root/<problem id>/*"""
+    solutions = {}
+    for entry in sorted(os.listdir(root)):
+        if not entry.isdigit() or (problem_ids and int(entry) not in problem_ids):
+            continue
+        problem_dir = os.path.join(root, entry)
+        for name in sorted(os.listdir(problem_dir)):
+            language = EXTENSION_LANGUAGES.get(os.path.splitext(name)[1])
+            if language is None:
+                continue
+            with open(os.path.join(problem_dir, name)) as f:
+                solutions.setdefault(int(entry), []).append({'name': name, 'language': language, 'code': f.read()})
+    return solutions
+
+
+def calibrate(problem, solutions: List[Dict[str, str]], executor: CodeExecutor, args) -> Dict[str, Any]:
+    """Measure a problem's reference solutions and derive its per-language limits"""
+    test_cases = JudgeService.load_test_cases(problem)
+    expected_outputs = [tc.expected_output for tc in test_cases]
+    # Generous limits while measuring, so slow runtimes are timed rather than cut off
+    time_limit = problem.time_limit * MAX_MULTIPLIER * args.safety
+    references, failures = {}, {}
+    for solution in solutions:
+        def run(solution=solution):
+            return JudgeService.run_tests(executor, problem, solution['code'], solution['language'],
+                                          test_cases, time_limit=time_limit)
+        seconds, reason = measure_solution(run, expected_outputs, args.rounds)
+        if seconds is None:
+            failures[solution['name']] = reason
+            continue
+        # The slowest accepted reference of a language sets its pace
+        references[solution['language']] = max(seconds, references.get(solution['language'], 0.0))
+    
+    derived = derive_limits(problem.time_limit, references, args.safety)
+    return {
+        'problem_id': problem.id,
+        'title': problem.title,
+        'base_limit': problem.time_limit,
+        'tests': len(test_cases),
+        'reference_seconds': {language: round(seconds, 4) for language, seconds in references.items()},
+        'failures': failures,
+        **derived
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Calibrate per-language time limits from reference solutions')
+    parser.add_argument('solutions', help='Directory with one sub-directory of reference solutions per problem id')
+    parser.add_argument('--problem', type=int, action='append', default=[],
+                        help='Only calibrate this problem id (repeatable)')
+    parser.add_argument('--rounds', type=int, default=5, help='Runs of every test per reference solution')
+    parser.add_argument('--safety', type=float, default=SAFETY_FACTOR,
+                        help='Minimum ratio of a limit to its slowest reference run')
+    parser.add_argument('--dry-run', action='store_true', help='Print the limits without storing them')
+    parser.add_argument('--output', help='Also write the JSON report here')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    solutions = find_solutions(args.solutions, args.problem)
+    executor = CodeExecutor()
+    host = {'hostname': socket.gethostname(), 'platform': platform.platform(),
+            'python': platform.python_version(), 'cpu_count': os.cpu_count()}
+    reports = []
+    with app.app_context():
+        for problem_id, problem_solutions in solutions.items():
+            problem = ContestProblem.query.get(problem_id)
+            if problem is None:
+                reports.append({'problem_id': problem_id, 'error': 'No such problem'})
+                continue
+            report = calibrate(problem, problem_solutions, executor, args)
+            reports.append(report)
+            if not args.dry_run and report['limits']:
+                problem.time_limit_calibration = json.dumps({
+                    'limits': report['limits'],
+                    'multipliers': report['multipliers'],
+                    'reference_seconds': report['reference_seconds'],
+                    'clock': TIME_LIMIT_MODE,
+                    'base_limit': problem.time_limit,
+                    'host': host,
+                    'calibrated_at': datetime.utcnow().isoformat() + 'Z'
+                })
+                # Verdicts judged under the old limits are keyed on them (see
+                # JudgeService.cache_scope), so the tests and bundles stay valid
+                db.session.commit()
+    
+    text = json.dumps({'host': host, 'problems': reports}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    return 1 if any(r.get('failures') or r.get('error') for r in reports) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,211 @@
 import subprocess
 import tempfile
 import os
+import re
+import sys
 import time
 import signal
 import logging
-from typing import Dict, List, Tuple, Any
+import resource
+import threading
+import traceback
+from typing import Callable, Dict, List, Tuple, Any, Optional
+from compile_cache import get_compile_cache
+from workspace_pool import get_workspace_pool, workspace_usage
+from output_checker import check_output
+from jvm_runner import get_jvm_runner, prepare_runner_classes, JvmRunnerBusy, JvmRunnerError
+
+# Hard cap on what a run may write to stdout/stderr (enforced with RLIMIT_FSIZE)
+OUTPUT_LIMIT_BYTES = int(os.environ.get('JUDGE_OUTPUT_LIMIT_MB', '64')) * 1024 * 1024
+# How much of stdout/stderr is read back into the result
+OUTPUT_PREVIEW_BYTES = 64 * 1024
+# How often a running submission's workspace is measured against its size cap
+WORKSPACE_CHECK_SECONDS = 0.01
+
+# stderr fragments that mean an allocation failed under the memory limit
+OUT_OF_MEMORY_MARKERS = ('MemoryError', 'std::bad_alloc', 'java.lang.OutOfMemoryError',
+                         'Cannot allocate memory')
+
+# What a run's time limit is measured against: 'cpu' (CPU seconds the run
+# used, which neighbouring runs cannot inflate) or 'wall' (elapsed time)
+TIME_LIMIT_MODE = os.environ.get('JUDGE_TIME_LIMIT_MODE', 'cpu')
+# In cpu mode a run is still killed once its wall time reaches this multiple
+# of the limit, so runs that sleep or block cannot hold a sandbox forever
+WALL_LIMIT_FACTOR = float(os.environ.get('JUDGE_WALL_LIMIT_FACTOR', '3'))
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_KB = os.sysconf('SC_PAGE_SIZE') // 1024
+# How far a child's RSS may grow past its parent's between measuring the
+# parent and forking (see own_peak_rss)
+FORK_SLACK_KB = 4096
+
+# "file:line[:column]" of the first diagnostic printed by gcc, g++ or javac
+COMPILER_POSITION = re.compile(r'^[^\s:]+\.(?:c|cpp|java):(\d+)(?::(\d+))?:', re.MULTILINE)
+
+def is_failed_run(result: Dict[str, Any], expected_output: str) -> bool:
+    """Whether a run errored or printed something other than the expected output"""
+    if result['status'] != 'success':
+        return True
+    if 'passed' in result:
+        return not result['passed']  # Already checked against the full output
+    return result['output'].split() != expected_output.split()
+
+def wall_limit(time_limit: float) -> float:
+    """Wall-clock seconds a run with this time limit may take before it is killed"""
+    return time_limit * WALL_LIMIT_FACTOR if TIME_LIMIT_MODE == 'cpu' else time_limit
+
+def run_noise(cpu_time: float, wall_time: float, involuntary_switches: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Noise indicator for one run
+    
+    A CPU-bound run on a quiet, pinned core has a wall/CPU ratio close to 1
+    and few involuntary context switches; a high ratio or many preemptions
+    mean its timing was disturbed (or that it waited on I/O).
+    """
+    return {
+        'wall_cpu_ratio': round(wall_time / cpu_time, 3) if cpu_time > 0 else None,
+        'involuntary_switches': involuntary_switches
+    }
+
+def process_cpu_seconds(pid: int) -> float:
+    """CPU seconds (user + system, all threads) a live process has used, from /proc"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except (OSError, IndexError):
+        return 0.0
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+def process_rss_kb(pid='self') -> int:
+    """Resident memory of a process (this one by default) in KB"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * PAGE_KB
+    except (OSError, IndexError, ValueError):
+        return 0
+
+def process_peak_rss(pid: int) -> int:
+    """Peak resident memory (VmHWM) in KB of a live process's current program, from /proc"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except (OSError, IndexError, ValueError):
+        pass
+    return 0
+
+def own_peak_rss(maxrss: int, inherited: int, sampled: int, forked: bool) -> int:
+    """
+    Peak RSS in KB of what a run itself used
+    
+    wait4's ru_maxrss also counts the pages a child inherits from the process
+    that forked it, and keeps that high-water mark across exec, so a run
+    started from a large process looks at least as large as its parent.
+    For a forked Python run the RSS it started with is subtracted. An exec'd
+    program's ru_maxrss is its own only once it exceeds what was inherited;
+    below that, the peak sampled from /proc after the exec is used.
+    """
+    if forked:
+        return max(0, maxrss - inherited)
+    if maxrss > inherited + FORK_SLACK_KB:
+        return maxrss
+    return min(sampled, maxrss)
+
+def progress_summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    """The part of a run result that is reported as progress while a batch runs"""
+    return {'status': result['status'], 'passed': result.get('passed'),
+            'execution_time': result['execution_time']}
+
+def skipped_result() -> Dict[str, Any]:
+    """Result for a run that was not executed because an earlier one failed"""
+    return {
+        'success': False,
+        'status': 'skipped',
+        'output': '',
+        'error': 'Skipped after an earlier test failed',
+        'execution_time': 0.0,
+        'memory_used': 0,
+        'cpu_time': 0.0,
+        'wall_time': 0.0
+    }
+
+def cancelled_result() -> Dict[str, Any]:
+    """Result for a run that was stopped because a newer run replaced it"""
+    return {
+        'success': False,
+        'status': 'cancelled',
+        'output': '',
+        'error': 'Cancelled by a newer run',
+        'execution_time': 0.0,
+        'memory_used': 0,
+        'cpu_time': 0.0,
+        'wall_time': 0.0
+    }
+
+class CancelToken:
+    """Cancellation flag for one execution.
+    
+    cancel() sets the flag and calls every registered callback (a pool uses
+    one to tell the worker running the job). poll, if given, is consulted
+    while the flag is unset; pool workers use it to pick up cancel messages.
+    """
+    
+    def __init__(self, poll: Optional[Callable[[], bool]] = None):
+        self.poll = poll
+        self._cancelled = False
+        self._callbacks = []
+        # Reentrant: a worker may cancel from inside poll
+        self._lock = threading.RLock()
+    
+    @property
+    def cancelled(self) -> bool:
+        if not self._cancelled and self.poll is not None and self.poll():
+            self.cancel()
+        return self._cancelled
+    
+    def cancel(self):
+        with self._lock:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            # Callbacks run under the lock so remove() cannot return while one
+            # is still in progress
+            for callback in self._callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logging.debug(f"Cancel callback failed: {e}")
+    
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Call callback if the token is cancelled later; returns a function that unregisters it"""
+        with self._lock:
+            self._callbacks.append(callback)
+        
+        def remove():
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+        return remove
 
 class CodeExecutor:
     """Secure code execution service for contest submissions"""
     
-    def __init__(self):
+    def __init__(self, pool=None, fork_python: bool = False,
+                 cancel_token: Optional[CancelToken] = None):
+        # When a warm worker pool is given, executions are delegated to it.
+        # fork_python is set inside pool workers: Python submissions then run
+        # in a child forked from the already-started interpreter instead of
+        # cold-starting python3 for every run. Cancelling cancel_token kills
+        # the current run and cancels the rest of the batch.
+        self.pool = pool
+        self.fork_python = fork_python
+        self.cancel_token = cancel_token
         self.supported_languages = {
             'python': {
                 'extension': '.py',
                 'command': ['python3', '{filename}'],
-                'timeout': 5
+                'timeout': 5,
+                'memory_overhead': 64  # MB of address space for the interpreter itself
             },
             'java': {
                 'extension': '.java',
@@ -24,16 +215,18 @@ class CodeExecutor:
             'cpp': {
                 'extension': '.cpp',
                 'command': ['g++', '-o', '{output}', '{filename}', '&&', '{output}'],
-                'timeout': 10
+                'timeout': 10,
+                'memory_overhead': 16
             },
             'c': {
                 'extension': '.c',
                 'command': ['gcc', '-o', '{output}', '{filename}', '&&', '{output}'],
-                'timeout': 10
+                'timeout': 10,
+                'memory_overhead': 16
             }
         }
     
-    def execute_code(self, code: str, language: str, input_data: str = "", 
+    def execute_code(self, code: str, language: str, input_data: str = "",
                     time_limit: int = 5, memory_limit: int = 256) -> Dict[str, Any]:
         """
         Execute code with input and return results
@@ -44,240 +237,589 @@ class CodeExecutor:
             input_data: Input to provide to the program
             time_limit: Maximum execution time in seconds
             memory_limit: Maximum memory usage in MB
-            
+        
         Returns:
             Dictionary containing execution results
         """
+        return self.execute_batch(code, language, [input_data], time_limit, memory_limit)[0]
+    
+    def execute_batch(self, code: str, language: str, inputs: List[str],
+                      time_limit: int = 5, memory_limit: int = 256,
+                      expected_outputs: Optional[List[str]] = None,
+                      stop_on_failure: bool = False,
+                      float_tolerance: Optional[float] = None,
+                      on_progress: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+                      checker: Optional[Callable[[int, str], Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Execute code once per input, preparing (compiling) it only once
+        
+        The submission is written and compiled a single time; every input then
+        gets its own isolated run with its own time limit. Inside pool workers
+        Python runs are forked from the warm worker with the bytecode already
+        compiled.
+        
+        Args:
+            code: The source code to execute
+            language: Programming language (python, java, cpp, c)
+            inputs: Inputs to provide to the program, one run each
+            time_limit: Maximum execution time per run in seconds
+            memory_limit: Maximum memory usage in MB
+            expected_outputs: Expected output per input (or a checker; needed for stop_on_failure)
+            stop_on_failure: Skip the remaining runs once one run has failed
+            float_tolerance: Allowed error when comparing numeric tokens
+            on_progress: Called with (input index, progress_summary(result)) as
+                each run finishes; runs may finish out of order in a pool
+            checker: Checks the output file of a successful run, called with
+                (input index, stdout path) and returning a check_output()
+                result; replaces expected_outputs. It always runs in this
+                process: pool workers hand it back to the pool, so expected
+                outputs never enter a process user code is forked from.
+        
+        Returns:
+            List of execution result dictionaries, in input order; runs skipped
+            after a failure have status 'skipped'. When outputs are checked, successful runs also carry 'passed' and a bounded 'diff'.
+        """
         if language not in self.supported_languages:
-            return {
-                'success': False,
-                'status': 'error',
-                'output': '',
-                'error': f'Unsupported language: {language}',
-                'execution_time': 0.0,
-                'memory_used': 0
-            }
+            return [self._make_result('error', error=f'Unsupported language: {language}')
+                    for _ in inputs]
         
-        lang_config = self.supported_languages[language]
+        if checker is None and expected_outputs is not None:
+            checker = lambda index, path: check_output(path, expected_outputs[index], float_tolerance)
+        
+        if self.pool is not None:
+            return self.pool.execute_batch(code, language, inputs, time_limit, memory_limit,
+                                           checker, stop_on_failure,
+                                           cancel_token=self.cancel_token, on_progress=on_progress)
         
-        # Create temporary directory for execution
-        with tempfile.TemporaryDirectory() as temp_dir:
+        # Scratch directory for the build and every run of the batch
+        with self._workspace() as temp_dir:
             try:
-                return self._execute_in_sandbox(code, language, input_data, 
-                                              time_limit, memory_limit, temp_dir)
+                phases = {}
+                prepared = self._prepare(code, language, temp_dir, phases)
+                if 'status' in prepared:
+                    # Compilation failed; every run gets the same verdict
+                    results = [dict(prepared) for _ in inputs]
+                    if results:
+                        results[0]['phases'] = phases
+                    return results
+                
+                results = []
+                for index, input_data in enumerate(inputs):
+                    if self._cancelled():
+                        results.extend(cancelled_result() for _ in inputs[index:])
+                        break
+                    check = (lambda path, index=index: checker(index, path)) if checker is not None else None
+                    result = self._run_prepared(prepared, input_data, time_limit, memory_limit, temp_dir, check)
+                    if index == 0:
+                        # Build phases are paid once per batch
+                        run_phases = result.setdefault('phases', {})
+                        run_phases['write'] = run_phases.get('write', 0.0) + phases['write']
+                        run_phases['compile'] = phases['compile']
+                    results.append(result)
+                    if on_progress is not None:
+                        on_progress(index, progress_summary(result))
+                    if stop_on_failure and check is not None and (result['status'] != 'success'
+                                                                  or not result['passed']):
+                        results.extend(skipped_result() for _ in inputs[index + 1:])
+                        break
+                return results
             except Exception as e:
                 logging.error(f"Code execution error: {e}")
-                return {
-                    'success': False,
-                    'status': 'error',
-                    'output': '',
-                    'error': str(e),
-                    'execution_time': 0.0,
-                    'memory_used': 0
-                }
+                return [self._make_result('error', error=str(e)) for _ in inputs]
+    
+    def precompile(self, code: str, language: str):
+        """
+        Compile a submission ahead of its runs so later builds hit the cache
+        
+        Python is only compiled to bytecode, which makes this a cheap syntax
+        check. Runs in a pool worker when a pool is configured.
+        
+        Returns a compilation_error result, or None if the code compiled.
+        """
+        if self.pool is not None:
+            return self.pool.precompile(code, language)
+        with self._workspace() as temp_dir:
+            prepared = self._prepare(code, language, temp_dir)
+        return prepared if 'status' in prepared else None
+    
+    def _workspace(self):
+        """A pooled workspace, or a temporary directory if pooling is off"""
+        workspaces = get_workspace_pool()
+        return workspaces.acquire() if workspaces else tempfile.TemporaryDirectory()
     
-    def _execute_in_sandbox(self, code: str, language: str, input_data: str,
-                           time_limit: int, memory_limit: int, temp_dir: str) -> Dict[str, Any]:
-        """Execute code in a sandboxed environment"""
+    def _compilation_error(self, error: str, execution_time: float = 0.0,
+                           line: Optional[int] = None, column: Optional[int] = None) -> Dict[str, Any]:
+        """compilation_error result; the error position is parsed from compiler output if not given"""
+        result = self._make_result('compilation_error', error=error, execution_time=execution_time)
+        if line is None:
+            match = COMPILER_POSITION.search(error)
+            if match:
+                line = int(match.group(1))
+                column = int(match.group(2)) if match.group(2) else None
+        if line is not None:
+            result['error_line'] = line
+            result['error_column'] = column
+        return result
+    
+    def _make_result(self, status: str, output: str = '', error: str = '',
+                     execution_time: float = 0.0, memory_used: int = 0,
+                     cpu_time: float = 0.0, wall_time: float = 0.0) -> Dict[str, Any]:
+        """Build an execution result dictionary (memory_used is peak RSS in KB)"""
+        return {
+            'success': status == 'success',
+            'status': status,
+            'output': output,
+            'error': error,
+            'execution_time': execution_time,
+            'memory_used': memory_used,
+            'cpu_time': cpu_time,
+            'wall_time': wall_time
+        }
+    
+    def _prepare(self, code: str, language: str, temp_dir: str,
+                 phases: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+        """
+        Write the submission to disk and compile it if needed
+        
+        Returns a run specification ({'cmd': [...]} or {'code_object': ...}
+        plus the language),
+        or an execution result dictionary if compilation failed.
+        Time spent writing and compiling is stored in phases, if given.
+        """
+        if phases is None:
+            phases = {}
         lang_config = self.supported_languages[language]
         
-        # Write code to file
-        filename = f"solution{lang_config['extension']}"
+        # Java requires the file to be named after its public class
+        classname = None
+        if language == 'java':
+            classname = self._extract_java_classname(code)
+            filename = f"{classname}{lang_config['extension']}"
+        else:
+            filename = f"solution{lang_config['extension']}"
         filepath = os.path.join(temp_dir, filename)
         
+        phase_start = time.perf_counter()
         with open(filepath, 'w') as f:
             f.write(code)
+        phases['write'] = time.perf_counter() - phase_start
         
-        # Prepare execution command
+        phase_start = time.perf_counter()
+        try:
+            return self._build(code, language, filepath, temp_dir, classname)
+        finally:
+            phases['compile'] = time.perf_counter() - phase_start
+    
+    def _build(self, code: str, language: str, filepath: str, temp_dir: str,
+               classname: Optional[str]) -> Dict[str, Any]:
+        """Compile a written submission into a run specification (see _prepare)"""
         if language == 'python':
-            cmd = ['python3', filepath]
+            # Syntax errors fail the whole submission once, before any run
+            try:
+                code_object = compile(code, filepath, 'exec')
+            except (SyntaxError, ValueError, RecursionError, MemoryError) as e:
+                message = ''.join(traceback.format_exception_only(type(e), e)).strip()
+                return self._compilation_error(message.replace(temp_dir + os.sep, ''),
+                                               line=getattr(e, 'lineno', None),
+                                               column=getattr(e, 'offset', None))
+            if self.fork_python:
+                return {'language': language, 'code_object': code_object, 'filepath': filepath}
+            return {'language': language, 'cmd': ['python3', filepath]}
         elif language == 'java':
-            # Extract class name from Java code
-            classname = self._extract_java_classname(code)
-            compile_cmd = ['javac', filepath]
-            run_cmd = ['java', '-cp', temp_dir, classname]
-            return self._execute_java(compile_cmd, run_cmd, input_data, time_limit)
+            error = self._compile(language, code, ['javac', filepath], temp_dir)
+            if error:
+                return error
+            return {'language': language, 'cmd': ['java', '-cp', temp_dir, classname],
+                    'class_dir': temp_dir, 'classname': classname}
         elif language in ['cpp', 'c']:
             output_file = os.path.join(temp_dir, 'solution')
             compiler = 'g++' if language == 'cpp' else 'gcc'
-            compile_cmd = [compiler, '-o', output_file, filepath]
-            run_cmd = [output_file]
-            return self._execute_compiled(compile_cmd, run_cmd, input_data, time_limit)
-        else:
-            cmd = ['python3', filepath]  # Default fallback
+            error = self._compile(language, code, [compiler, '-o', output_file, filepath], temp_dir)
+            if error:
+                return error
+            return {'language': language, 'cmd': [output_file]}
         
-        # Execute for interpreted languages (Python)
-        start_time = time.time()
-        
-        try:
-            process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                cwd=temp_dir,
-                preexec_fn=os.setsid  # Create new process group
-            )
-            
-            # Set timeout using communicate
-            try:
-                stdout, stderr = process.communicate(
-                    input=input_data, 
-                    timeout=time_limit
-                )
-                execution_time = time.time() - start_time
-                
-                if process.returncode == 0:
-                    return {
-                        'success': True,
-                        'status': 'success',
-                        'output': stdout.strip(),
-                        'error': stderr.strip() if stderr else '',
-                        'execution_time': execution_time,
-                        'memory_used': 0  # Memory tracking not implemented yet
-                    }
-                else:
-                    return {
-                        'success': False,
-                        'status': 'runtime_error',
-                        'output': stdout.strip(),
-                        'error': stderr.strip(),
-                        'execution_time': execution_time,
-                        'memory_used': 0
-                    }
-                    
-            except subprocess.TimeoutExpired:
-                # Kill the process group
-                os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-                process.wait()
-                return {
-                    'success': False,
-                    'status': 'time_limit_exceeded',
-                    'output': '',
-                    'error': f'Time limit exceeded ({time_limit}s)',
-                    'execution_time': time_limit,
-                    'memory_used': 0
-                }
-                
-        except Exception as e:
-            return {
-                'success': False,
-                'status': 'error',
-                'output': '',
-                'error': str(e),
-                'execution_time': time.time() - start_time,
-                'memory_used': 0
-            }
+        return {'language': language, 'cmd': ['python3', filepath]}  # Default fallback
     
-    def _execute_java(self, compile_cmd: List[str], run_cmd: List[str], 
-                     input_data: str, time_limit: int) -> Dict[str, Any]:
-        """Execute Java code with compilation step"""
-        start_time = time.time()
+    def _compile(self, language: str, code: str, compile_cmd: List[str], temp_dir: str):
+        """
+        Compile a submission; return a compilation_error result or None on success
         
-        # Compile
+        Builds (and compiler errors) are cached by language, compiler flags and
+        source hash, so identical code is only ever compiled once.
+        """
+        cache = get_compile_cache()
+        cache_key = None
+        if cache is not None:
+            # Paths differ per run, so only the compiler and its flags form the key
+            flags = [arg for arg in compile_cmd if not arg.startswith(temp_dir)]
+            cache_key = cache.make_key(language, code, flags)
+            entry = cache.lookup(cache_key)
+            if entry is not None:
+                if entry['status'] == 'compilation_error':
+                    return self._compilation_error(entry['error'])
+                try:
+                    cache.restore(entry, temp_dir)
+                    return None
+                except OSError:
+                    pass  # Evicted under us; compile from scratch
+        
+        start_time = time.time()
         try:
             compile_process = subprocess.run(
                 compile_cmd,
                 capture_output=True,
                 text=True,
+                cwd=temp_dir,
                 timeout=10
             )
-            
-            if compile_process.returncode != 0:
-                return {
-                    'status': 'compilation_error',
-                    'output': '',
-                    'error': compile_process.stderr,
-                    'execution_time': time.time() - start_time,
-                    'memory_used': 0
-                }
         except subprocess.TimeoutExpired:
-            return {
-                'status': 'compilation_error',
-                'output': '',
-                'error': 'Compilation timeout',
-                'execution_time': 10,
-                'memory_used': 0
-            }
+            return self._compilation_error('Compilation timeout', execution_time=10)
         
-        # Run
+        if compile_process.returncode != 0:
+            # Report paths relative to the sandbox so the message is cacheable
+            error = compile_process.stderr.replace(temp_dir + os.sep, '')
+            if cache is not None:
+                cache.store(cache_key, temp_dir, [], error=error)
+            return self._compilation_error(error, execution_time=time.time() - start_time)
+        
+        if cache is not None:
+            cache.store(cache_key, temp_dir, self._build_artifacts(language, temp_dir))
+        return None
+    
+    def _build_artifacts(self, language: str, temp_dir: str) -> List[str]:
+        """Names of the files a successful compilation produced"""
+        if language == 'java':
+            return sorted(name for name in os.listdir(temp_dir) if name.endswith('.class'))
+        return ['solution']
+    
+    def _run_prepared(self, prepared: Dict[str, Any], input_data: str,
+                      time_limit: int, memory_limit: int, temp_dir: str,
+                      check: Optional[Callable[[str], Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Run a prepared submission against one input, checking its output file with check if given"""
+        phases = {}
+        input_path = os.path.join(temp_dir, 'input.txt')
+        stdout_path = os.path.join(temp_dir, 'stdout.txt')
+        stderr_path = os.path.join(temp_dir, 'stderr.txt')
+        phase_start = time.perf_counter()
+        with open(input_path, 'w') as f:
+            f.write(input_data)
+        phases['write'] = time.perf_counter() - phase_start
+        
+        language = prepared['language']
+        # Address-space cap: the memory limit plus the runtime's own footprint.
+        # The JVM reserves far more address space than it uses, so Java is
+        # bounded by its heap size instead.
+        address_limit = None
+        if language != 'java':
+            overhead = self.supported_languages[language].get('memory_overhead', 0)
+            address_limit = (memory_limit + overhead) * 1024 * 1024
+        
+        start_time = time.time()
         try:
+            measured = None
+            if language == 'java':
+                measured = self._run_on_jvm(prepared, input_path, stdout_path, stderr_path,
+                                            temp_dir, time_limit, memory_limit, phases)
+            if measured is None:
+                measured = self._run_process(prepared, input_path, stdout_path, stderr_path, temp_dir,
+                                             time_limit, memory_limit, address_limit, phases)
+        except Exception as e:
+            return self._make_result('error', error=str(e), execution_time=time.time() - start_time)
+        returncode, memory_used, cpu_time, wall_time, switches = measured
+        if returncode is None and self._cancelled():
+            return cancelled_result()
+        
+        if returncode is None or returncode == -signal.SIGXCPU:
+            result = self._make_result('time_limit_exceeded',
+                                       error=f'Time limit exceeded ({time_limit}s)',
+                                       execution_time=time_limit, memory_used=memory_used,
+                                       cpu_time=cpu_time, wall_time=wall_time)
+            result['noise'] = run_noise(cpu_time, wall_time, switches)
+            result['phases'] = phases
+            return result
+        
+        phase_start = time.perf_counter()        
+        # Only a bounded preview is kept in memory; the output file itself is
+        # streamed through the checker below
+        stdout = self._read_preview(stdout_path)
+        stderr = self._read_preview(stderr_path)
+        
+        if self._exceeded_output(returncode, stdout_path, stderr_path):
+            status = 'output_limit_exceeded'
+            stderr = f'Output limit exceeded ({OUTPUT_LIMIT_BYTES // (1024 * 1024)} MB)'
+        elif self._exceeded_memory(returncode, memory_used, memory_limit, stderr):
+            status = 'memory_limit_exceeded'
+            stderr = f'Memory limit exceeded ({memory_limit} MB)'
+        else:
+            status = 'success' if returncode == 0 else 'runtime_error'
+        execution_time = cpu_time if TIME_LIMIT_MODE == 'cpu' else wall_time
+        result = self._make_result(status, output=stdout.strip(), error=stderr.strip(),
+                                   execution_time=execution_time, memory_used=memory_used,
+                                   cpu_time=cpu_time, wall_time=wall_time)
+        result['noise'] = run_noise(cpu_time, wall_time, switches)
+        
+        if status == 'success' and check is not None:
+            checked = check(stdout_path)
+            result['passed'] = checked['passed']
+            result['diff'] = checked['window']
+            if not checked['passed']:
+                result['error'] = checked['message']
+        phases['check'] = time.perf_counter() - phase_start
+        result['phases'] = phases
+        return result
+    
+    def _run_process(self, prepared: Dict[str, Any], input_path: str, stdout_path: str,
+                     stderr_path: str, temp_dir: str, time_limit: int, memory_limit: int,
+                     address_limit, phases: Dict[str, float]) -> Tuple[Optional[int], int, float, float, int]:
+        """
+        Run a prepared submission in a fresh process (forked for Python in pool workers)
+        
+        Returns (exit code or None on timeout, peak RSS in KB, CPU seconds,
+        wall seconds, involuntary context switches).
+        """
+        start_time = time.time()
+        phase_start = time.perf_counter()
+        inherited = process_rss_kb()
+        forked = 'code_object' in prepared
+        if forked:
+            pid = os.fork()
+            if pid == 0:
+                self._run_forked_child(prepared['code_object'], prepared['filepath'], input_path,
+                                       stdout_path, stderr_path, temp_dir, address_limit, time_limit)
+            # Fork copies only part of the page tables, so measure what the child actually starts with
+            inherited = process_rss_kb(pid) or inherited
+        else:
+            cmd = prepared['cmd']
+            if prepared['language'] == 'java':
+                cmd = [cmd[0], f'-Xmx{memory_limit}m', '-XX:+UseSerialGC', '-XX:-UsePerfData'] + cmd[1:]
+            pid = self._spawn_process(cmd, input_path, stdout_path, stderr_path, temp_dir,
+                                      address_limit, time_limit)
+        phases['spawn'] = time.perf_counter() - phase_start
+        
+        phase_start = time.perf_counter()
+        # Popen returns once the program is exec'd, so from here /proc shows its own peak
+        workspaces = get_workspace_pool()
+        workspace_cap = workspaces.cap_for(temp_dir) if workspaces else None
+        returncode, rusage, sampled = self._wait_for_child(pid, time_limit, start_time,
+                                                           sample_memory=not forked, workspace=temp_dir,
+                                                           workspace_cap=workspace_cap)
+        wall_time = time.time() - start_time
+        phases['run'] = time.perf_counter() - phase_start
+        memory_used = own_peak_rss(rusage.ru_maxrss, inherited, sampled, forked) if rusage else 0
+        cpu_time = (rusage.ru_utime + rusage.ru_stime) if rusage else 0.0
+        switches = rusage.ru_nivcsw if rusage else 0
+        return returncode, memory_used, cpu_time, wall_time, switches
+    
+    def _run_on_jvm(self, prepared: Dict[str, Any], input_path: str, stdout_path: str,
+                    stderr_path: str, temp_dir: str, time_limit: int, memory_limit: int,
+                    phases: Dict[str, float]) -> Optional[Tuple[Optional[int], int, float, float, Optional[int]]]:
+        """
+        Run a compiled Java submission on this process's persistent JVM
+        
+        Returns the same tuple as _run_process (memory is the peak heap, and
+        context switches are not measured), or None when no runner JVM is
+        available and java must be started per run.
+        """
+        runner = get_jvm_runner(memory_limit, OUTPUT_LIMIT_BYTES)
+        if runner is None:
+            return None
+        phase_start = time.perf_counter()
+        if 'runner_class_dir' not in prepared:
+            try:
+                prepared['runner_class_dir'] = prepare_runner_classes(prepared['class_dir'])
+            except (ValueError, OSError) as e:
+                logging.warning(f"Could not prepare classes for the JVM runner, starting java per run: {e}")
+                prepared['runner_class_dir'] = None
+        if prepared['runner_class_dir'] is None:
+            return None
+        workspaces = get_workspace_pool()
+        workspace_cap = workspaces.cap_for(temp_dir) if workspaces else None
+        try:
+            run = runner.run(prepared['runner_class_dir'], prepared['classname'], input_path,
+                             stdout_path, stderr_path, time_limit, wall_limit(time_limit),
+                             TIME_LIMIT_MODE == 'cpu', temp_dir, workspace_cap)
+        except JvmRunnerBusy:
+            return None  # Other processes hold the host's runner JVMs
+        except JvmRunnerError as e:
+            logging.warning(f"JVM runner failed, starting java for this run: {e}")
+            return None
+        phases['spawn'] = run['startup']
+        phases['run'] = time.perf_counter() - phase_start - run['startup']
+        return run['returncode'], run['memory_used'], run['cpu_time'], run['wall_time'], None
+    
+    def _read_preview(self, path: str) -> str:
+        """Read at most OUTPUT_PREVIEW_BYTES of a file"""
+        with open(path, 'rb') as f:
+            data = f.read(OUTPUT_PREVIEW_BYTES + 1)
+        text = data[:OUTPUT_PREVIEW_BYTES].decode('utf-8', errors='replace')
+        if len(data) > OUTPUT_PREVIEW_BYTES:
+            text += '\n... (output truncated)'
+        return text
+    
+    def _exceeded_output(self, returncode: int, stdout_path: str, stderr_path: str) -> bool:
+        """Decide whether a run was stopped by the output size cap"""
+        if returncode == -signal.SIGXFSZ:
+            return True
+        return (os.path.getsize(stdout_path) >= OUTPUT_LIMIT_BYTES or
+                os.path.getsize(stderr_path) >= OUTPUT_LIMIT_BYTES)
+    
+    def _exceeded_memory(self, returncode: int, memory_used: int, memory_limit: int, stderr: str) -> bool:
+        """Decide whether a run failed because it hit the memory limit"""
+        if returncode == 0:
+            return False  # Finished within the enforced cap
+        if memory_used >= memory_limit * 1024:  # The run's own peak, see own_peak_rss
+            return True
+        # Allocation failures under the rlimit surface as runtime errors
+        return any(marker in stderr for marker in OUT_OF_MEMORY_MARKERS)
+    
+    def _apply_limits(self, address_limit, time_limit: int):
+        """Resource limits for a sandboxed child; runs in the child"""
+        if address_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (address_limit, address_limit))
+        # CPU-time backstop in case the watchdog is delayed
+        cpu_limit = int(time_limit) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 1))
+        # Bound every file the run writes, stdout and stderr included
+        resource.setrlimit(resource.RLIMIT_FSIZE, (OUTPUT_LIMIT_BYTES, OUTPUT_LIMIT_BYTES))
+    
+    def _spawn_process(self, cmd: List[str], input_path: str, stdout_path: str, stderr_path: str,
+                       temp_dir: str, address_limit, time_limit: int) -> int:
+        """Start a command in its own process group with limits; returns its pid"""
+        def preexec():
+            os.setsid()  # Create new process group
+            self._apply_limits(address_limit, time_limit)
+        
+        with open(input_path, 'rb') as stdin, open(stdout_path, 'wb') as stdout, \
+                open(stderr_path, 'wb') as stderr:
             process = subprocess.Popen(
-                run_cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                preexec_fn=os.setsid
+                cmd,
+                stdin=stdin,
+                stdout=stdout,
+                stderr=stderr,
+                cwd=temp_dir,
+                preexec_fn=preexec
             )
+        # The child is reaped by _wait_for_child (to collect its rusage), so
+        # stop Popen from trying to wait on it as well
+        process.returncode = 0
+        return process.pid
+    
+    def _run_forked_child(self, code_object, filepath: str, input_path: str,
+                          stdout_path: str, stderr_path: str, temp_dir: str,
+                          address_limit, time_limit: int):
+        """Body of a forked Python run; never returns"""
+        exit_code = 1
+        try:
+            os.setsid()  # Own process group so the parent can kill everything
+            os.chdir(temp_dir)
+            stdin_fd = os.open(input_path, os.O_RDONLY)
+            stdout_fd = os.open(stdout_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            stderr_fd = os.open(stderr_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            os.dup2(stdin_fd, 0)
+            os.dup2(stdout_fd, 1)
+            os.dup2(stderr_fd, 2)
+            # Drop every inherited descriptor (pool control channel included)
+            os.closerange(3, os.sysconf('SC_OPEN_MAX'))
+            sys.stdin = open(0, 'r', closefd=False)
+            sys.stdout = open(1, 'w', closefd=False)
+            sys.stderr = open(2, 'w', closefd=False)
+            sys.argv = [filepath]
+            self._apply_limits(address_limit, time_limit)
             
-            stdout, stderr = process.communicate(input=input_data, timeout=time_limit)
-            execution_time = time.time() - start_time
-            
-            if process.returncode == 0:
-                return {
-                    'status': 'success',
-                    'output': stdout.strip(),
-                    'error': stderr.strip() if stderr else '',
-                    'execution_time': execution_time,
-                    'memory_used': 0
-                }
-            else:
-                return {
-                    'status': 'runtime_error',
-                    'output': stdout.strip(),
-                    'error': stderr.strip(),
-                    'execution_time': execution_time,
-                    'memory_used': 0
-                }
-                
-        except subprocess.TimeoutExpired:
-            os.killpg(os.getpgid(process.pid), signal.SIGTERM)
-            process.wait()
-            return {
-                'status': 'time_limit_exceeded',
-                'output': '',
-                'error': f'Time limit exceeded ({time_limit}s)',
-                'execution_time': time_limit,
-                'memory_used': 0
-            }
+            try:
+                exec(code_object, {'__name__': '__main__', '__file__': filepath})
+                exit_code = 0
+            except SystemExit as e:
+                exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            except BaseException as e:
+                # Hide the executor's own frames from the reported traceback
+                tb = e.__traceback__.tb_next if e.__traceback__ else None
+                traceback.print_exception(type(e), e, tb)
+        finally:
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+            finally:
+                os._exit(exit_code)
     
-    def _execute_compiled(self, compile_cmd: List[str], run_cmd: List[str], 
-                         input_data: str, time_limit: int) -> Dict[str, Any]:
-        """Execute compiled languages (C/C++)"""
-        return self._execute_java(compile_cmd, run_cmd, input_data, time_limit)
+    def _cancelled(self) -> bool:
+        return self.cancel_token is not None and self.cancel_token.cancelled
+    
+    def _wait_for_child(self, pid: int, time_limit: float, start_time: float,
+                        sample_memory: bool = False, workspace: Optional[str] = None,
+                        workspace_cap: Optional[int] = None):
+        """Wait for a child; kill its process group once it is over its limit or on cancellation.
+        
+        In cpu mode the limit applies to the child's CPU time, with a wall-clock
+        backstop of wall_limit(time_limit); in wall mode to its elapsed time.
+        With sample_memory the child's peak RSS is read from /proc while it runs.
+        With workspace_cap the workspace's size is checked every
+        WORKSPACE_CHECK_SECONDS and a run that grows it past the cap is killed
+        as if it had hit the file size limit.
+        
+        Returns (exit code, rusage, sampled peak RSS in KB); the exit code is
+        None if the time limit was exceeded or the run was cancelled.
+        """
+        deadline = start_time + wall_limit(time_limit)
+        cpu_limited = TIME_LIMIT_MODE == 'cpu'
+        sampled = 0
+        next_workspace_check = time.time() + WORKSPACE_CHECK_SECONDS
+        while True:
+            if sample_memory:
+                sampled = max(sampled, process_peak_rss(pid))
+            waited_pid, status, rusage = os.wait4(pid, os.WNOHANG)
+            if waited_pid == pid:
+                return os.waitstatus_to_exitcode(status), rusage, sampled
+            over_cap = False
+            if workspace_cap is not None and time.time() >= next_workspace_check:
+                over_cap = workspace_usage(workspace, workspace_cap) > workspace_cap
+                next_workspace_check = time.time() + WORKSPACE_CHECK_SECONDS
+            if (over_cap or time.time() >= deadline or self._cancelled() or
+                    (cpu_limited and process_cpu_seconds(pid) >= time_limit)):
+                try:
+                    os.killpg(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    # Child has not reached setsid() yet
+                    os.kill(pid, signal.SIGKILL)
+                _, _, rusage = os.wait4(pid, 0)
+                return (-signal.SIGXFSZ if over_cap else None), rusage, sampled
+            time.sleep(0.002)
     
     def _extract_java_classname(self, code: str) -> str:
         """Extract the main class name from Java code"""
-        import re
         match = re.search(r'public\s+class\s+(\w+)', code)
         return match.group(1) if match else 'Main'
     
-    def run_test_cases(self, code: str, language: str, test_cases: List[Tuple[str, str]], 
-                      time_limit: int = 5) -> List[Dict[str, Any]]:
+    def run_test_cases(self, code: str, language: str, test_cases: List[Tuple[str, str]],
+                      time_limit: int = 5, memory_limit: int = 256) -> List[Dict[str, Any]]:
         """
         Run code against multiple test cases
         
+        The submission is compiled once and every test case runs in its own
+        isolated child (see execute_batch).
+        
         Args:
             code: Source code
             language: Programming language
             test_cases: List of (input, expected_output) tuples
             time_limit: Time limit per test case
-            
+            memory_limit: Memory limit in MB
+        
         Returns:
             List of test results
         """
         results = []
+        execution_results = self.execute_batch(code, language, [input_data for input_data, _ in test_cases],
+                                               time_limit, memory_limit,
+                                               expected_outputs=[expected for _, expected in test_cases])
         
-        for i, (input_data, expected_output) in enumerate(test_cases):
-            result = self.execute_code(code, language, input_data, time_limit)
-            
+        for i, ((input_data, expected_output), result) in enumerate(zip(test_cases, execution_results)):
             if result['status'] == 'success':
                 actual_output = result['output'].strip()
                 expected_output = expected_output.strip()
                 
-                if actual_output == expected_output:
+                if result['passed']:
                     test_result = {
                         'test_case': i + 1,
                         'status': 'passed',
@@ -285,6 +827,7 @@ class CodeExecutor:
                         'expected': expected_output,
                         'actual': actual_output,
                         'execution_time': result['execution_time'],
+                        'memory_used': result['memory_used'],
                         'error': ''
                     }
                 else:
@@ -295,7 +838,8 @@ class CodeExecutor:
                         'expected': expected_output,
                         'actual': actual_output,
                         'execution_time': result['execution_time'],
-                        'error': 'Wrong answer'
+                        'memory_used': result['memory_used'],
+                        'error': result['error'] or 'Wrong answer'
                     }
             else:
                 test_result = {
@@ -305,9 +849,10 @@ class CodeExecutor:
                     'expected': expected_output,
                     'actual': '',
                     'execution_time': result['execution_time'],
+                    'memory_used': result['memory_used'],
                     'error': result['error']
                 }
             
             results.append(test_result)
         
-        return results
\ No newline at end of file
+        return results
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Dict, List, Optional, Any
+
+
+class CompileCache:
+    """On-disk, content-addressed cache of compiled submissions.
+    
+    Entries are keyed by language, compiler flags and a hash of the source.
+    Each entry is a directory holding the build artifacts (or the compiler
+    error) plus a meta.json file. The least recently used entries are evicted
+    once the cache grows past max_bytes.
+    """
+    
+    META_FILE = 'meta.json'
+    
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+    
+    def make_key(self, language: str, source: str, flags: List[str]) -> str:
+        """Build the cache key for a source file compiled with the given flags"""
+        digest = hashlib.sha256()
+        digest.update(language.encode())
+        digest.update(b'\0')
+        digest.update('\0'.join(flags).encode())
+        digest.update(b'\0')
+        digest.update(source.encode())
+        return digest.hexdigest()
+    
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+    
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached entry for a key, or None on a miss
+        
+        The returned dict has 'status' ('ok' or 'compilation_error'), 'error'
+        and, for successful builds, 'path' pointing at the artifact directory.
+        """
+        entry_dir = self._entry_dir(key)
+        meta_path = os.path.join(entry_dir, self.META_FILE)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            os.utime(meta_path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+        
+        meta['path'] = entry_dir
+        return meta
+    
+    def restore(self, entry: Dict[str, Any], dest_dir: str):
+        """
+        Copy the artifacts of a cached build into a working directory
+        
+        Artifacts are copied rather than hardlinked: a run can write to the
+        files in its workspace, and a shared inode would carry those writes
+        into the cache entry and every later run that restores it.
+        """
+        for artifact in entry.get('artifacts', []):
+            shutil.copy2(os.path.join(entry['path'], artifact), os.path.join(dest_dir, artifact))
+    
+    def store(self, key: str, build_dir: str, artifacts: List[str], error: str = ''):
+        """Store a build result; artifacts are file names relative to build_dir"""
+        entry_dir = self._entry_dir(key)
+        if os.path.exists(entry_dir):
+            return
+        
+        parent = os.path.dirname(entry_dir)
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.staging-', dir=parent)
+        try:
+            for artifact in artifacts:
+                shutil.copy2(os.path.join(build_dir, artifact), os.path.join(staging, artifact))
+            meta = {
+                'status': 'compilation_error' if error else 'ok',
+                'error': error,
+                'artifacts': artifacts,
+                'created_at': time.time()
+            }
+            with open(os.path.join(staging, self.META_FILE), 'w') as f:
+                json.dump(meta, f)
+            # Atomic publish; a concurrent writer of the same key wins the race
+            os.rename(staging, entry_dir)
+        except OSError as e:
+            logging.debug(f"Compile cache store skipped for {key}: {e}")
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        
+        self.evict()
+    
+    def evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = []
+        total_size = 0
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.startswith('.staging-'):
+                    continue
+                try:
+                    size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                    last_used = os.stat(os.path.join(entry.path, self.META_FILE)).st_mtime
+                except OSError:
+                    continue
+                entries.append((last_used, size, entry.path))
+                total_size += size
+        
+        if total_size <= self.max_bytes:
+            return
+        
+        entries.sort()
+        for last_used, size, path in entries:
+            if total_size <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_size -= size
+        logging.info(f"Compile cache evicted down to {total_size} bytes")
+
+
+# Global cache instance
+compile_cache = None
+_cache_lock = threading.Lock()
+
+def get_compile_cache() -> Optional[CompileCache]:
+    """Return the shared compile cache, or None when caching is disabled"""
+    global compile_cache
+    max_mb = int(os.environ.get('JUDGE_COMPILE_CACHE_MB', '512'))
+    if max_mb <= 0:
+        return None
+    with _cache_lock:
+        if compile_cache is None:
+            root = os.environ.get('JUDGE_COMPILE_CACHE_DIR',
+                                  os.path.join(tempfile.gettempdir(), 'codetrack-compile-cache'))
+            compile_cache = CompileCache(root, max_mb * 1024 * 1024)
+    return compile_cache
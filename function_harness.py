@@ -0,0 +1,470 @@
+import json
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+from code_executor import TIME_LIMIT_MODE, skipped_result, wall_limit, run_noise
+from output_checker import tokens_equal
+
+# Parameter types a function signature may use, and how each is read from a
+# test's input text:
+#   int, float, word     - next whitespace-separated token
+#   line                 - the next line (or the rest of the current one), stripped
+#   int_list, float_list, word_list - every token of the next line
+#   int_array, float_array - a count token followed by that many values
+PARAM_TYPES = ('int', 'float', 'word', 'line', 'int_list', 'float_list', 'word_list',
+               'int_array', 'float_array')
+
+# Function-style problems created before signatures were stored on the problem
+LEGACY_SIGNATURES = {
+    "Sum of Two Numbers": {
+        'function': 'solution',
+        'params': [{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}]
+    },
+    "Reverse a String": {
+        'function': 'solution',
+        'params': [{'name': 's', 'type': 'line'}]
+    },
+    "Find Maximum": {
+        'function': 'solution',
+        'params': [{'name': 'numbers', 'type': 'int_array'}]
+    }
+}
+
+# Longest output / error excerpt reported for a failing test
+PREVIEW_CHARS = 200
+ERROR_CHARS = 1000
+
+# Runs inside the sandbox. Reads its configuration and every test input from
+# stdin and parses all inputs up front. The solution is loaded in a forked
+# child with its output discarded, and called once per test over a pipe; this
+# process times and kills it, so the solution can neither stop its own clock
+# nor write to the report. Nothing here knows the expected outputs: the
+# report holds the formatted return values, which are checked by the judge
+# (see check_harness_report). It is written once the solution is dead.
+HARNESS_TEMPLATE = r'''
+import io
+import os
+import sys
+import json
+import time
+import ctypes
+import select
+import signal
+import resource
+import traceback
+
+_config = json.loads(sys.stdin.read())
+sys.stdin = io.StringIO('')
+_libc = ctypes.CDLL(None, use_errno=True)
+# Not dumpable: the solution cannot reach this process through /proc
+_libc.prctl(4, 0, 0, 0, 0)  # PR_SET_DUMPABLE
+
+
+class _Reader:
+    def __init__(self, text):
+        self.text = text
+        self.pos = 0
+    
+    def token(self):
+        text, pos = self.text, self.pos
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        end = pos
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        if pos == end:
+            raise ValueError('input ended early')
+        self.pos = end
+        return text[pos:end]
+    
+    def line(self):
+        text = self.text
+        end = text.find('\n', self.pos)
+        if end < 0:
+            end = len(text)
+        rest = text[self.pos:end]
+        if self.pos > 0 and text[self.pos - 1] != '\n' and not rest.strip() and end < len(text):
+            # The current line was used up by earlier tokens
+            self.pos = end + 1
+            return self.line()
+        self.pos = min(end + 1, len(text))
+        return rest
+
+
+_PARSERS = {
+    'int': lambda r: int(r.token()),
+    'float': lambda r: float(r.token()),
+    'word': lambda r: r.token(),
+    'line': lambda r: r.line().strip(),
+    'int_list': lambda r: [int(x) for x in r.line().split()],
+    'float_list': lambda r: [float(x) for x in r.line().split()],
+    'word_list': lambda r: r.line().split(),
+    'int_array': lambda r: [int(r.token()) for _ in range(int(r.token()))],
+    'float_array': lambda r: [float(r.token()) for _ in range(int(r.token()))],
+}
+
+
+def _parse(text):
+    reader = _Reader(text)
+    return [_PARSERS[param['type']](reader) for param in _config['params']]
+
+
+def _format(value):
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, (list, tuple)) for v in value):
+            return '\n'.join(_format(v) for v in value)
+        return ' '.join(_format(v) for v in value)
+    return str(value)
+
+
+def _describe(error):
+    # Drop the harness frame so the traceback starts in the solution
+    lines = traceback.format_exception(type(error), error, error.__traceback__.tb_next)
+    return ''.join(lines).strip()[:_config['error_chars']]
+
+
+def _serve(requests, replies):
+    # Solution process: output discarded, no further processes, one reply
+    # line per test index received
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    keep = sorted((requests, replies))
+    os.closerange(3, keep[0])
+    os.closerange(keep[0] + 1, keep[1])
+    os.closerange(keep[1] + 1, os.sysconf('SC_OPEN_MAX'))
+    try:
+        resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    except (ValueError, OSError):
+        pass
+    reply = os.fdopen(replies, 'w')
+    
+    def send(record):
+        reply.write(json.dumps(record) + '\n')
+        reply.flush()
+    
+    try:
+        namespace = {'__name__': 'solution', '__builtins__': __builtins__}
+        exec(compile(_SOURCE, '<solution>', 'exec'), namespace)
+        function = namespace.get(_config['function'])
+        if not callable(function):
+            raise NameError(f"function {_config['function']}() is not defined")
+    except BaseException as e:
+        send({'setup_error': _describe(e)})
+        os._exit(0)
+    send({'ready': True})
+    for line in os.fdopen(requests, 'r'):
+        try:
+            send({'status': 'success', 'value': _format(function(*_inputs[int(line)]))})
+        except MemoryError:
+            send({'status': 'memory_limit_exceeded', 'error': 'Memory limit exceeded'})
+        except BaseException as e:
+            send({'status': 'runtime_error', 'error': _describe(e)})
+    os._exit(0)
+
+
+def _cpu_seconds(clock):
+    try:
+        return time.clock_gettime(clock)
+    except OSError:
+        return 0.0  # The solution process is gone
+
+
+def _start():
+    # Returns ((pid, CPU clock, request fd, reply fd), None), or (None, setup error)
+    request_read, request_write = os.pipe()
+    reply_read, reply_write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            os.close(request_write)
+            os.close(reply_read)
+            _serve(request_read, reply_write)
+        finally:
+            os._exit(1)
+    os.close(request_read)
+    os.close(reply_write)
+    clock = ctypes.c_int()
+    _libc.clock_getcpuclockid(pid, ctypes.byref(clock))
+    solution = (pid, clock.value, request_write, reply_read)
+    # Loading the solution gets the time of one call
+    record = _receive(solution, time.perf_counter(), _cpu_seconds(clock.value))
+    if 'ready' in record:
+        return solution, None
+    _stop(solution)
+    return None, record.get('setup_error') or record.get('error')
+
+
+def _stop(solution):
+    pid, _, request_fd, reply_fd = solution
+    try:
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+    except OSError:
+        pass  # Already reaped by _receive
+    os.close(request_fd)
+    os.close(reply_fd)
+
+
+def _receive(solution, start, start_cpu):
+    # Next reply of the solution, or a record of why there is none; records
+    # marked 'stopped' mean the solution has to be replaced
+    pid, clock, _, reply_fd = solution
+    time_limit_exceeded = {'status': 'time_limit_exceeded', 'stopped': True,
+                           'error': f"Time limit exceeded ({_config['time_limit']}s)"}
+    chunks = []
+    while not chunks or not chunks[-1].endswith(b'\n'):
+        elapsed = time.perf_counter() - start
+        cpu = _cpu_seconds(clock) - start_cpu
+        if elapsed >= _config['wall_limit'] or (_config['cpu_limit'] and cpu >= _config['time_limit']):
+            return time_limit_exceeded
+        ready, _, _ = select.select([reply_fd], [], [], min(0.05, _config['wall_limit'] - elapsed))
+        if not ready:
+            continue
+        chunk = os.read(reply_fd, 1 << 16)
+        if not chunk:
+            # The solution died, or closed its end of the pipe
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+            _, status = os.waitpid(pid, 0)
+            if os.WIFSIGNALED(status) and os.WTERMSIG(status) == signal.SIGXCPU:
+                return time_limit_exceeded
+            return {'status': 'runtime_error', 'stopped': True, 'error': 'Solution process exited'}
+        chunks.append(chunk)
+    try:
+        record = json.loads(b''.join(chunks))
+    except ValueError:
+        record = None
+    if not isinstance(record, dict):
+        return {'status': 'runtime_error', 'stopped': True, 'error': 'Solution wrote to the judge pipe'}
+    return record
+
+
+def _call(solution, index):
+    _, clock, request_fd, _ = solution
+    start, start_cpu = time.perf_counter(), _cpu_seconds(clock)
+    os.write(request_fd, f'{index}\n'.encode())
+    reply = _receive(solution, start, start_cpu)
+    elapsed, cpu = time.perf_counter() - start, _cpu_seconds(clock) - start_cpu
+    if reply.get('status') not in ('success', 'runtime_error', 'memory_limit_exceeded', 'time_limit_exceeded'):
+        reply = {'status': 'runtime_error', 'stopped': True, 'error': 'Solution wrote to the judge pipe'}
+    record = {'status': reply['status'], 'stopped': reply.get('stopped', False),
+              'time': elapsed, 'cpu': max(0.0, cpu)}
+    if reply['status'] == 'success':
+        record['value'] = str(reply.get('value', ''))
+    else:
+        record['error'] = str(reply.get('error', ''))[:_config['error_chars']]
+    if reply['status'] == 'time_limit_exceeded':
+        record['time'] = _config['time_limit']
+    return record
+
+
+_inputs = []
+for _text in _config['inputs']:
+    try:
+        _inputs.append(_parse(_text))
+    except Exception as e:
+        _inputs.append(e)
+
+_report = {'tests': []}
+_solution, _setup_error = _start()
+if _solution is None:
+    _report['setup_error'] = _setup_error
+else:
+    _failed = False
+    for _index, _args in enumerate(_inputs):
+        if _failed and _config['stop_on_failure']:
+            _record = {'status': 'skipped'}
+        elif isinstance(_args, Exception):
+            _record = {'status': 'error', 'error': f'Could not parse test input: {_args}'[:_config['error_chars']]}
+        elif _solution is None:
+            _record = {'status': 'runtime_error', 'error': _setup_error}
+        else:
+            _record = _call(_solution, _index)
+            if _record.pop('stopped'):
+                # Killed mid-call or dead; the next test gets a fresh solution
+                _stop(_solution)
+                _solution, _setup_error = _start() if _index + 1 < len(_inputs) else (None, None)
+        _record['i'] = _index
+        _report['tests'].append(_record)
+        _failed = _failed or _record['status'] not in ('success', 'skipped')
+    if _solution is not None:
+        _stop(_solution)
+_report['memory'] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+# Replace anything the solution managed to put in the report file
+try:
+    os.ftruncate(1, 0)
+    os.lseek(1, 0, os.SEEK_SET)
+except OSError:
+    pass
+sys.stdout.write(json.dumps(_report))
+sys.stdout.flush()
+'''
+
+
+def parse_signature(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Parse and validate a function signature given as JSON
+    
+    Format: {"function": "solution", "params": [{"name": "a", "type": "int"}, ...]}
+    
+    Returns:
+        The signature dict, or None for empty text
+    
+    Raises:
+        ValueError: If the signature is malformed
+    """
+    if not text or not text.strip():
+        return None
+    
+    try:
+        signature = json.loads(text)
+    except ValueError as e:
+        raise ValueError(f'Function signature is not valid JSON: {e}')
+    if not isinstance(signature, dict) or not isinstance(signature.get('params'), list):
+        raise ValueError('Function signature needs a "params" list')
+    
+    function = signature.get('function', 'solution')
+    if not isinstance(function, str) or not function.isidentifier():
+        raise ValueError('Function name must be a Python identifier')
+    for param in signature['params']:
+        if not isinstance(param, dict) or not str(param.get('name', '')).isidentifier():
+            raise ValueError('Every parameter needs an identifier "name"')
+        if param.get('type') not in PARAM_TYPES:
+            raise ValueError(f"Unknown parameter type {param.get('type')!r}; use one of {', '.join(PARAM_TYPES)}")
+    
+    return {'function': function,
+            'params': [{'name': p['name'], 'type': p['type']} for p in signature['params']]}
+
+
+def get_signature(problem) -> Optional[Dict[str, Any]]:
+    """The problem's function signature, or None for stdin-style problems"""
+    if problem.function_signature:
+        return json.loads(problem.function_signature)
+    return LEGACY_SIGNATURES.get(problem.title)
+
+
+def starter_code(signature: Dict[str, Any]) -> str:
+    """Skeleton solution shown in the editor for a function-style problem"""
+    names = ', '.join(param['name'] for param in signature['params'])
+    lines = [f"def {signature['function']}({names}):"]
+    for param in signature['params']:
+        lines.append(f"    # {param['name']}: {param['type']}")
+    lines.append("    # Write your solution here")
+    lines.append("    pass")
+    return '\n'.join(lines)
+
+
+def build_harness(code: str, signature: Dict[str, Any], inputs: List[str], time_limit: float,
+                  stop_on_failure: bool = False) -> Tuple[str, str]:
+    """
+    Build a harness run that calls the solution on every test in one sandbox run
+    
+    Returns:
+        (harness source, stdin data for the run)
+    """
+    source = f"_SOURCE = {code!r}\n" + HARNESS_TEMPLATE
+    config = {
+        'function': signature['function'],
+        'params': signature['params'],
+        'inputs': inputs,
+        'time_limit': time_limit,
+        'wall_limit': wall_limit(time_limit),
+        'cpu_limit': TIME_LIMIT_MODE == 'cpu',
+        'stop_on_failure': stop_on_failure,
+        'error_chars': ERROR_CHARS
+    }
+    return source, json.dumps(config)
+
+
+def values_match(actual: str, expected: str, float_tolerance: Optional[float] = None) -> bool:
+    """Whether a formatted return value matches the expected output, token by token"""
+    actual_tokens = actual.encode('utf-8').split()
+    expected_tokens = expected.encode('utf-8').split()
+    return len(actual_tokens) == len(expected_tokens) and all(
+        tokens_equal(a, e, float_tolerance) for a, e in zip(actual_tokens, expected_tokens))
+
+
+def check_harness_report(path: str, expected_outputs: List[str],
+                         float_tolerance: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Read the report of a harness run and check each returned value
+    
+    Runs outside the sandbox, so expected outputs never meet the solution.
+    Returned values are replaced with 'passed' and, for wrong answers, a
+    bounded 'output' excerpt. An unreadable report yields an empty one.
+    """
+    try:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            report = json.load(f)
+        tests = report['tests']
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning(f"Unreadable harness report: {e}")
+        return {}
+    for record in tests:
+        if record.get('status') == 'success':
+            value = str(record.pop('value', ''))
+            record['passed'] = values_match(value, expected_outputs[record['i']], float_tolerance)
+            if not record['passed']:
+                record['output'] = value[:PREVIEW_CHARS]
+    return report
+
+
+def parse_harness_results(result: Dict[str, Any], report: Dict[str, Any], count: int,
+                          stop_on_failure: bool = False) -> List[Dict[str, Any]]:
+    """
+    Turn a harness run and its checked report into one CodeExecutor-style result per test
+    
+    Tests the harness did not report on (the harness itself crashed, ran out
+    of time or memory) get the status of the run as a whole. With
+    stop_on_failure the tests after the first failure are skipped; the
+    harness can only stop early on errors, since it does not know the
+    expected outputs.
+    """
+    records = {}
+    for record in report.get('tests', []):
+        if isinstance(record.get('i'), int):
+            records[record['i']] = record
+    setup_error = report.get('setup_error')
+    
+    memory_used = max(result.get('memory_used', 0), report.get('memory', 0))
+    results = []
+    failed = False
+    for index in range(count):
+        record = records.get(index)
+        if setup_error is not None:
+            record = {'status': 'runtime_error', 'error': setup_error}
+        elif record is None:
+            status = result['status'] if result['status'] != 'success' else 'error'
+            record = {'status': status, 'error': result.get('error') or 'Judge harness stopped before this test'}
+        
+        if record['status'] == 'skipped' or (failed and stop_on_failure):
+            results.append(skipped_result())
+            continue
+        
+        entry = {
+            'success': record['status'] == 'success',
+            'status': record['status'],
+            'output': record.get('output', ''),
+            'error': record.get('error', ''),
+            'execution_time': record.get('cpu' if TIME_LIMIT_MODE == 'cpu' else 'time', 0.0),
+            'memory_used': memory_used,
+            'cpu_time': record.get('cpu', 0.0),
+            'wall_time': record.get('time', 0.0),
+            'noise': run_noise(record.get('cpu', 0.0), record.get('time', 0.0))
+        }
+        if record['status'] == 'success':
+            entry['passed'] = record.get('passed', False)
+            entry['diff'] = record.get('output', '')
+            if not entry['passed']:
+                entry['error'] = 'Wrong answer'
+        failed = not entry['success'] or not entry['passed']
+        results.append(entry)
+    
+    if results and 'phases' in result:
+        # Write, compile and spawn happened once for the whole harness run
+        results[0]['phases'] = result['phases']
+    return results
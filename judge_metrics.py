@@ -0,0 +1,172 @@
+import bisect
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple, Any
+
+# Upper bounds in seconds, spanning a forked Python run (~2 ms) to a long queue wait
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Labelled latency histogram with cumulative buckets, Prometheus style"""
+    
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels):
+        key = tuple(_escape(labels.get(name, '')) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+            series['counts'][index] += 1
+            series['sum'] += value
+    
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = [(key, list(s['counts']), s['sum']) for key, s in sorted(self._series.items())]
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            cumulative += counts[-1]
+            labels = _format_labels(self.label_names, key, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {total}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide set of histograms plus gauges computed on scrape"""
+    
+    def __init__(self):
+        self.histograms = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+    
+    def histogram(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(name, help_text, label_names, buckets)
+            return self.histograms[name]
+    
+    def register_gauge(self, name: str, help_text: str, callback: Callable[[], float]):
+        """Register a gauge whose value is read from callback at scrape time"""
+        with self._lock:
+            self.gauges[name] = (help_text, callback)
+    
+    def render(self) -> str:
+        lines = []
+        for histogram in list(self.histograms.values()):
+            lines.extend(histogram.render())
+        for name, (help_text, callback) in sorted(self.gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                logging.debug(f"Gauge {name} failed: {e}")
+                continue
+            lines.extend([f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}'])
+        return '\n'.join(lines) + '\n'
+
+
+# Global registry instance
+metrics = MetricsRegistry()
+
+PHASE_SECONDS = metrics.histogram(
+    'judge_phase_seconds',
+    'Time spent per judging phase (write, compile, spawn, run, check, db_commit)',
+    ('phase', 'language', 'problem'))
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    'judge_queue_wait_seconds',
+    'Time a submission waited in the queue before a judge worker claimed it',
+    ('language', 'problem'))
+SUBMISSION_SECONDS = metrics.histogram(
+    'judge_submission_seconds',
+    'Time from claiming a submission to its committed verdict',
+    ('language', 'problem'))
+RUN_WALL_CPU_RATIO = metrics.histogram(
+    'judge_run_wall_cpu_ratio',
+    'Wall time over CPU time per run; values well above 1 mean noisy timing',
+    ('language',), (1.0, 1.05, 1.1, 1.25, 1.5, 2.0, 3.0, 5.0, 10.0))
+RUN_INVOLUNTARY_SWITCHES = metrics.histogram(
+    'judge_run_involuntary_switches',
+    'Involuntary context switches (preemptions) per run',
+    ('language',), (0, 1, 5, 10, 50, 100, 500, 1000))
+
+
+def observe_phase(phase: str, seconds: float, language: str, problem_id):
+    PHASE_SECONDS.observe(seconds, phase=phase, language=language, problem=problem_id)
+
+
+def record_run_phases(results: List[Dict[str, Any]], language: str, problem_id):
+    """Record the per-phase timings CodeExecutor attached to its results"""
+    for result in results:
+        for phase, seconds in result.get('phases', {}).items():
+            observe_phase(phase, seconds, language, problem_id)
+
+
+def record_run_noise(results: List[Dict[str, Any]], language: str):
+    """Record the noise indicators CodeExecutor attached to its results"""
+    for result in results:
+        noise = result.get('noise')
+        if not noise:
+            continue
+        if noise['wall_cpu_ratio'] is not None:
+            RUN_WALL_CPU_RATIO.observe(noise['wall_cpu_ratio'], language=language)
+        if noise['involuntary_switches'] is not None:
+            RUN_INVOLUNTARY_SWITCHES.observe(noise['involuntary_switches'], language=language)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # Scrapes are too frequent to log
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1'):
+    """
+    Serve the registry over HTTP, for judge workers running outside the web app
+    
+    The endpoint has no authentication, so it listens on loopback unless
+    another host is given.
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    logging.info(f"Judge metrics served on {host}:{port}")
+    return server
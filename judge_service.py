@@ -0,0 +1,734 @@
+import json
+import time
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple, Any, Optional
+
+from sqlalchemy import func, select, literal
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import app, db
+from models import Contest, ContestSubmission, ContestProblem, ContestTestCase, ContestTestResult, ContestParticipant, ContestProblemScore, ContestVerdictCache, ContestRejudgeJob
+from code_executor import CodeExecutor, progress_summary
+from sandbox_pool import get_worker_pool
+from time_calibration import time_limit_for
+from function_harness import get_signature, build_harness, check_harness_report, parse_harness_results
+from judge_metrics import metrics, observe_phase, record_run_phases, record_run_noise, QUEUE_WAIT_SECONDS, SUBMISSION_SECONDS
+from workspace_pool import workspace_occupancy
+from bundle_store import get_test_bundle_store
+from leaderboard_index import leaderboards
+
+# Contest judging policies: partial scoring, or all-or-nothing with early exit
+JUDGING_POLICIES = ('score_all', 'stop_on_first_failure')
+
+# Submission statuses that mean judging is over
+FINAL_STATUSES = ('accepted', 'partial', 'wrong_answer', 'compilation_error', 'error')
+
+# Run statuses that depend on judge load or health rather than on the code;
+# verdicts containing them are never cached
+UNCACHEABLE_RUN_STATUSES = ('error', 'time_limit_exceeded', 'cancelled')
+
+# Postgres advisory lock namespace under which a contest's scores are written
+# (the second key is the contest id)
+SCORE_LOCK_NAMESPACE = 5301
+
+# Judge-generated limit messages that may be shown for hidden tests; any other
+# message of a hidden test could quote its expected output or echo its input
+LIMIT_MESSAGES = ('Time limit exceeded', 'Memory limit exceeded', 'Output limit exceeded')
+
+
+def _queue_pending() -> int:
+    # Scrapes are served from the metrics server's thread, outside any app context
+    with app.app_context():
+        return JudgeService.count_pending()
+
+
+metrics.register_gauge('judge_queue_pending', 'Submissions waiting for a judge worker', _queue_pending)
+metrics.register_gauge('judge_workspaces_in_use', 'Sandbox workspaces currently handed out to runs',
+                       lambda: workspace_occupancy()['in_use'])
+metrics.register_gauge('judge_workspace_occupancy', 'Share of sandbox workspaces in use',
+                       lambda: workspace_occupancy()['occupancy'])
+
+# Live progress of a submission is written at most this often
+PROGRESS_FLUSH_SECONDS = 0.25
+
+
+class SubmissionProgress:
+    """Live per-test progress of a submission being judged.
+    
+    Runs report here as they finish, possibly from pool chunk threads, and
+    the counters are written to the submission row through their own
+    connection (at most every PROGRESS_FLUSH_SECONDS), so the web app can
+    stream them while the judge's session is still busy.
+    """
+    
+    def __init__(self, submission_id: int, total: int):
+        self.submission_id = submission_id
+        self.total = total
+        self.done = 0
+        self.passed = 0
+        self.last_status = None
+        self._engine = db.engine  # Resolved here; chunk threads have no app context
+        self._flushed_at = 0.0
+        self._lock = threading.Lock()
+    
+    def record(self, index: int, summary: Dict[str, Any]):
+        """CodeExecutor on_progress callback"""
+        if summary['status'] == 'success':
+            status = 'failed' if summary['passed'] is False else 'passed'
+        else:
+            status = summary['status']
+        with self._lock:
+            self.done += 1
+            self.passed += status == 'passed'
+            self.last_status = status
+            now = time.monotonic()
+            if now - self._flushed_at < PROGRESS_FLUSH_SECONDS and self.done < self.total:
+                return
+            self._flushed_at = now
+            values = {'tests_done': self.done, 'passed_tests': self.passed, 'last_test_status': status}
+        try:
+            with self._engine.begin() as connection:
+                connection.execute(ContestSubmission.__table__.update()
+                                   .where(ContestSubmission.__table__.c.id == self.submission_id)
+                                   .values(**values))
+        except Exception as e:
+            logging.warning(f"Could not record progress of submission {self.submission_id}: {e}")
+
+
+class JudgeService:
+    """Service for queueing and judging contest submissions"""
+    
+    @staticmethod
+    def enqueue_submission(contest_id, problem_id, user_id, code, language):
+        """Store a new submission as pending; a judge worker picks it up"""
+        submission = ContestSubmission()
+        submission.contest_id = contest_id
+        submission.problem_id = problem_id
+        submission.user_id = user_id
+        submission.code = code
+        submission.language = language
+        submission.status = 'pending'
+        
+        db.session.add(submission)
+        db.session.commit()
+        return submission
+    
+    @staticmethod
+    def count_pending():
+        """Number of submissions waiting for a judge worker"""
+        return ContestSubmission.query.filter_by(status='pending').count()
+    
+    @staticmethod
+    def claim_next_submission(worker_id):
+        """
+        Atomically move the oldest pending submission to running
+        
+        Uses SELECT ... FOR UPDATE SKIP LOCKED so concurrent judge workers
+        never claim the same submission. New submissions go ahead of rejudges.
+        """
+        submission = ContestSubmission.query.filter_by(status='pending').order_by(
+            ContestSubmission.rejudge_job_id.isnot(None).asc(),
+            ContestSubmission.submitted_at.asc(),
+            ContestSubmission.id.asc()
+        ).with_for_update(skip_locked=True).first()
+        
+        if submission is None:
+            db.session.commit()  # Release the transaction
+            return None
+        
+        submission.status = 'running'
+        submission.judge_worker = worker_id
+        submission.judge_started_at = datetime.utcnow()
+        db.session.commit()
+        
+        if submission.submitted_at:
+            QUEUE_WAIT_SECONDS.observe((submission.judge_started_at - submission.submitted_at).total_seconds(),
+                                       language=submission.language, problem=submission.problem_id)
+        return submission
+    
+    @staticmethod
+    def requeue_stale_submissions(max_running_seconds=600):
+        """Return submissions stuck in running (e.g. a worker died) to the queue"""
+        cutoff = datetime.utcnow() - timedelta(seconds=max_running_seconds)
+        count = ContestSubmission.query.filter(
+            ContestSubmission.status == 'running',
+            ContestSubmission.judge_started_at < cutoff
+        ).update({'status': 'pending', 'judge_worker': None}, synchronize_session=False)
+        db.session.commit()
+        if count:
+            logging.warning(f"Requeued {count} stale submissions")
+        return count
+    
+    @staticmethod
+    def load_test_cases(problem, samples_only=False):
+        """
+        Test cases of a problem, with input and expected output read from the
+        in-memory test bundle for the problem's current test version
+        
+        Only ids, flags and failure counters are queried per call; the Text
+        blobs are read from the database once per test version and process.
+        """
+        query = ContestTestCase.query.filter_by(problem_id=problem.id)
+        if samples_only:
+            query = query.filter_by(is_sample=True)
+        store = get_test_bundle_store()
+        if store is None:
+            return query.all()
+        
+        test_cases = query.options(load_only(
+            ContestTestCase.id, ContestTestCase.problem_id, ContestTestCase.is_sample,
+            ContestTestCase.run_count, ContestTestCase.fail_count
+        )).all()
+        version = problem.test_version or 1
+        try:
+            bundle = store.get(problem.id, version)
+            if bundle is None or any(tc.id not in bundle.tests for tc in test_cases):
+                full_tests = ContestTestCase.query.filter_by(problem_id=problem.id).all()
+                bundle = store.build(problem.id, version, full_tests)
+            for test_case in test_cases:
+                set_committed_value(test_case, 'input_data', bundle.input_data(test_case.id))
+                set_committed_value(test_case, 'expected_output', bundle.expected_output(test_case.id))
+        except (ValueError, KeyError) as e:
+            # Deferred columns then load from the database on access
+            logging.warning(f"Test bundle for problem {problem.id} unavailable: {e}")
+        return test_cases
+    
+    @staticmethod
+    def order_test_cases(test_cases):
+        """Order tests so the ones that fail most often run first"""
+        return sorted(test_cases, key=lambda tc: (-tc.failure_rate(), tc.id))
+    
+    @staticmethod
+    def run_tests(executor, problem, code, language, test_cases,
+                  stop_on_failure=False, on_progress=None, time_limit=None) -> List[Dict[str, Any]]:
+        """
+        Execute a submission against test cases
+        
+        Stdin-style problems are judged as one batch (compiled once, one
+        isolated run per test). Python solutions to function-style problems run
+        in a single harness run that loads the solution once and times each
+        solution() call separately; the returned values are checked here,
+        outside the sandbox. With stop_on_failure the tests after
+        the first failure are skipped. on_progress is passed on to
+        execute_batch; harness runs report every test once they are done.
+        time_limit overrides the language's limit, for calibration runs.
+        
+        Returns:
+            List of execution results, in test case order
+        """
+        inputs = [tc.input_data for tc in test_cases]
+        expected_outputs = [tc.expected_output for tc in test_cases]
+        time_limit = time_limit or time_limit_for(problem, language)
+        signature = get_signature(problem) if language == 'python' else None
+        if signature is None:
+            return executor.execute_batch(code, language, inputs,
+                                          time_limit, problem.memory_limit,
+                                          expected_outputs=expected_outputs,
+                                          stop_on_failure=stop_on_failure,
+                                          float_tolerance=problem.float_tolerance,
+                                          on_progress=on_progress)
+        
+        # The harness would only report a syntax error as a crash on every test
+        compile_error = executor.precompile(code, language)
+        if compile_error:
+            return [dict(compile_error) for _ in test_cases]
+        
+        source, stdin_data = build_harness(code, signature, inputs, time_limit, stop_on_failure)
+        report = {}
+        
+        def check_report(index, path):
+            # Return values are compared here, outside the sandbox
+            report.update(check_harness_report(path, expected_outputs, problem.float_tolerance))
+            return {'passed': True, 'message': '', 'window': ''}
+        
+        # The per-call limit is enforced inside the harness; the process as a
+        # whole gets the combined budget
+        result = executor.execute_batch(source, 'python', [stdin_data],
+                                        time_limit * max(1, len(test_cases)), problem.memory_limit,
+                                        checker=check_report)[0]
+        results = parse_harness_results(result, report, len(test_cases), stop_on_failure)
+        if on_progress is not None:
+            for index, test_result in enumerate(results):
+                if test_result['status'] != 'skipped':
+                    on_progress(index, progress_summary(test_result))
+        return results
+    
+    @staticmethod
+    def check_result(result, expected_output) -> Dict[str, Any]:
+        """
+        Compare an execution result with the expected output
+        
+        Batch runs arrive already checked against the full output file ('passed'
+        and a bounded 'diff' window); only that window is kept for failures.
+        """
+        if result['status'] == 'skipped':
+            return {'status': 'skipped', 'actual_output': None, 'error_message': result['error']}
+        if result['status'] == 'compilation_error':
+            return {
+                'status': 'compilation_error',
+                'actual_output': None,
+                'error_message': result['error'],
+                'error_line': result.get('error_line'),
+                'error_column': result.get('error_column')
+            }
+        if not result['success']:
+            return {
+                'status': 'error',
+                'actual_output': result.get('output', ''),
+                'error_message': result['error']
+            }
+        
+        if 'passed' in result:
+            if result['passed']:
+                return {'status': 'passed', 'actual_output': result['output'], 'error_message': None}
+            return {'status': 'failed', 'actual_output': result['diff'], 'error_message': result['error']}
+        
+        actual_output = result['output'].strip()
+        if actual_output.split() == expected_output.split():
+            return {'status': 'passed', 'actual_output': actual_output, 'error_message': None}
+        return {'status': 'failed', 'actual_output': actual_output, 'error_message': None}
+    
+    @staticmethod
+    def build_outcome(test_case, result) -> Dict[str, Any]:
+        """Checked result of one test plus its resource usage, as stored and cached"""
+        outcome = JudgeService.check_result(result, test_case.expected_output)
+        outcome['test_case_id'] = test_case.id
+        outcome['execution_time'] = result.get('execution_time', 0.0)
+        outcome['memory_used'] = result.get('memory_used', 0)
+        return outcome
+    
+    @staticmethod
+    def judge_tests(executor, problem, code, language, test_cases, scope,
+                    stop_on_failure=False, on_progress=None) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Per-test outcomes for a submission, served from the verdict cache when
+        identical code was already judged against the same test set
+        
+        Returns:
+            (outcomes in test case order, whether they came from the cache)
+        """
+        cached = JudgeService.get_cached_outcomes(problem, language, code, scope, test_cases)
+        if cached is not None:
+            return cached, True
+        
+        results = JudgeService.run_tests(executor, problem, code, language, test_cases, stop_on_failure,
+                                         on_progress)
+        record_run_phases(results, language, problem.id)
+        record_run_noise(results, language)
+        outcomes = [JudgeService.build_outcome(tc, result) for tc, result in zip(test_cases, results)]
+        if not any(r['status'] in UNCACHEABLE_RUN_STATUSES for r in results):
+            JudgeService.store_outcomes(problem, language, code, scope, outcomes)
+        return outcomes, False
+    
+    @staticmethod
+    def code_hash(code) -> str:
+        """Hash of the code with line endings and trailing whitespace normalized"""
+        lines = code.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        normalized = '\n'.join(line.rstrip() for line in lines).strip('\n')
+        return hashlib.sha256(normalized.encode()).hexdigest()
+    
+    @staticmethod
+    def cache_scope(problem, scope) -> str:
+        """
+        Verdict cache scope qualified with the problem's judging settings
+        
+        Limits, float tolerance, function signature and time calibration all
+        change verdicts without changing the tests, so a digest of them is part
+        of the key and editing any of them makes earlier verdicts unreachable.
+        """
+        settings = json.dumps([problem.time_limit, problem.memory_limit, problem.float_tolerance,
+                               problem.function_signature, problem.time_limit_calibration])
+        return f"{scope}:{hashlib.sha256(settings.encode()).hexdigest()[:12]}"
+    
+    @staticmethod
+    def get_cached_outcomes(problem, language, code, scope, test_cases) -> Optional[List[Dict[str, Any]]]:
+        """Cached outcomes for the current test set version, or None on a miss"""
+        entry = ContestVerdictCache.query.filter_by(
+            problem_id=problem.id,
+            test_version=problem.test_version or 1,
+            language=language,
+            code_hash=JudgeService.code_hash(code),
+            scope=JudgeService.cache_scope(problem, scope)
+        ).first()
+        if entry is None:
+            return None
+        
+        by_test = {outcome['test_case_id']: outcome for outcome in json.loads(entry.outcomes)}
+        if any(tc.id not in by_test for tc in test_cases):
+            return None
+        
+        ContestVerdictCache.query.filter_by(id=entry.id).update(
+            {ContestVerdictCache.hits: func.coalesce(ContestVerdictCache.hits, 0) + 1},
+            synchronize_session=False)
+        db.session.commit()
+        return [by_test[tc.id] for tc in test_cases]
+    
+    @staticmethod
+    def store_outcomes(problem, language, code, scope, outcomes):
+        """Cache the outcomes of a fresh run; the caller commits"""
+        entry = ContestVerdictCache()
+        entry.problem_id = problem.id
+        entry.test_version = problem.test_version or 1
+        entry.language = language
+        entry.code_hash = JudgeService.code_hash(code)
+        entry.scope = JudgeService.cache_scope(problem, scope)
+        entry.outcomes = json.dumps(outcomes)
+        try:
+            with db.session.begin_nested():
+                db.session.add(entry)
+        except IntegrityError:
+            pass  # Another worker cached the same verdict first
+    
+    @staticmethod
+    def invalidate_test_data(problem):
+        """
+        Start a new test set version after the test cases changed
+        
+        Cached verdicts are dropped and every process rebuilds its test bundle
+        on next use, since bundles are keyed by version. The caller commits.
+        """
+        problem.test_version = (problem.test_version or 1) + 1
+        ContestVerdictCache.query.filter_by(problem_id=problem.id).delete(synchronize_session=False)
+    
+    @staticmethod
+    def judge_submission(submission):
+        """Judge a claimed submission and store its verdict"""
+        problem = ContestProblem.query.get(submission.problem_id)
+        contest = Contest.query.get(submission.contest_id)
+        stop_on_failure = contest.judging_policy == 'stop_on_first_failure'
+        test_cases = JudgeService.order_test_cases(JudgeService.load_test_cases(problem))
+        executor = CodeExecutor(pool=get_worker_pool())
+        judge_start = time.perf_counter()
+        
+        try:
+            submission.total_tests = len(test_cases)
+            submission.tests_done = 0
+            submission.passed_tests = 0
+            submission.last_test_status = None
+            db.session.commit()
+            progress = SubmissionProgress(submission.id, len(test_cases))
+            outcomes, from_cache = JudgeService.judge_tests(executor, problem, submission.code,
+                                                            submission.language, test_cases,
+                                                            f"full:{contest.judging_policy}",
+                                                            stop_on_failure, progress.record)
+            
+            # A compilation error is one verdict for the submission, not a failure per test
+            compile_error = next((o for o in outcomes if o['status'] == 'compilation_error'), None)
+            if compile_error is not None:
+                outcomes = []
+            
+            passed_tests = 0
+            ran_ids = []
+            failed_ids = []
+            test_rows = []
+            for outcome in outcomes:
+                test_rows.append({
+                    'submission_id': submission.id,
+                    'test_case_id': outcome['test_case_id'],
+                    'status': outcome['status'],
+                    'actual_output': outcome['actual_output'],
+                    'error_message': outcome['error_message'],
+                    'execution_time': outcome['execution_time'],
+                    'memory_used': outcome['memory_used']
+                })
+                
+                if outcome['status'] == 'passed':
+                    passed_tests += 1
+                if outcome['status'] != 'skipped':
+                    ran_ids.append(outcome['test_case_id'])
+                    if outcome['status'] != 'passed':
+                        failed_ids.append(outcome['test_case_id'])
+            
+            total_tests = len(test_cases)
+            db.session.bulk_insert_mappings(ContestTestResult, test_rows)
+            if not from_cache:
+                # Replayed verdicts would skew the failure history
+                JudgeService.record_test_history(ran_ids, failed_ids)
+            
+            # Calculate score and status
+            submission.compile_error = compile_error['error_message'] if compile_error else None
+            submission.compile_error_line = compile_error.get('error_line') if compile_error else None
+            submission.compile_error_column = compile_error.get('error_column') if compile_error else None
+            if compile_error is not None:
+                submission.status = 'compilation_error'
+                submission.score = 0
+            elif total_tests and passed_tests == total_tests:
+                submission.status = 'accepted'
+                submission.score = problem.points
+            elif passed_tests > 0 and not stop_on_failure:
+                submission.status = 'partial'
+                submission.score = int((passed_tests / total_tests) * problem.points)
+            else:
+                submission.status = 'wrong_answer'
+                submission.score = 0
+            
+            submission.passed_tests = passed_tests
+            submission.total_tests = total_tests
+            submission.tests_done = total_tests
+            submission.execution_time = max((o['execution_time'] for o in outcomes), default=0.0)
+            submission.memory_used = max((o['memory_used'] for o in outcomes), default=0)
+            submission.judged_at = datetime.utcnow()
+            commit_start = time.perf_counter()
+            db.session.commit()
+            observe_phase('db_commit', time.perf_counter() - commit_start, submission.language, problem.id)
+            SUBMISSION_SECONDS.observe(time.perf_counter() - judge_start,
+                                       language=submission.language, problem=problem.id)
+        
+        except Exception as e:
+            logging.error(f"Error judging submission {submission.id}: {e}")
+            db.session.rollback()
+            submission.status = 'error'
+            submission.score = 0
+            submission.judged_at = datetime.utcnow()
+            db.session.commit()
+        
+        if submission.rejudge_job_id:
+            # Scores are recomputed for everyone once the whole rejudge is done
+            JudgeService.finish_rejudge_if_done(submission.rejudge_job_id)
+        else:
+            JudgeService.update_participant_stats(submission)
+        return submission
+    
+    @staticmethod
+    def start_rejudge(contest_id, problem_id, requested_by):
+        """
+        Requeue every judged submission of a contest (or one of its problems)
+        
+        The submissions go back through the judge queue, so all judge workers
+        rejudge them in parallel, behind any new submissions. Their old test
+        results are deleted in one statement.
+        """
+        job = ContestRejudgeJob()
+        job.contest_id = contest_id
+        job.problem_id = problem_id
+        job.requested_by = requested_by
+        job.status = 'running'
+        db.session.add(job)
+        db.session.flush()
+        
+        query = ContestSubmission.query.filter(
+            ContestSubmission.contest_id == contest_id,
+            ContestSubmission.status.in_(FINAL_STATUSES)
+        )
+        if problem_id:
+            query = query.filter(ContestSubmission.problem_id == problem_id)
+        job.total_submissions = query.update({
+            'status': 'pending',
+            'rejudge_job_id': job.id,
+            'judge_worker': None,
+            'judge_started_at': None
+        }, synchronize_session=False)
+        
+        rejudged_ids = select(ContestSubmission.id).where(ContestSubmission.rejudge_job_id == job.id)
+        ContestTestResult.query.filter(ContestTestResult.submission_id.in_(rejudged_ids)).delete(
+            synchronize_session=False)
+        
+        if not job.total_submissions:
+            job.status = 'completed'
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        logging.info(f"Rejudge job {job.id} queued {job.total_submissions} submissions")
+        return job
+    
+    @staticmethod
+    def finish_rejudge_if_done(job_id):
+        """Complete a rejudge job once none of its submissions is left to judge"""
+        remaining = ContestSubmission.query.filter(
+            ContestSubmission.rejudge_job_id == job_id,
+            ContestSubmission.status.in_(('pending', 'running'))
+        ).count()
+        if remaining:
+            return
+        
+        # Only the worker that flips the status recomputes the scores
+        claimed = ContestRejudgeJob.query.filter_by(id=job_id, status='running').update(
+            {'status': 'completed', 'finished_at': datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            job = ContestRejudgeJob.query.get(job_id)
+            JudgeService.recompute_participant_scores(job.contest_id)
+            db.session.commit()
+            leaderboards.discard(job.contest_id)
+            logging.info(f"Rejudge job {job_id} completed")
+    
+    @staticmethod
+    def lock_contest_scores(contest_id):
+        """Hold the lock on a contest's best scores and totals until the transaction ends"""
+        db.session.execute(select(func.pg_advisory_xact_lock(SCORE_LOCK_NAMESPACE, contest_id)))
+    
+    @staticmethod
+    def recompute_participant_scores(contest_id):
+        """
+        Rebuild a contest's best-score table from its submissions, then every
+        participant's total score and problems solved in one UPDATE
+        
+        Used after a rejudge, which may lower scores; new verdicts are folded
+        in incrementally by update_participant_stats. Both hold the contest's
+        score lock, so a verdict landing during a rebuild waits for it and is
+        then applied to the rebuilt rows. The caller commits.
+        """
+        JudgeService.lock_contest_scores(contest_id)
+        ContestProblemScore.query.filter_by(contest_id=contest_id).delete(synchronize_session=False)
+        best_scores = select(
+            ContestSubmission.contest_id,
+            ContestSubmission.user_id,
+            ContestSubmission.problem_id,
+            func.coalesce(func.max(ContestSubmission.score), 0),
+            literal(datetime.utcnow())
+        ).where(
+            ContestSubmission.contest_id == contest_id
+        ).group_by(ContestSubmission.contest_id, ContestSubmission.user_id, ContestSubmission.problem_id)
+        db.session.execute(ContestProblemScore.__table__.insert().from_select(
+            ['contest_id', 'user_id', 'problem_id', 'best_score', 'updated_at'], best_scores))
+        
+        scores = ContestProblemScore.__table__.c
+        total_score = select(func.coalesce(func.sum(scores.best_score), 0)).where(
+            scores.contest_id == contest_id,
+            scores.user_id == ContestParticipant.user_id).scalar_subquery()
+        problems_solved = select(func.count()).select_from(ContestProblemScore.__table__).where(
+            scores.contest_id == contest_id,
+            scores.user_id == ContestParticipant.user_id,
+            scores.best_score > 0).scalar_subquery()
+        
+        ContestParticipant.query.filter_by(contest_id=contest_id).update({
+            ContestParticipant.total_score: total_score,
+            ContestParticipant.problems_solved: problems_solved,
+            ContestParticipant.score_updated_at: datetime.utcnow()
+        }, synchronize_session=False)
+    
+    @staticmethod
+    def get_rejudge_progress(job) -> Dict[str, Any]:
+        """Progress payload for a rejudge job"""
+        remaining = 0
+        if job.status != 'completed':
+            remaining = ContestSubmission.query.filter(
+                ContestSubmission.rejudge_job_id == job.id,
+                ContestSubmission.status.in_(('pending', 'running'))
+            ).count()
+        total = job.total_submissions or 0
+        return {
+            'success': True,
+            'job_id': job.id,
+            'status': job.status,
+            'total': total,
+            'completed': total - remaining,
+            'remaining': remaining,
+            'percent': round(100 * (total - remaining) / total, 1) if total else 100.0
+        }
+    
+    @staticmethod
+    def record_test_history(ran_ids, failed_ids):
+        """Update per-test run and failure counters used for test ordering"""
+        if ran_ids:
+            ContestTestCase.query.filter(ContestTestCase.id.in_(ran_ids)).update(
+                {ContestTestCase.run_count: func.coalesce(ContestTestCase.run_count, 0) + 1},
+                synchronize_session=False)
+        if failed_ids:
+            ContestTestCase.query.filter(ContestTestCase.id.in_(failed_ids)).update(
+                {ContestTestCase.fail_count: func.coalesce(ContestTestCase.fail_count, 0) + 1},
+                synchronize_session=False)
+    
+    @staticmethod
+    def update_participant_stats(submission):
+        """
+        Fold a verdict into the participant's best score for the problem and
+        change their totals by the difference
+        
+        The contest's score lock is taken first and the old best and the
+        difference are read under it, so concurrent verdicts and rebuilds
+        (see recompute_participant_scores) are applied one at a time and none
+        is lost or counted twice. The best-score row is created empty on
+        first use; rows for scores that predate the table are built by
+        upgrade_schema.py. Totals are adjusted in place, so the cost does not
+        grow with the number of submissions.
+        """
+        participant_id = db.session.query(ContestParticipant.id).filter_by(
+            contest_id=submission.contest_id,
+            user_id=submission.user_id
+        ).scalar()
+        if participant_id is None:
+            return
+        
+        JudgeService.lock_contest_scores(submission.contest_id)
+        key = {'contest_id': submission.contest_id, 'user_id': submission.user_id,
+               'problem_id': submission.problem_id}
+        db.session.execute(
+            pg_insert(ContestProblemScore.__table__)
+            .values(**key, best_score=0, updated_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=['contest_id', 'user_id', 'problem_id']))
+        best = ContestProblemScore.query.filter_by(**key).populate_existing().one()
+        
+        updates = {ContestParticipant.last_submission: submission.submitted_at,
+                   ContestParticipant.score_updated_at: datetime.utcnow()}
+        new_score = submission.score or 0
+        old_score = best.best_score or 0
+        if new_score > old_score:
+            best.best_score = new_score
+            best.updated_at = datetime.utcnow()
+            updates[ContestParticipant.total_score] = (
+                func.coalesce(ContestParticipant.total_score, 0) + (new_score - old_score))
+            if old_score == 0:
+                updates[ContestParticipant.problems_solved] = (
+                    func.coalesce(ContestParticipant.problems_solved, 0) + 1)
+        ContestParticipant.query.filter_by(id=participant_id).update(updates, synchronize_session=False)
+        db.session.commit()
+        leaderboards.note_participant(submission.contest_id, submission.user_id)
+    
+    @staticmethod
+    def hidden_test_error(test_result) -> str:
+        """Verdict shown for a hidden test, without its message"""
+        if test_result.status == 'failed':
+            return 'Wrong answer'
+        if test_result.status == 'error':
+            message = test_result.error_message or ''
+            for limit_message in LIMIT_MESSAGES:
+                if message.startswith(limit_message):
+                    return limit_message
+            return 'Runtime error'
+        return ''
+    
+    @staticmethod
+    def get_submission_status(submission) -> Dict[str, Any]:
+        """Status payload for polling clients"""
+        is_final = submission.status in FINAL_STATUSES
+        data = {
+            'success': True,
+            'submission_id': submission.id,
+            'status': submission.status,
+            'final': is_final,
+            'score': submission.score,
+            'passed_tests': submission.passed_tests or 0,
+            'total_tests': submission.total_tests or 0
+        }
+        
+        if submission.status == 'compilation_error':
+            data['message'] = 'Compilation error'
+            data['compile_error'] = {
+                'message': submission.compile_error or '',
+                'line': submission.compile_error_line,
+                'column': submission.compile_error_column
+            }
+            data['test_results'] = []
+        elif is_final:
+            data['message'] = f"{data['passed_tests']}/{data['total_tests']} test cases passed"
+            sample_ids = {row[0] for row in db.session.query(ContestTestCase.id).filter_by(
+                problem_id=submission.problem_id, is_sample=True)}
+            data['test_results'] = [
+                {'passed': r.status == 'passed', 'skipped': r.status == 'skipped',
+                 'error': (r.error_message or '') if r.test_case_id in sample_ids else JudgeService.hidden_test_error(r)}
+                for r in sorted(submission.test_results, key=lambda r: r.id)
+            ]
+        elif submission.status == 'running' and submission.tests_done:
+            data['tests_done'] = submission.tests_done
+            data['last_test_status'] = submission.last_test_status
+            last_status = (submission.last_test_status or '').replace('_', ' ')
+            data['message'] = f"Judging... test {submission.tests_done}/{data['total_tests']} {last_status}"
+        else:
+            data['message'] = 'Waiting for a judge' if submission.status == 'pending' else 'Judging...'
+        return data
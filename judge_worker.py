@@ -0,0 +1,91 @@
+import os
+import socket
+import threading
+import time
+import logging
+
+from judge_service import JudgeService
+from judge_metrics import start_metrics_server
+from admission_control import get_admission_controller
+from sandbox_pool import get_worker_pool
+
+# How often an idle worker looks for new submissions
+POLL_INTERVAL_SECONDS = 0.5
+# How often stuck "running" submissions are returned to the queue
+STALE_CHECK_SECONDS = 60
+
+
+class JudgeWorker:
+    """Judge worker that drains the pending submission queue"""
+    
+    def __init__(self, app, name=None):
+        self.app = app
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.running = False
+        self.thread = None
+        self.last_stale_check = 0.0
+    
+    def start(self):
+        """Start the worker in a background thread"""
+        if self.running:
+            return
+        
+        self.running = True
+        self.thread = threading.Thread(target=self.run_forever, daemon=True)
+        self.thread.start()
+        logging.info(f"Judge worker {self.name} started")
+    
+    def stop(self):
+        """Stop the worker after its current submission"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=30)
+        logging.info(f"Judge worker {self.name} stopped")
+    
+    def run_forever(self):
+        """Main worker loop"""
+        self.running = True
+        while self.running:
+            try:
+                with self.app.app_context():
+                    if time.time() - self.last_stale_check > STALE_CHECK_SECONDS:
+                        JudgeService.requeue_stale_submissions()
+                        self.last_stale_check = time.time()
+                    
+                    # Raises, so nothing is claimed, while this process has no free cores
+                    get_worker_pool()
+                    submission = JudgeService.claim_next_submission(self.name)
+                    if submission is not None:
+                        logging.info(f"Judge worker {self.name} judging submission {submission.id}")
+                        with get_admission_controller().judge_slot():
+                            JudgeService.judge_submission(submission)
+                        continue
+            except Exception as e:
+                logging.error(f"Error in judge worker {self.name}: {e}")
+            
+            time.sleep(POLL_INTERVAL_SECONDS)
+
+
+# Workers running inside the web process
+embedded_workers = []
+
+def start_embedded_judge_workers(app=None):
+    """Start in-process judge workers (JUDGE_EMBEDDED_WORKERS, default 1)
+    
+    Production deployments run judge_worker.py as separate processes and set
+    JUDGE_EMBEDDED_WORKERS=0 on the web service.
+    """
+    count = int(os.environ.get('JUDGE_EMBEDDED_WORKERS', '1'))
+    for i in range(len(embedded_workers), count):
+        worker = JudgeWorker(app, name=f"{socket.gethostname()}:{os.getpid()}:embedded-{i}")
+        worker.start()
+        embedded_workers.append(worker)
+
+
+if __name__ == "__main__":
+    from app import app
+    
+    metrics_port = int(os.environ.get('JUDGE_METRICS_PORT', '0'))
+    if metrics_port:
+        start_metrics_server(metrics_port, os.environ.get('JUDGE_METRICS_HOST', '127.0.0.1'))
+    JudgeWorker(app).run_forever()
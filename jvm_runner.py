@@ -0,0 +1,852 @@
+import os
+import time
+import fcntl
+import atexit
+import signal
+import select
+import shutil
+import struct
+import hashlib
+import logging
+import secrets
+import resource
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from workspace_pool import workspace_usage
+
+# How long a fresh JVM may take to report that it is ready
+STARTUP_TIMEOUT = 15
+# Extra time the manager allows past the runner's own watchdog before it
+# declares the runner hung and kills it
+WATCHDOG_GRACE = 2.0
+# Runner JVMs kept per process, one per heap size (memory limit)
+MAX_RUNNERS = 2
+# Runner JVMs alive at once on the whole host, across all judge processes
+# (JUDGE_JVM_HOST_RUNNERS); each may hold a heap as large as its memory limit
+DEFAULT_HOST_RUNNERS = 2
+# Lock files of the host-wide runner slots
+JVM_SLOT_DIR = os.path.join(tempfile.gettempdir(), 'codetrack-jvm-slots')
+# A runner left idle this long is stopped, giving its slot to other processes
+IDLE_SECONDS = 30
+# Address space a runner may map beyond its heap: code cache, metaspace,
+# thread stacks and the JDK's own libraries
+JVM_OVERHEAD_MB = 768
+# Keeps the JVM's non-heap reservations within JVM_OVERHEAD_MB
+JVM_FOOTPRINT_FLAGS = ['-XX:ReservedCodeCacheSize=64m', '-XX:CompressedClassSpaceSize=64m',
+                       '-XX:MaxMetaspaceSize=128m']
+# How often the workspace of a run on the JVM is checked against its cap
+WORKSPACE_CHECK_SECONDS = 0.01
+# Output without a newline the manager keeps from the runner before dropping it
+MAX_PENDING_OUTPUT = 1024 * 1024
+# Subdirectory of a submission's class directory holding the classes the
+# runner loads, with System.exit redirected
+RUNNER_CLASS_DIR = 'runner-classes'
+# Class that System.exit calls are redirected to; the runner's loader serves it
+EXIT_CLASS = 'JudgeRunner$Exit'
+# Bytes after the tag of each constant pool entry type other than Utf8
+# (which holds a u2 length and then the data)
+CONSTANT_SIZES = {3: 4, 4: 4, 5: 8, 6: 8, 7: 2, 8: 2, 9: 4, 10: 4, 11: 4, 12: 4,
+                  15: 3, 16: 2, 17: 4, 18: 4, 19: 2, 20: 2}
+
+# Runs inside a long-lived JVM. Requests arrive on stdin, one per line:
+#   RUN <nonce> <class dir> <main class> <input> <stdout> <stderr> <time limit ms>
+#       <wall limit ms> <cpu limited 0/1>
+# and each is answered with a single line on the original stdout:
+#   <nonce> <status> <wall ms> <cpu ms> <peak heap KB> <recycle> <exit code>
+# separated by tabs, on a line of its own. Status is OK, EXIT (System.exit),
+# ERROR (uncaught exception), OOM, TLE or OLE. With cpu limiting the time
+# limit applies to the CPU time of the submission's main thread, and the wall
+# limit is only a backstop. Every run loads the submission through its own
+# class loader, so static state never leaks from one test to the next, gets
+# System.in/out/err redirected to the run's files, and has the JVM-wide
+# defaults it may change (locale, time zone, system properties, uncaught
+# exception handler) restored afterwards. The submission's classes are
+# rewritten so that System.exit calls JudgeRunner.Exit.exit instead, which
+# unwinds the calling thread (see redirect_exit). When a run times out, runs
+# out of memory or leaves threads behind, the runner answers and then halts,
+# and the manager starts a fresh JVM. A submission that still ends the JVM
+# (Runtime.exit or halt) ends the runner with that exit code.
+RUNNER_SOURCE = r'''
+import java.io.*;
+import java.lang.management.*;
+import java.lang.reflect.*;
+import java.net.*;
+import java.util.*;
+import java.util.concurrent.atomic.AtomicReference;
+
+public class JudgeRunner {
+    private static final InputStream CONTROL_IN = System.in;
+    private static final PrintStream CONTROL_OUT = System.out;
+    private static final PrintStream CONTROL_ERR = System.err;
+    private static volatile PrintStream runOut;
+    private static volatile PrintStream runErr;
+    
+    /** Where the submission's System.exit calls are redirected; its loader resolves this class to the runner's. */
+    public static final class Exit {
+        public static void exit(int status) {
+            throw new ExitRequest(status);
+        }
+    }
+    
+    /** Unwinds a submission thread that asked to exit; carries no stack trace. */
+    static final class ExitRequest extends Error {
+        final int status;
+        
+        ExitRequest(int status) {
+            super(null, null, false, false);
+            this.status = status;
+        }
+    }
+    
+    public static void main(String[] args) throws Exception {
+        long outputLimit = Long.parseLong(args[0]);
+        BufferedReader control = new BufferedReader(new InputStreamReader(CONTROL_IN, "UTF-8"));
+        // Output of a submission that calls System.exit still reaches its files
+        Runtime.getRuntime().addShutdownHook(new Thread(JudgeRunner::flushRun));
+        CONTROL_OUT.println("READY");
+        CONTROL_OUT.flush();
+        
+        String line;
+        while ((line = control.readLine()) != null) {
+            String[] request = line.split("\t");
+            if (!request[0].equals("RUN")) {
+                break;
+            }
+            String[] reply = run(request[2], request[3], request[4], request[5], request[6],
+                                 Long.parseLong(request[7]), Long.parseLong(request[8]),
+                                 request[9].equals("1"), outputLimit);
+            // Start on a fresh line in case a submission wrote to the real stdout
+            CONTROL_OUT.println();
+            CONTROL_OUT.println(request[1] + "\t" + String.join("\t", reply));
+            CONTROL_OUT.flush();
+            if (reply[4].equals("1")) {
+                Runtime.getRuntime().halt(0);
+            }
+        }
+        System.exit(0);
+    }
+    
+    private static void flushRun() {
+        PrintStream out = runOut;
+        PrintStream err = runErr;
+        if (out != null) {
+            out.flush();
+        }
+        if (err != null) {
+            err.flush();
+        }
+    }
+    
+    private static String[] run(String classDir, String className, String inputPath,
+                                String stdoutPath, String stderrPath, long timeLimitMs,
+                                long wallLimitMs, boolean cpuLimited,
+                                long outputLimit) throws IOException {
+        // Collect the previous run's garbage so the peak reflects this run only
+        System.gc();
+        for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()) {
+            pool.resetPeakUsage();
+        }
+        
+        // JVM-wide defaults the submission may change, restored after the run
+        Locale locale = Locale.getDefault();
+        Locale displayLocale = Locale.getDefault(Locale.Category.DISPLAY);
+        Locale formatLocale = Locale.getDefault(Locale.Category.FORMAT);
+        TimeZone timeZone = TimeZone.getDefault();
+        Properties properties = (Properties) System.getProperties().clone();
+        Thread.UncaughtExceptionHandler uncaughtHandler = Thread.getDefaultUncaughtExceptionHandler();
+        
+        LimitedOutputStream out = new LimitedOutputStream(new FileOutputStream(stdoutPath), outputLimit);
+        LimitedOutputStream err = new LimitedOutputStream(new FileOutputStream(stderrPath), outputLimit);
+        InputStream in = new BufferedInputStream(new FileInputStream(inputPath), 1 << 16);
+        runOut = new PrintStream(new BufferedOutputStream(out, 1 << 16), false, "UTF-8");
+        runErr = new PrintStream(new BufferedOutputStream(err, 1 << 13), true, "UTF-8");
+        System.setIn(in);
+        System.setOut(runOut);
+        System.setErr(runErr);
+        
+        // The platform loader as parent hides the runner itself from the
+        // submission, except for the class its System.exit calls now go to
+        URLClassLoader loader = new URLClassLoader(new URL[] {new File(classDir).toURI().toURL()},
+                                                  ClassLoader.getPlatformClassLoader()) {
+            @Override
+            protected Class<?> findClass(String name) throws ClassNotFoundException {
+                return name.equals(Exit.class.getName()) ? Exit.class : super.findClass(name);
+            }
+        };
+        // The first exit requested by any other thread of the submission
+        AtomicReference<ExitRequest> exited = new AtomicReference<>();
+        ThreadGroup group = new ThreadGroup("solution") {
+            @Override
+            public void uncaughtException(Thread thread, Throwable e) {
+                if (e instanceof ExitRequest) {
+                    exited.compareAndSet(null, (ExitRequest) e);
+                } else {
+                    super.uncaughtException(thread, e);
+                }
+            }
+        };
+        ThreadMXBean threads = ManagementFactory.getThreadMXBean();
+        Throwable[] failure = new Throwable[1];
+        long[] cpuNanos = new long[1];
+        // Every thread started from here on belongs to the submission
+        long[] threadsBefore = threads.getAllThreadIds();
+        Thread worker = new Thread(group, () -> {
+            try {
+                Class<?> mainClass = Class.forName(className, true, loader);
+                Method main = mainClass.getMethod("main", String[].class);
+                main.setAccessible(true);  // The class itself need not be public
+                main.invoke(null, (Object) new String[0]);
+            } catch (InvocationTargetException e) {
+                failure[0] = e.getCause();
+            } catch (Throwable t) {
+                failure[0] = t;
+            } finally {
+                cpuNanos[0] = threads.getCurrentThreadCpuTime();
+            }
+        }, "main");
+        worker.setContextClassLoader(loader);
+        
+        long start = System.nanoTime();
+        worker.start();
+        try {
+            // Another thread's System.exit ends the run as it would end the JVM
+            while (worker.isAlive() && exited.get() == null) {
+                worker.join(5);
+                long elapsed = System.nanoTime() - start;
+                long used = cpuLimited ? threads.getThreadCpuTime(worker.getId()) : elapsed;
+                if (worker.isAlive() && (used >= timeLimitMs * 1000000L || elapsed >= wallLimitMs * 1000000L)) {
+                    break;
+                }
+            }
+        } catch (InterruptedException e) {
+            Thread.currentThread().interrupt();
+        }
+        long wallMs = (System.nanoTime() - start) / 1000000;
+        boolean running = worker.isAlive();
+        boolean timedOut = running && exited.get() == null;
+        long cpuMs = Math.max(0, running ? threads.getThreadCpuTime(worker.getId()) : cpuNanos[0]) / 1000000;
+        
+        long peakBytes = 0;
+        for (MemoryPoolMXBean pool : ManagementFactory.getMemoryPoolMXBeans()) {
+            if (pool.getType() == MemoryType.HEAP) {
+                peakBytes += pool.getPeakUsage().getUsed();
+            }
+        }
+        
+        String status;
+        boolean recycle;
+        int exitCode = 0;
+        if (timedOut) {
+            // The thread cannot be stopped safely; the JVM is replaced instead
+            status = "TLE";
+            recycle = true;
+        } else {
+            Throwable t = failure[0];
+            ExitRequest exit = t instanceof ExitRequest ? (ExitRequest) t : exited.get();
+            boolean failed = t != null && !(t instanceof ExitRequest);
+            if (failed) {
+                t.printStackTrace(runErr);
+            }
+            runOut.flush();
+            runErr.flush();
+            if (out.exceeded || err.exceeded) {
+                status = "OLE";
+            } else if (t instanceof OutOfMemoryError) {
+                status = "OOM";
+            } else if (failed) {
+                status = "ERROR";
+            } else if (exit != null) {
+                status = "EXIT";
+                exitCode = exit.status;
+            } else {
+                status = "OK";
+            }
+            recycle = running || t instanceof OutOfMemoryError
+                      || startedThreadAlive(threads, threadsBefore, worker);
+            
+            System.setIn(CONTROL_IN);
+            System.setOut(CONTROL_ERR);
+            System.setErr(CONTROL_ERR);
+            runOut.close();
+            runErr.close();
+            runOut = null;
+            runErr = null;
+            in.close();
+            loader.close();
+            
+            Locale.setDefault(locale);
+            Locale.setDefault(Locale.Category.DISPLAY, displayLocale);
+            Locale.setDefault(Locale.Category.FORMAT, formatLocale);
+            TimeZone.setDefault(timeZone);
+            System.setProperties((Properties) properties.clone());
+            Thread.setDefaultUncaughtExceptionHandler(uncaughtHandler);
+        }
+        return new String[] {status, Long.toString(wallMs), Long.toString(cpuMs),
+                             Long.toString(peakBytes / 1024), recycle ? "1" : "0",
+                             Integer.toString(exitCode)};
+    }
+    
+    /**
+     * Whether a thread started during the run, other than its main thread, is
+     * still alive. Such a thread may sit in any group and may be a daemon.
+     */
+    private static boolean startedThreadAlive(ThreadMXBean threads, long[] before, Thread worker) {
+        Set<Long> known = new HashSet<>();
+        for (long id : before) {
+            known.add(id);
+        }
+        known.add(worker.getId());
+        for (long id : threads.getAllThreadIds()) {
+            if (!known.contains(id)) {
+                return true;
+            }
+        }
+        return false;
+    }
+    
+    /** Writes up to a byte limit, then fails every write (PrintStream records the error). */
+    private static final class LimitedOutputStream extends FilterOutputStream {
+        private long remaining;
+        volatile boolean exceeded;
+        
+        LimitedOutputStream(OutputStream out, long limit) {
+            super(out);
+            remaining = limit;
+        }
+        
+        @Override
+        public void write(int b) throws IOException {
+            write(new byte[] {(byte) b}, 0, 1);
+        }
+        
+        @Override
+        public void write(byte[] b, int off, int len) throws IOException {
+            int allowed = (int) Math.min(len, remaining);
+            if (allowed > 0) {
+                out.write(b, off, allowed);
+                remaining -= allowed;
+            }
+            if (allowed < len) {
+                exceeded = true;
+                throw new IOException("output limit exceeded");
+            }
+        }
+    }
+}
+'''
+
+
+class JvmRunnerError(Exception):
+    """The runner JVM could not be built or started"""
+
+
+class JvmRunnerBusy(JvmRunnerError):
+    """Every host-wide runner slot is held by another JVM"""
+
+
+def build_runner(root: str) -> str:
+    """Compile the runner once per host; returns the directory holding JudgeRunner.class"""
+    digest = hashlib.sha256(RUNNER_SOURCE.encode()).hexdigest()[:16]
+    runner_dir = os.path.join(root, digest)
+    if os.path.exists(os.path.join(runner_dir, 'JudgeRunner.class')):
+        return runner_dir
+    
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.staging-', dir=root)
+    try:
+        with open(os.path.join(staging, 'JudgeRunner.java'), 'w') as f:
+            f.write(RUNNER_SOURCE)
+        compiled = subprocess.run(['javac', '-d', staging, os.path.join(staging, 'JudgeRunner.java')],
+                                  capture_output=True, text=True, timeout=60)
+        if compiled.returncode != 0:
+            raise JvmRunnerError(f'javac failed: {compiled.stderr.strip()[:500]}')
+        try:
+            os.rename(staging, runner_dir)
+        except OSError:
+            pass  # Another process built it first
+    except (OSError, subprocess.SubprocessError) as e:
+        raise JvmRunnerError(f'Could not build the JVM runner: {e}')
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    return runner_dir
+
+
+def redirect_exit(data: bytes) -> bytes:
+    """
+    Point a class file's System.exit(int) calls at JudgeRunner.Exit.exit(int)
+    
+    Only the constant pool changes: a class entry for EXIT_CLASS is appended
+    and every Methodref of java/lang/System.exit(I)V is moved onto it, so the
+    bytecode and its stack maps stay valid. Classes that never call
+    System.exit are returned unchanged.
+    
+    Raises:
+        ValueError: If data is not a class file this can rewrite
+    """
+    try:
+        magic, count = struct.unpack_from('>I4xH', data, 0)
+        if magic != 0xCAFEBABE:
+            raise ValueError('Not a class file')
+        entries = {}
+        offset = 10
+        index = 1
+        while index < count:
+            tag = data[offset]
+            if tag == 1:
+                size = 2 + struct.unpack_from('>H', data, offset + 1)[0]
+            elif tag in CONSTANT_SIZES:
+                size = CONSTANT_SIZES[tag]
+            else:
+                raise ValueError(f'Unknown constant pool tag {tag}')
+            entries[index] = (tag, offset + 1, data[offset + 1:offset + 1 + size])
+            offset += 1 + size
+            # Long and Double take up two slots
+            index += 2 if tag in (5, 6) else 1
+        
+        def utf8(index: int, position: int = 0) -> bytes:
+            """The Utf8 entry referenced by the u2 at position of entry index"""
+            target = struct.unpack_from('>H', entries[index][2], position)[0]
+            return entries[target][2][2:]
+        
+        exit_refs = []
+        for tag, body_offset, body in entries.values():
+            if tag != 10:
+                continue
+            class_index, name_and_type = struct.unpack('>HH', body)
+            if (utf8(class_index) == b'java/lang/System' and utf8(name_and_type) == b'exit'
+                    and utf8(name_and_type, 2) == b'(I)V'):
+                exit_refs.append(body_offset)
+    except (struct.error, IndexError, KeyError) as e:
+        raise ValueError(f'Malformed class file: {e}')
+    if not exit_refs:
+        return data
+    if count + 2 > 0xFFFF:
+        raise ValueError('Constant pool is full')
+    
+    name = EXIT_CLASS.encode()
+    rewritten = bytearray(data[:offset])
+    struct.pack_into('>H', rewritten, 8, count + 2)
+    for body_offset in exit_refs:
+        struct.pack_into('>H', rewritten, body_offset, count + 1)
+    rewritten += struct.pack('>BH', 1, len(name)) + name + struct.pack('>BH', 7, count)
+    rewritten += data[offset:]
+    return bytes(rewritten)
+
+
+def prepare_runner_classes(class_dir: str) -> str:
+    """
+    Copy a submission's classes into RUNNER_CLASS_DIR under class_dir with
+    System.exit redirected; returns the directory the runner should load
+    
+    A java started per run keeps using the original classes.
+    
+    Raises:
+        ValueError: If a class file cannot be rewritten
+    """
+    target = os.path.join(class_dir, RUNNER_CLASS_DIR)
+    os.makedirs(target, exist_ok=True)
+    for name in os.listdir(class_dir):
+        if name.endswith('.class'):
+            with open(os.path.join(class_dir, name), 'rb') as f:
+                data = redirect_exit(f.read())
+            with open(os.path.join(target, name), 'wb') as f:
+                f.write(data)
+    return target
+
+
+def claim_jvm_slot(slots: int):
+    """
+    Lock a free host-wide runner slot; returns its open lock file, or None
+    when other JVMs hold all slots
+    
+    The slot stays claimed until the file is closed or its process exits.
+    """
+    os.makedirs(JVM_SLOT_DIR, exist_ok=True)
+    for slot in range(slots):
+        lock_file = open(os.path.join(JVM_SLOT_DIR, f'slot-{slot}.lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+        return lock_file
+    return None
+
+
+class JvmRunner:
+    """A long-lived JVM running compiled Java submissions one at a time.
+    
+    The JVM is started lazily with a heap capped at the memory limit it was
+    created for, and replaced after max_runs runs or whenever a run left it
+    in an unknown state. A class-data-sharing archive of the runner is
+    written by the first JVM that exits cleanly and mapped by every later
+    one, when the JVM supports dynamic archives.
+    
+    While its JVM is alive the runner holds one of host_runners slots shared
+    by every process on the host, and gives it back once the JVM has been idle
+    for IDLE_SECONDS. The JVM runs under RLIMIT_AS (its heap plus
+    JVM_OVERHEAD_MB) and RLIMIT_FSIZE (the output limit), in a scratch
+    working directory that is emptied after every run.
+    """
+    
+    def __init__(self, runner_dir: str, heap_mb: int, output_limit: int, max_runs: int = 200,
+                 host_runners: int = DEFAULT_HOST_RUNNERS):
+        self.runner_dir = runner_dir
+        self.heap_mb = heap_mb
+        self.output_limit = output_limit
+        self.max_runs = max_runs
+        self.host_runners = host_runners
+        self.runs = 0
+        self.process = None
+        self.scratch_dir = None
+        self._archive_staging = None
+        self._slot = None
+        self._pending = b''
+        self._idle_timer = None
+        self._lock = threading.Lock()
+    
+    def _archive_path(self) -> str:
+        return os.path.join(self.runner_dir, 'runner.jsa')
+    
+    def _start(self):
+        if self._slot is None:
+            self._slot = claim_jvm_slot(self.host_runners)
+            if self._slot is None:
+                raise JvmRunnerBusy(f'All {self.host_runners} runner JVMs of this host are in use')
+        if self.scratch_dir is None:
+            self.scratch_dir = tempfile.mkdtemp(prefix='codetrack-jvm-scratch-')
+        base = ['java', f'-Xmx{self.heap_mb}m', '-XX:+UseSerialGC', '-XX:-UsePerfData'] + JVM_FOOTPRINT_FLAGS
+        archive = self._archive_path()
+        staging = None
+        if os.path.exists(archive):
+            cds_flags = [f'-XX:SharedArchiveFile={archive}', '-Xshare:auto']
+        else:
+            # Dumped at exit under a private name, then published by _stop
+            staging = os.path.join(self.runner_dir, f'.runner-{os.getpid()}-{self.heap_mb}.jsa')
+            cds_flags = [f'-XX:ArchiveClassesAtExit={staging}']
+        
+        # JVMs without (dynamic) CDS support reject the flags; retry without them
+        for flags, archive_staging in ((cds_flags, staging), ([], None)):
+            try:
+                process = subprocess.Popen(
+                    base + flags + ['-cp', self.runner_dir, 'JudgeRunner', str(self.output_limit)],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.DEVNULL,
+                    cwd=self.scratch_dir,
+                    # Fewer malloc arenas keep the JVM's native reservations small
+                    env=dict(os.environ, MALLOC_ARENA_MAX='2'),
+                    preexec_fn=self._apply_limits,
+                    start_new_session=True
+                )
+            except OSError as e:
+                self._release_slot()
+                raise JvmRunnerError(f'Could not start java: {e}')
+            self._pending = b''
+            if self._read_line(process, time.time() + STARTUP_TIMEOUT, 'READY'):
+                self.process = process
+                self.runs = 0
+                self._archive_staging = archive_staging
+                return
+            self._kill(process)
+        self._release_slot()
+        raise JvmRunnerError('JVM runner did not start')
+    
+    def _apply_limits(self):
+        """Resource limits for the runner JVM; runs in the child"""
+        address_limit = (self.heap_mb + JVM_OVERHEAD_MB) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (address_limit, address_limit))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (self.output_limit, self.output_limit))
+    
+    def _read_line(self, process, deadline: float, prefix: str) -> Optional[str]:
+        """Next line from the runner starting with prefix; '' at EOF, None at the deadline.
+        
+        Reads the pipe's file descriptor into the runner's own buffer, since
+        select() cannot see lines a buffered reader has already pulled in.
+        Other lines (JVM warnings, anything a submission wrote to the real
+        stdout) are skipped.
+        """
+        fd = process.stdout.fileno()
+        while True:
+            end = self._pending.find(b'\n')
+            if end >= 0:
+                line = self._pending[:end].decode('utf-8', errors='replace')
+                self._pending = self._pending[end + 1:]
+                if line.startswith(prefix):
+                    return line
+                continue
+            if len(self._pending) > MAX_PENDING_OUTPUT:
+                # Replies start on a line of their own, so no reply is lost
+                self._pending = b''
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            ready, _, _ = select.select([fd], [], [], remaining)
+            if not ready:
+                return None
+            data = os.read(fd, 65536)
+            if not data:
+                return ''
+            self._pending += data
+    
+    def _kill(self, process):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+        process.wait()
+    
+    def _release_slot(self):
+        slot, self._slot = self._slot, None
+        if slot is not None:
+            slot.close()
+    
+    def _stop(self):
+        """Ask the runner to exit cleanly, which also writes its CDS archive"""
+        process, self.process = self.process, None
+        if process is None:
+            return
+        try:
+            process.stdin.write(b'EXIT\n')
+            process.stdin.flush()
+            process.wait(timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            self._kill(process)
+        self._release_slot()
+        self._publish_archive()
+    
+    def _publish_archive(self):
+        staging, self._archive_staging = self._archive_staging, None
+        if staging and os.path.exists(staging):
+            try:
+                os.replace(staging, self._archive_path())
+            except OSError as e:
+                logging.debug(f"Could not publish JVM runner archive: {e}")
+    
+    def _discard(self, kill: bool = False):
+        """Forget a runner that exited (or halted itself) mid-session, killing it first if asked"""
+        process, self.process = self.process, None
+        if process is not None:
+            if kill:
+                self._kill(process)
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._kill(process)
+        self._release_slot()
+        self._archive_staging = None
+    
+    def _stop_if_idle(self):
+        """Stop a JVM nobody has used for IDLE_SECONDS, freeing its host slot"""
+        if not self._lock.acquire(blocking=False):
+            return  # A run is in progress; it schedules a new check when done
+        try:
+            self._stop()
+        finally:
+            self._lock.release()
+    
+    def _schedule_idle_stop(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        self._idle_timer = threading.Timer(IDLE_SECONDS, self._stop_if_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+    
+    def _workspace_over_cap(self, workspace: Optional[str], workspace_cap: int) -> bool:
+        """Whether the run's workspace and the JVM's working directory hold more than the cap"""
+        used = workspace_usage(self.scratch_dir, workspace_cap)
+        if workspace is not None:
+            used += workspace_usage(workspace, workspace_cap)
+        return used > workspace_cap
+    
+    def _wipe_scratch(self):
+        """Remove whatever the last run wrote relative to the JVM's working directory"""
+        try:
+            entries = list(os.scandir(self.scratch_dir))
+        except OSError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
+    
+    def run(self, class_dir: str, class_name: str, input_path: str, stdout_path: str,
+            stderr_path: str, time_limit: float, wall_limit: Optional[float] = None,
+            cpu_limited: bool = False, workspace: Optional[str] = None,
+            workspace_cap: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Run a compiled submission against one input
+        
+        class_dir should come from prepare_runner_classes, so that a
+        System.exit in the submission ends only its run. With cpu_limited the
+        time limit applies to the CPU time of the submission's main thread,
+        and the run is also stopped once it has taken wall_limit seconds
+        (default: the time limit). With workspace_cap the run's workspace and
+        the JVM's working directory are checked every WORKSPACE_CHECK_SECONDS,
+        and a run that grows them past the cap is killed as if it had hit the
+        file size limit.
+        
+        Returns a dict with 'returncode' (None if the time limit was exceeded),
+        'wall_time', 'cpu_time', 'memory_used' (peak heap in KB) and
+        'startup' (seconds spent starting a JVM for this run, usually 0).
+        
+        Raises:
+            JvmRunnerBusy: If the host already runs its share of runner JVMs
+            JvmRunnerError: If no runner JVM could be started
+        """
+        with self._lock:
+            startup_start = time.perf_counter()
+            if self.process is None or self.process.poll() is not None:
+                self._discard()
+                self._start()
+            startup = time.perf_counter() - startup_start
+            try:
+                return self._run(class_dir, class_name, input_path, stdout_path, stderr_path,
+                                 time_limit, wall_limit or time_limit, cpu_limited, workspace,
+                                 workspace_cap, startup)
+            finally:
+                self._wipe_scratch()
+                if self.process is not None:
+                    self._schedule_idle_stop()
+    
+    def _run(self, class_dir: str, class_name: str, input_path: str, stdout_path: str,
+             stderr_path: str, time_limit: float, wall_limit: float, cpu_limited: bool,
+             workspace: Optional[str], workspace_cap: Optional[int], startup: float) -> Dict[str, Any]:
+        nonce = secrets.token_hex(8)
+        request = '\t'.join(['RUN', nonce, class_dir, class_name, input_path, stdout_path,
+                             stderr_path, str(int(time_limit * 1000)), str(int(wall_limit * 1000)),
+                             '1' if cpu_limited else '0']) + '\n'
+        start_time = time.time()
+        try:
+            self.process.stdin.write(request.encode())
+            self.process.stdin.flush()
+        except OSError as e:
+            self._discard()
+            raise JvmRunnerError(f'JVM runner stopped accepting runs: {e}')
+        
+        deadline = start_time + wall_limit + WATCHDOG_GRACE
+        over_cap = False
+        while True:
+            wait_until = deadline if workspace_cap is None else min(deadline, time.time() + WORKSPACE_CHECK_SECONDS)
+            line = self._read_line(self.process, wait_until, nonce + '\t')
+            if line is not None or time.time() >= deadline:
+                break
+            if self._workspace_over_cap(workspace, workspace_cap):
+                over_cap = True
+                break
+        wall_time = time.time() - start_time
+        
+        if line is None:
+            # Over the workspace cap, or the runner's own watchdog did not
+            # answer; replace the JVM
+            self._discard(kill=True)
+            return {'returncode': -signal.SIGXFSZ if over_cap else None, 'wall_time': wall_time,
+                    'cpu_time': wall_time, 'memory_used': 0, 'startup': startup}
+        if line == '':
+            # The submission ended the JVM (Runtime.exit or halt)
+            returncode = self.process.wait()
+            self._discard()
+            return {'returncode': returncode, 'wall_time': wall_time, 'cpu_time': wall_time,
+                    'memory_used': 0, 'startup': startup}
+        
+        _, status, wall_ms, cpu_ms, peak_kb, recycle, exit_code = line.split('\t')
+        self.runs += 1
+        if recycle == '1':
+            self._discard()
+        elif self.runs >= self.max_runs:
+            self._stop()
+        
+        returncodes = {'OK': 0, 'EXIT': int(exit_code), 'TLE': None}
+        return {
+            'returncode': returncodes.get(status, 1),
+            'wall_time': int(wall_ms) / 1000,
+            'cpu_time': int(cpu_ms) / 1000,
+            'memory_used': int(peak_kb),
+            'startup': startup
+        }
+    
+    def shutdown(self):
+        with self._lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+            self._stop()
+            if self.scratch_dir is not None:
+                shutil.rmtree(self.scratch_dir, ignore_errors=True)
+                self.scratch_dir = None
+
+
+class JvmRunnerPool:
+    """Runner JVMs of this process, one per heap size, least recently used first out"""
+    
+    def __init__(self, runner_dir: str, output_limit: int, max_runs: int = 200,
+                 max_runners: int = MAX_RUNNERS, host_runners: int = DEFAULT_HOST_RUNNERS):
+        self.runner_dir = runner_dir
+        self.output_limit = output_limit
+        self.max_runs = max_runs
+        self.max_runners = max_runners
+        self.host_runners = host_runners
+        self._runners = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, heap_mb: int) -> JvmRunner:
+        evicted = None
+        with self._lock:
+            runner = self._runners.get(heap_mb)
+            if runner is None:
+                runner = self._runners[heap_mb] = JvmRunner(self.runner_dir, heap_mb, self.output_limit,
+                                                            self.max_runs, self.host_runners)
+                if len(self._runners) > self.max_runners:
+                    _, evicted = self._runners.popitem(last=False)
+            self._runners.move_to_end(heap_mb)
+        if evicted is not None:
+            evicted.shutdown()
+        return runner
+    
+    def shutdown(self):
+        with self._lock:
+            runners = list(self._runners.values())
+            self._runners.clear()
+        for runner in runners:
+            runner.shutdown()
+
+
+# Global runner pool (one per process); False once building the runner failed
+jvm_runner_pool = None
+_runner_lock = threading.Lock()
+
+def get_jvm_runner(memory_limit: int, output_limit: int) -> Optional[JvmRunner]:
+    """
+    Return this process's runner JVM for a memory limit (MB), or None when
+    JUDGE_JVM_RUNNER is 0 or no JDK is available
+    
+    output_limit caps what a run may write to stdout and stderr, in bytes.
+    JUDGE_JVM_HOST_RUNNERS (default 2) caps the runner JVMs alive at once
+    across every process on the host.
+    """
+    global jvm_runner_pool
+    if os.environ.get('JUDGE_JVM_RUNNER', '1') == '0':
+        return None
+    with _runner_lock:
+        if jvm_runner_pool is None:
+            if not shutil.which('java') or not shutil.which('javac'):
+                jvm_runner_pool = False
+            else:
+                root = os.environ.get('JUDGE_JVM_RUNNER_DIR',
+                                      os.path.join(tempfile.gettempdir(), 'codetrack-jvm-runner'))
+                try:
+                    runner_dir = build_runner(root)
+                    jvm_runner_pool = JvmRunnerPool(
+                        runner_dir, output_limit, max_runs=int(os.environ.get('JUDGE_JVM_RUNNER_RUNS', '200')),
+                        host_runners=int(os.environ.get('JUDGE_JVM_HOST_RUNNERS', str(DEFAULT_HOST_RUNNERS))))
+                    atexit.register(jvm_runner_pool.shutdown)
+                except JvmRunnerError as e:
+                    logging.error(f"JVM runner unavailable, starting java per run: {e}")
+                    jvm_runner_pool = False
+    return jvm_runner_pool.get(memory_limit) if jvm_runner_pool else None
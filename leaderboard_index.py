@@ -0,0 +1,193 @@
+import bisect
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+from app import db
+from models import ContestParticipant, User
+
+# How often reads re-check the database for participants whose scores changed
+REFRESH_SECONDS = 1.0
+# Changes are re-read this far behind the previous refresh, which covers clock
+# skew between judge processes and transactions that committed late
+REFRESH_OVERLAP = timedelta(seconds=10)
+# Contests whose leaderboards are kept in memory per process
+MAX_CONTESTS = 32
+
+
+def standing_key(user_id: int, total_score: Optional[int], problems_solved: Optional[int],
+                 last_submission: Optional[datetime]) -> Tuple:
+    """Sort key of a participant: score and problems solved descending, then earliest last submission"""
+    return (-(total_score or 0), -(problems_solved or 0), last_submission or datetime.max, user_id)
+
+
+class LeaderboardIndex:
+    """Standings of one contest, kept sorted in memory.
+    
+    Participants are held in a list of sort keys (see standing_key) ordered
+    with bisect, so the top k cost O(k) and a participant's rank O(log n).
+    Built from the database on first use in a process, then kept current by
+    re-reading only the participants whose score_updated_at moved.
+    """
+    
+    def __init__(self, contest_id: int):
+        self.contest_id = contest_id
+        self.version = 0  # Bumped on every change in order
+        self._keys = []
+        self._entries = {}  # user_id -> (key, participant, user)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshed_at = 0.0
+        self._watermark = None
+    
+    def __len__(self) -> int:
+        return len(self._keys)
+    
+    def load(self):
+        """Build the index from every participant of the contest"""
+        with self._refresh_lock:
+            started = datetime.utcnow()
+            self.apply_rows(db.session.query(ContestParticipant, User).join(
+                User, ContestParticipant.user_id == User.id
+            ).filter(ContestParticipant.contest_id == self.contest_id).all())
+            self._watermark = started
+            self._refreshed_at = time.monotonic()
+    
+    def refresh(self, force: bool = False):
+        """Apply participants changed since the last refresh, at most every REFRESH_SECONDS"""
+        if not force and time.monotonic() - self._refreshed_at < REFRESH_SECONDS:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return  # Another request is refreshing; serve the current standings
+        try:
+            started = datetime.utcnow()
+            self.apply_rows(db.session.query(ContestParticipant, User).join(
+                User, ContestParticipant.user_id == User.id
+            ).filter(
+                ContestParticipant.contest_id == self.contest_id,
+                ContestParticipant.score_updated_at >= self._watermark - REFRESH_OVERLAP
+            ).all())
+            self._watermark = started
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+    
+    def apply_rows(self, rows):
+        """Insert or move participants from (ContestParticipant, User) rows"""
+        for participant, user in rows:
+            self.update(participant.user_id, participant.total_score, participant.problems_solved,
+                        participant.last_submission, {'id': user.id, 'username': user.username, 'email': user.email})
+    
+    def update(self, user_id: int, total_score: Optional[int], problems_solved: Optional[int],
+               last_submission: Optional[datetime], user: Dict[str, Any]) -> bool:
+        """Insert or move a participant; returns whether the standings changed"""
+        key = standing_key(user_id, total_score, problems_solved, last_submission)
+        participant = {'user_id': user_id, 'total_score': total_score or 0,
+                       'problems_solved': problems_solved or 0, 'last_submission': last_submission}
+        with self._lock:
+            previous = self._entries.get(user_id)
+            self._entries[user_id] = (key, participant, user)
+            if previous is not None and previous[0] == key:
+                return False
+            if previous is not None:
+                del self._keys[bisect.bisect_left(self._keys, previous[0])]
+            bisect.insort(self._keys, key)
+            self.version += 1
+            return True
+    
+    def top(self, limit: Optional[int] = None) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(participant, user) pairs of the first limit standings (all when limit is None)"""
+        with self._lock:
+            keys = self._keys[:limit] if limit is not None else list(self._keys)
+            return [self._entries[key[-1]][1:] for key in keys]
+    
+    def snapshot(self, limit: int) -> Dict[int, list]:
+        """
+        Compact rows of the first limit standings, keyed by user id:
+        [user id, rank, score, problems solved, last submission (HH:MM:SS), username, email]
+        """
+        rows = {}
+        for rank, (participant, user) in enumerate(self.top(limit), 1):
+            last_submission = participant['last_submission']
+            rows[participant['user_id']] = [
+                participant['user_id'], rank, participant['total_score'], participant['problems_solved'],
+                last_submission.strftime('%H:%M:%S') if last_submission else None,
+                user['username'], user['email']
+            ]
+        return rows
+    
+    def rank(self, user_id: int) -> Optional[int]:
+        """1-based rank of a participant, or None if they are not in the contest"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            return bisect.bisect_left(self._keys, entry[0]) + 1
+
+
+def standings_diff(previous: Dict[int, list], current: Dict[int, list]) -> Dict[str, list]:
+    """Rows of current that are new or changed since previous, and the user ids that dropped out"""
+    return {
+        'rows': [row for user_id, row in current.items() if previous.get(user_id) != row],
+        'removed': [user_id for user_id in previous if user_id not in current]
+    }
+
+
+class LeaderboardRegistry:
+    """Per-process LRU of contest leaderboard indexes"""
+    
+    def __init__(self, max_contests: int = MAX_CONTESTS):
+        self.max_contests = max_contests
+        self._boards = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, contest_id: int) -> LeaderboardIndex:
+        """The contest's index, built on first use and refreshed if it is due"""
+        with self._lock:
+            board = self._boards.get(contest_id)
+            if board is not None:
+                self._boards.move_to_end(contest_id)
+        if board is None:
+            board = LeaderboardIndex(contest_id)
+            board.load()
+            with self._lock:
+                board = self._boards.setdefault(contest_id, board)
+                self._boards.move_to_end(contest_id)
+                while len(self._boards) > self.max_contests:
+                    self._boards.popitem(last=False)
+        else:
+            board.refresh()
+        return board
+    
+    def peek(self, contest_id: int) -> Optional[LeaderboardIndex]:
+        """The contest's index if this process has one, without building it"""
+        with self._lock:
+            return self._boards.get(contest_id)
+    
+    def note_participant(self, contest_id: int, user_id: int):
+        """Re-read one participant after their score changed in this process"""
+        board = self.peek(contest_id)
+        if board is None:
+            return
+        try:
+            row = db.session.query(ContestParticipant, User).join(
+                User, ContestParticipant.user_id == User.id
+            ).filter(ContestParticipant.contest_id == contest_id,
+                     ContestParticipant.user_id == user_id).first()
+        except Exception as e:
+            logging.warning(f"Could not update leaderboard of contest {contest_id}: {e}")
+            return
+        if row is not None:
+            board.apply_rows([row])
+    
+    def discard(self, contest_id: int):
+        """Drop a contest's index so the next read rebuilds it"""
+        with self._lock:
+            self._boards.pop(contest_id, None)
+
+
+# Global registry instance (one per process)
+leaderboards = LeaderboardRegistry()
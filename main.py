@@ -1,9 +1,13 @@
 from app import app
 import routes
 from notification_scheduler import start_notification_scheduler
+from judge_worker import start_embedded_judge_workers
 
 # Start background notification scheduler
 start_notification_scheduler(app)
 
+# Start in-process judge workers (disable when judge_worker.py runs separately)
+start_embedded_judge_workers(app)
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=False)
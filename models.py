@@ -281,6 +281,7 @@ class Contest(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    judging_policy = db.Column(db.String(30), default='score_all')  # score_all, stop_on_first_failure
     
     # Relationships
     creator = db.relationship('User', foreign_keys=[created_by])
@@ -316,6 +317,10 @@ class ContestProblem(db.Model):
     points = db.Column(db.Integer, default=100)
     time_limit = db.Column(db.Integer, default=1)  # Time limit in seconds
     memory_limit = db.Column(db.Integer, default=256)  # Memory limit in MB
+    float_tolerance = db.Column(db.Float)  # Absolute/relative error allowed for numeric output; None for exact
+    test_version = db.Column(db.Integer, default=1)  # Bumped whenever the test cases change
+    function_signature = db.Column(db.Text)  # JSON; set for function-style problems (see function_harness)
+    time_limit_calibration = db.Column(db.Text)  # JSON per-language limits from calibrate_time_limits.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -329,6 +334,14 @@ class ContestTestCase(db.Model):
     expected_output = db.Column(db.Text, nullable=False)
     is_sample = db.Column(db.Boolean, default=False)  # True if visible to students
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Judging history, used to run the tests most likely to fail first
+    run_count = db.Column(db.Integer, default=0)
+    fail_count = db.Column(db.Integer, default=0)
+    
+    def failure_rate(self):
+        """Smoothed share of judged runs that failed this test"""
+        return ((self.fail_count or 0) + 1) / ((self.run_count or 0) + 2)
 
 class ContestSubmission(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -337,11 +350,24 @@ class ContestSubmission(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     code = db.Column(db.Text, nullable=False)
     language = db.Column(db.String(50), default='python')
-    status = db.Column(db.String(20), default='pending')  # pending, running, accepted, wrong_answer, runtime_error, time_limit_exceeded
+    status = db.Column(db.String(20), default='pending', index=True)  # pending, running, accepted, partial, wrong_answer, compilation_error, error
     score = db.Column(db.Integer, default=0)
     execution_time = db.Column(db.Float, default=0.0)  # Time in seconds
-    memory_used = db.Column(db.Integer, default=0)  # Memory in KB
+    memory_used = db.Column(db.Integer, default=0)  # Peak memory in KB
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    compile_error = db.Column(db.Text)  # Compiler / syntax error message, if any
+    compile_error_line = db.Column(db.Integer)
+    compile_error_column = db.Column(db.Integer)
+    
+    # Judge queue bookkeeping
+    passed_tests = db.Column(db.Integer, default=0)  # Counts up while judging
+    total_tests = db.Column(db.Integer, default=0)
+    tests_done = db.Column(db.Integer, default=0)  # Live progress while judging
+    last_test_status = db.Column(db.String(30))  # passed, failed or the run status of the latest finished test
+    judge_worker = db.Column(db.String(100))  # Worker that claimed the submission
+    judge_started_at = db.Column(db.DateTime)
+    judged_at = db.Column(db.DateTime)
+    rejudge_job_id = db.Column(db.Integer, db.ForeignKey('contest_rejudge_job.id'), index=True)  # Set while being rejudged
     
     # Relationships
     user = db.relationship('User', foreign_keys=[user_id])
@@ -355,11 +381,37 @@ class ContestTestResult(db.Model):
     actual_output = db.Column(db.Text)
     error_message = db.Column(db.Text)
     execution_time = db.Column(db.Float, default=0.0)
-    memory_used = db.Column(db.Integer, default=0)
+    memory_used = db.Column(db.Integer, default=0)  # Peak RSS in KB
     
     # Relationships
     test_case = db.relationship('ContestTestCase', foreign_keys=[test_case_id])
 
+class ContestRejudgeJob(db.Model):
+    """A bulk rejudge of a contest, or of one of its problems"""
+    id = db.Column(db.Integer, primary_key=True)
+    contest_id = db.Column(db.Integer, db.ForeignKey('contest.id'), nullable=False)
+    problem_id = db.Column(db.Integer, db.ForeignKey('contest_problem.id'))  # None for the whole contest
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), default='running')  # running, completed
+    total_submissions = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class ContestVerdictCache(db.Model):
+    """Stored per-test outcomes of a judged submission, reused for identical code"""
+    id = db.Column(db.Integer, primary_key=True)
+    problem_id = db.Column(db.Integer, db.ForeignKey('contest_problem.id'), nullable=False)
+    test_version = db.Column(db.Integer, nullable=False)
+    language = db.Column(db.String(50), nullable=False)
+    code_hash = db.Column(db.String(64), nullable=False)  # sha256 of the normalized code
+    scope = db.Column(db.String(50), nullable=False)  # 'sample' or 'full:<judging policy>', then ':<settings digest>'
+    outcomes = db.Column(db.Text, nullable=False)  # JSON list of per-test outcomes
+    hits = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('problem_id', 'test_version', 'language', 'code_hash', 'scope',
+                                          name='unique_contest_verdict'),)
+
 class ContestParticipant(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     contest_id = db.Column(db.Integer, db.ForeignKey('contest.id'), nullable=False)
@@ -368,8 +420,20 @@ class ContestParticipant(db.Model):
     problems_solved = db.Column(db.Integer, default=0)
     rank = db.Column(db.Integer)
     last_submission = db.Column(db.DateTime)
+    score_updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # Read by leaderboard_index refreshes
     
     # Relationships
     contest = db.relationship('Contest', foreign_keys=[contest_id])
     
     __table_args__ = (db.UniqueConstraint('contest_id', 'user_id', name='unique_contest_participant'),)
+
+class ContestProblemScore(db.Model):
+    """Best score of a participant on one contest problem, kept up to date as verdicts land"""
+    id = db.Column(db.Integer, primary_key=True)
+    contest_id = db.Column(db.Integer, db.ForeignKey('contest.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    problem_id = db.Column(db.Integer, db.ForeignKey('contest_problem.id'), nullable=False)
+    best_score = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('contest_id', 'user_id', 'problem_id', name='unique_contest_problem_score'),)
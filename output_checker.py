@@ -0,0 +1,150 @@
+import re
+from typing import Dict, Iterator, Optional, Tuple, Any
+
+TOKEN_PATTERN = re.compile(rb'\S+')
+WHITESPACE_PATTERN = re.compile(rb'\s')
+
+# Bytes of program output around a mismatch kept for display and storage
+DIFF_WINDOW_BYTES = 256
+# Longest token echoed back in a mismatch message
+TOKEN_PREVIEW_CHARS = 40
+
+
+def iter_tokens(stream, chunk_size: int = 64 * 1024,
+                max_token: Optional[int] = None) -> Iterator[Tuple[bytes, int]]:
+    """
+    Yield (token, byte offset) for each whitespace-separated token of a stream
+    
+    The stream is read in fixed-size chunks, so memory use does not depend on
+    the size of the output, and each chunk is scanned once. A token cut by a
+    chunk boundary is carried over. A token longer than max_token bytes is
+    yielded as soon as that is known, cut to max_token + 1 bytes, and the
+    rest of it is skipped.
+    """
+    pending = bytearray()
+    pending_offset = 0
+    skipping = False  # Inside the rest of an over-long token
+    base = 0
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        start = 0
+        if pending or skipping:
+            # The carried-over token runs up to the first whitespace
+            match = WHITESPACE_PATTERN.search(chunk)
+            end = match.start() if match else len(chunk)
+            if not skipping:
+                pending += chunk[:end]
+                if max_token is not None and len(pending) > max_token:
+                    yield bytes(pending[:max_token + 1]), pending_offset
+                    pending = bytearray()
+                    skipping = True
+                elif match:
+                    yield bytes(pending), pending_offset
+                    pending = bytearray()
+            if match:
+                skipping = False
+            start = end
+        for match in TOKEN_PATTERN.finditer(chunk, start):
+            if match.end() == len(chunk):
+                # May continue in the next chunk
+                pending = bytearray(match.group())
+                pending_offset = base + match.start()
+                if max_token is not None and len(pending) > max_token:
+                    yield bytes(pending[:max_token + 1]), pending_offset
+                    pending = bytearray()
+                    skipping = True
+                break
+            token = match.group()
+            if max_token is not None and len(token) > max_token:
+                token = token[:max_token + 1]
+            yield token, base + match.start()
+        base += len(chunk)
+    if pending:
+        yield bytes(pending), pending_offset
+
+
+def tokens_equal(actual: bytes, expected: bytes, float_tolerance: Optional[float] = None) -> bool:
+    """Compare two tokens, allowing absolute/relative float error if configured"""
+    if actual == expected:
+        return True
+    if float_tolerance is None:
+        return False
+    try:
+        actual_value = float(actual)
+        expected_value = float(expected)
+    except ValueError:
+        return False
+    difference = abs(actual_value - expected_value)
+    return difference <= float_tolerance or difference <= float_tolerance * abs(expected_value)
+
+
+def _preview(token: bytes) -> str:
+    text = token.decode('utf-8', errors='replace')
+    if len(text) > TOKEN_PREVIEW_CHARS:
+        text = text[:TOKEN_PREVIEW_CHARS] + '...'
+    return repr(text)
+
+
+def read_window(path: str, offset: int) -> str:
+    """Program output around a byte offset, bounded to DIFF_WINDOW_BYTES"""
+    start = max(0, offset - DIFF_WINDOW_BYTES // 2)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        window = f.read(DIFF_WINDOW_BYTES)
+    text = window.decode('utf-8', errors='replace')
+    if start > 0:
+        text = '...' + text
+    if len(window) == DIFF_WINDOW_BYTES:
+        text += '...'
+    return text
+
+
+def check_output(actual_path: str, expected_output: str,
+                 float_tolerance: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Compare a program's output file with the expected output, token by token
+    
+    Whitespace differences are ignored and comparison stops at the first
+    mismatching token.
+    
+    Returns:
+        {'passed': bool, 'message': str, 'window': str}; window is a bounded
+        excerpt of the program output around the first mismatch
+    """
+    expected_tokens = expected_output.encode('utf-8').split()
+    # No output token longer than every expected one can match, so it is cut
+    # short rather than read in full; numbers compared with a tolerance may
+    # legitimately be written with more digits
+    max_token = None
+    if float_tolerance is None:
+        max_token = max([len(token) for token in expected_tokens] + [TOKEN_PREVIEW_CHARS])
+    index = 0
+    end_offset = 0
+    with open(actual_path, 'rb') as f:
+        for token, offset in iter_tokens(f, max_token=max_token):
+            if index >= len(expected_tokens):
+                return {
+                    'passed': False,
+                    'message': f'Wrong answer: unexpected extra output {_preview(token)}',
+                    'window': read_window(actual_path, offset)
+                }
+            if not tokens_equal(token, expected_tokens[index], float_tolerance):
+                return {
+                    'passed': False,
+                    'message': (f'Wrong answer at token {index + 1}: expected '
+                                f'{_preview(expected_tokens[index])}, got {_preview(token)}'),
+                    'window': read_window(actual_path, offset)
+                }
+            index += 1
+            end_offset = offset + len(token)
+    
+    if index < len(expected_tokens):
+        return {
+            'passed': False,
+            'message': (f'Wrong answer: output ended after {index} tokens, expected '
+                        f'{_preview(expected_tokens[index])} next'),
+            'window': read_window(actual_path, end_offset)
+        }
+    return {'passed': True, 'message': '', 'window': ''}
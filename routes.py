@@ -1,8 +1,9 @@
-from flask import render_template, request, redirect, url_for, session, flash, jsonify
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
 from werkzeug.security import generate_password_hash, check_password_hash
 from app import app, db
-from models import User, PlatformStats, Problem, ProblemSolved, Flashcard, StudySession, StudyGroup, StudyGroupMember, ForumPost, ForumAnswer, AIRecommendation, Notification, DailyCodingHours, GroupChatMessage, ForumPostVote, ForumAnswerVote, QuestionDiscussion, Contest, ContestProblem, ContestTestCase, ContestSubmission, ContestTestResult, ContestParticipant
+from models import User, PlatformStats, Problem, ProblemSolved, Flashcard, StudySession, StudyGroup, StudyGroupMember, ForumPost, ForumAnswer, AIRecommendation, Notification, DailyCodingHours, GroupChatMessage, ForumPostVote, ForumAnswerVote, QuestionDiscussion, Contest, ContestProblem, ContestTestCase, ContestSubmission, ContestTestResult, ContestParticipant, ContestRejudgeJob
 from code_executor import CodeExecutor
+from sandbox_pool import get_worker_pool
 from ai_tutor import AITutor
 from enhanced_ai_tutor import EnhancedAITutor
 from coding_tracker import CodingTracker
@@ -12,9 +13,20 @@ from doubt_forum_service import DoubtForumService
 from ai_flashcard_generator import AIFlashcardGenerator
 from enhanced_ai_flashcard_generator import EnhancedAIFlashcardGenerator
 from notification_service import NotificationService
+from judge_service import JudgeService, JUDGING_POLICIES
+from function_harness import parse_signature, get_signature, starter_code
+from workspace_pool import workspace_occupancy
+from judge_metrics import metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from admission_control import get_admission_controller, AdmissionRejected, run_tracker
+from time_calibration import time_limit_for, calibrated_limits
+from leaderboard_index import leaderboards, standings_diff
 from flask import jsonify
 from datetime import datetime, date, timedelta
+import os
+import hmac
 import json
+import time
+import threading
 
 @app.errorhandler(500)
 def internal_server_error(error):
@@ -1361,6 +1373,9 @@ def create_contest():
         start_date_str = request.form['start_date']
         start_time_str = request.form['start_time']
         duration_minutes = int(request.form['duration_minutes'])
+        judging_policy = request.form.get('judging_policy', 'score_all')
+        if judging_policy not in JUDGING_POLICIES:
+            judging_policy = 'score_all'
         
         # Parse datetime
         start_datetime_str = f"{start_date_str} {start_time_str}"
@@ -1372,6 +1387,7 @@ def create_contest():
         contest.description = description
         contest.start_date = start_date
         contest.duration_minutes = duration_minutes
+        contest.judging_policy = judging_policy
         contest.created_by = session['user_id']
         
         db.session.add(contest)
@@ -1416,6 +1432,12 @@ def add_contest_problem(contest_id):
     time_limit = int(request.form.get('time_limit', 1))
     memory_limit = int(request.form.get('memory_limit', 256))
     
+    try:
+        signature = parse_signature(request.form.get('function_signature', ''))
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('contest_edit', contest_id=contest_id))
+    
     problem = ContestProblem()
     problem.contest_id = contest_id
     problem.title = title
@@ -1425,6 +1447,7 @@ def add_contest_problem(contest_id):
     problem.points = points
     problem.time_limit = time_limit
     problem.memory_limit = memory_limit
+    problem.function_signature = json.dumps(signature) if signature else None
     
     db.session.add(problem)
     db.session.commit()
@@ -1453,11 +1476,37 @@ def add_test_case(contest_id, problem_id):
     test_case.is_sample = is_sample
     
     db.session.add(test_case)
+    JudgeService.invalidate_test_data(problem)
     db.session.commit()
     
     flash('Test case added successfully!', 'success')
     return redirect(url_for('contest_edit', contest_id=contest_id))
 
+@app.route('/contest/<int:contest_id>/rejudge', methods=['POST'])
+@admin_required
+def rejudge_contest(contest_id):
+    """Admin route to rejudge a contest, or one problem with problem_id"""
+    contest = Contest.query.get_or_404(contest_id)
+    
+    if contest.created_by != session['user_id']:
+        return jsonify({'success': False, 'error': 'Permission denied'})
+    
+    problem_id = request.form.get('problem_id', type=int)
+    if problem_id and not ContestProblem.query.filter_by(id=problem_id, contest_id=contest_id).first():
+        return jsonify({'success': False, 'error': 'Problem not found'}), 404
+    
+    job = JudgeService.start_rejudge(contest_id, problem_id, session['user_id'])
+    data = JudgeService.get_rejudge_progress(job)
+    data['progress_url'] = url_for('rejudge_progress', job_id=job.id)
+    return jsonify(data), 202
+
+@app.route('/api/contest/rejudge/<int:job_id>')
+@admin_required
+def rejudge_progress(job_id):
+    """Progress of a rejudge job"""
+    job = ContestRejudgeJob.query.get_or_404(job_id)
+    return jsonify(JudgeService.get_rejudge_progress(job))
+
 @app.route('/contest/<int:contest_id>/participate')
 @login_required
 def contest_participate(contest_id):
@@ -1520,7 +1569,7 @@ def contest_problem(contest_id, problem_id):
             return redirect(url_for('contests'))
         
         # Get sample test cases (visible to students)
-        sample_test_cases = ContestTestCase.query.filter_by(problem_id=problem_id, is_sample=True).all()
+        sample_test_cases = JudgeService.load_test_cases(problem, samples_only=True)
         
         # Get user's latest submission for this problem
         latest_submission = ContestSubmission.query.filter_by(
@@ -1529,6 +1578,8 @@ def contest_problem(contest_id, problem_id):
             user_id=user.id
         ).order_by(ContestSubmission.submitted_at.desc()).first()
         
+        signature = get_signature(problem)
+        
         # Calculate remaining time
         end_time = contest.get_end_time()
         remaining_seconds = int((end_time - datetime.utcnow()).total_seconds())
@@ -1541,13 +1592,32 @@ def contest_problem(contest_id, problem_id):
                              problem=problem,
                              sample_test_cases=sample_test_cases,
                              latest_submission=latest_submission,
+                             starter_code=starter_code(signature) if signature else None,
+                             time_limits=calibrated_limits(problem),
                              remaining_seconds=max(0, remaining_seconds))
-                             
+    
     except Exception as e:
         app.logger.error(f"Error in contest_problem route: {str(e)}")
         flash(f'Error loading contest problem: {str(e)}', 'error')
         return redirect(url_for('contests'))
 
+def admission_rejected(error):
+    """429 response for a run or submission turned away by admission control"""
+    response = jsonify({'success': False, 'error': str(error), 'retry_after': error.retry_after})
+    return response, 429, {'Retry-After': str(error.retry_after)}
+
+def run_superseded():
+    """Response for a run cancelled because the user started a newer one"""
+    return jsonify({'success': False, 'cancelled': True, 'error': 'Cancelled by a newer run'})
+
+def compilation_error_response(message, line, column):
+    """Response for a run whose code did not compile; the editor jumps to line/column"""
+    return jsonify({
+        'success': False,
+        'error': f'Compilation error:\n{message}',
+        'compile_error': {'message': message, 'line': line, 'column': column}
+    })
+
 @app.route('/contest/<int:contest_id>/problem/<int:problem_id>/run', methods=['POST'])
 @login_required
 def run_code(contest_id, problem_id):
@@ -1566,120 +1636,92 @@ def run_code(contest_id, problem_id):
         return jsonify({'success': False, 'error': 'Code cannot be empty'})
     
     try:
-        executor = CodeExecutor()
-        
-        # If custom input is provided, run with custom input
-        if custom_input:
-            result = executor.execute_code(code, language, custom_input)
-            return jsonify({
-                'success': result['success'],
-                'output': result.get('output', ''),
-                'error': result.get('error', ''),
-                'execution_time': result.get('execution_time', 0.0),
-                'test_type': 'custom'
-            })
-        
-        # If no custom input, run against sample test cases using function calls
-        sample_test_cases = ContestTestCase.query.filter_by(problem_id=problem_id, is_sample=True).all()
-        
-        if not sample_test_cases:
-            return jsonify({'success': False, 'error': 'No sample test cases available'})
-        
-        test_results = []
-        all_passed = True
-        
-        for i, test_case in enumerate(sample_test_cases):
-            # Create test code that calls the user's solution function
-            test_code = code + "\n\n"
+        # A newer run of the same problem by this user cancels this one
+        with run_tracker.track(session['user_id'], problem.id) as cancel_token, \
+                get_admission_controller().admit_run(session['user_id'], JudgeService.count_pending):
+            executor = CodeExecutor(pool=get_worker_pool(), cancel_token=cancel_token)
             
-            # Parse input and create function call based on problem
-            if problem.title == "Sum of Two Numbers":
-                input_parts = test_case.input_data.strip().split()
-                test_code += f"result = solution({input_parts[0]}, {input_parts[1]})\nprint(result)"
-            elif problem.title == "Reverse a String":
-                test_code += f"result = solution('{test_case.input_data.strip()}')\nprint(result)"
-            elif problem.title == "Find Maximum":
-                lines = test_case.input_data.strip().split('\n')
-                n = int(lines[0])
-                numbers = lines[1].split()
-                test_code += f"result = solution({numbers})\nprint(result)"
-            else:
-                # Fallback to original input/output method
-                result = executor.execute_code(code, language, test_case.input_data)
-                if result['success']:
-                    actual_output = result['output'].strip()
-                    expected_output = test_case.expected_output.strip()
-                    passed = actual_output == expected_output
+            # If custom input is provided, run with custom input
+            if custom_input:
+                result = executor.execute_code(code, language, custom_input,
+                                               time_limit_for(problem, language), problem.memory_limit)
+                if cancel_token.cancelled:
+                    return run_superseded()
+                if result['status'] == 'compilation_error':
+                    return compilation_error_response(result['error'], result.get('error_line'),
+                                                      result.get('error_column'))
+                return jsonify({
+                    'success': result['success'],
+                    'output': result.get('output', ''),
+                    'error': result.get('error', ''),
+                    'execution_time': result.get('execution_time', 0.0),
+                    'test_type': 'custom'
+                })
+            
+            # If no custom input, run against sample test cases
+            sample_test_cases = JudgeService.load_test_cases(problem, samples_only=True)
+            
+            if not sample_test_cases:
+                return jsonify({'success': False, 'error': 'No sample test cases available'})
+            
+            test_results = []
+            all_passed = True
+            
+            outcomes, from_cache = JudgeService.judge_tests(executor, problem, code, language,
+                                                            sample_test_cases, 'sample')
+            db.session.commit()
+            if cancel_token.cancelled:
+                return run_superseded()
+            if outcomes and outcomes[0]['status'] == 'compilation_error':
+                return compilation_error_response(outcomes[0]['error_message'], outcomes[0].get('error_line'),
+                                                  outcomes[0].get('error_column'))
+            
+            for i, (test_case, outcome) in enumerate(zip(sample_test_cases, outcomes)):
+                passed = outcome['status'] == 'passed'
+                
+                if outcome['status'] == 'error':
                     test_results.append({
                         'test_number': i + 1,
                         'input': test_case.input_data,
-                        'expected': expected_output,
-                        'actual': actual_output,
-                        'passed': passed,
-                        'execution_time': result.get('execution_time', 0.0)
+                        'expected': test_case.expected_output,
+                        'actual': '',
+                        'passed': False,
+                        'error': outcome['error_message'],
+                        'execution_time': 0.0
                     })
-                    if not passed:
-                        all_passed = False
                 else:
                     test_results.append({
                         'test_number': i + 1,
                         'input': test_case.input_data,
-                        'expected': test_case.expected_output,
-                        'actual': '',
-                        'passed': False,
-                        'error': result.get('error', ''),
-                        'execution_time': 0.0
+                        'expected': test_case.expected_output.strip(),
+                        'actual': outcome['actual_output'],
+                        'passed': passed,
+                        'error': outcome['error_message'] or '',
+                        'execution_time': outcome['execution_time']
                     })
-                    all_passed = False
-                continue
-            
-            # Execute the test code
-            result = executor.execute_code(test_code, language, "")
-            
-            if result['success']:
-                actual_output = result['output'].strip()
-                expected_output = test_case.expected_output.strip()
-                passed = actual_output == expected_output
-                
-                test_results.append({
-                    'test_number': i + 1,
-                    'input': test_case.input_data,
-                    'expected': expected_output,
-                    'actual': actual_output,
-                    'passed': passed,
-                    'execution_time': result.get('execution_time', 0.0)
-                })
                 
                 if not passed:
                     all_passed = False
-            else:
-                test_results.append({
-                    'test_number': i + 1,
-                    'input': test_case.input_data,
-                    'expected': test_case.expected_output,
-                    'actual': '',
-                    'passed': False,
-                    'error': result.get('error', ''),
-                    'execution_time': 0.0
-                })
-                all_passed = False
-        
-        return jsonify({
-            'success': True,
-            'test_results': test_results,
-            'all_passed': all_passed,
-            'total_tests': len(test_results),
-            'passed_tests': sum(1 for r in test_results if r['passed']),
-            'test_type': 'sample'
-        })
-        
+            
+            return jsonify({
+                'success': True,
+                'test_results': test_results,
+                'all_passed': all_passed,
+                'total_tests': len(test_results),
+                'passed_tests': sum(1 for r in test_results if r['passed']),
+                'test_type': 'sample',
+                'cached': from_cache
+            })
+    
+    except AdmissionRejected as e:
+        return admission_rejected(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/contest/<int:contest_id>/submit/<int:problem_id>', methods=['POST'])
 @login_required
 def submit_solution(contest_id, problem_id):
-    """Student route to submit solution"""
+    """Student route to submit solution; judging happens in a judge worker"""
     contest = Contest.query.get_or_404(contest_id)
     problem = ContestProblem.query.get_or_404(problem_id)
     user = User.query.get(session['user_id'])
@@ -1694,218 +1736,121 @@ def submit_solution(contest_id, problem_id):
     if not code.strip():
         return jsonify({'success': False, 'error': 'Code cannot be empty'})
     
-    # Create submission
-    submission = ContestSubmission()
-    submission.contest_id = contest_id
-    submission.problem_id = problem_id
-    submission.user_id = user.id
-    submission.code = code
-    submission.language = language
-    
-    db.session.add(submission)
-    db.session.commit()
-    
-    # Execute code against test cases
-    executor = CodeExecutor()
-    test_cases = ContestTestCase.query.filter_by(problem_id=problem_id).all()
-    
-    passed_tests = 0
-    total_tests = len(test_cases)
-    
-    for test_case in test_cases:
-        try:
-            # Create test code that calls the user's solution function
-            test_code = code + "\n\n"
-            
-            # Parse input and create function call based on problem
-            if problem.title == "Sum of Two Numbers":
-                input_parts = test_case.input_data.strip().split()
-                test_code += f"result = solution({input_parts[0]}, {input_parts[1]})\nprint(result)"
-            elif problem.title == "Reverse a String":
-                test_code += f"result = solution('{test_case.input_data.strip()}')\nprint(result)"
-            elif problem.title == "Find Maximum":
-                lines = test_case.input_data.strip().split('\n')
-                n = int(lines[0])
-                numbers = lines[1].split()
-                test_code += f"result = solution({numbers})\nprint(result)"
-            else:
-                # Fallback to original input/output method
-                result = executor.execute_code(code, language, test_case.input_data)
-                if result['success']:
-                    actual_output = result['output'].strip()
-                    expected_output = test_case.expected_output.strip()
-                    
-                    if actual_output == expected_output:
-                        passed_tests += 1
-                        test_result = ContestTestResult()
-                        test_result.submission_id = submission.id
-                        test_result.test_case_id = test_case.id
-                        test_result.status = 'passed'
-                        test_result.actual_output = actual_output
-                        test_result.execution_time = result['execution_time']
-                        db.session.add(test_result)
-                    else:
-                        test_result = ContestTestResult()
-                        test_result.submission_id = submission.id
-                        test_result.test_case_id = test_case.id
-                        test_result.status = 'failed'
-                        test_result.actual_output = actual_output
-                        test_result.execution_time = result['execution_time']
-                        db.session.add(test_result)
-                else:
-                    test_result = ContestTestResult()
-                    test_result.submission_id = submission.id
-                    test_result.test_case_id = test_case.id
-                    test_result.status = 'error'
-                    test_result.error_message = result['error']
-                    db.session.add(test_result)
-                continue
-            
-            # Execute the test code
-            result = executor.execute_code(test_code, language, "")
-            
-            if result['success']:
-                actual_output = result['output'].strip()
-                expected_output = test_case.expected_output.strip()
-                
-                if actual_output == expected_output:
-                    passed_tests += 1
-                    test_result = ContestTestResult()
-                    test_result.submission_id = submission.id
-                    test_result.test_case_id = test_case.id
-                    test_result.status = 'passed'
-                    test_result.actual_output = actual_output
-                    test_result.execution_time = result['execution_time']
-                    db.session.add(test_result)
-                else:
-                    test_result = ContestTestResult()
-                    test_result.submission_id = submission.id
-                    test_result.test_case_id = test_case.id
-                    test_result.status = 'failed'
-                    test_result.actual_output = actual_output
-                    test_result.execution_time = result['execution_time']
-                    db.session.add(test_result)
-            else:
-                test_result = ContestTestResult()
-                test_result.submission_id = submission.id
-                test_result.test_case_id = test_case.id
-                test_result.status = 'error'
-                test_result.error_message = result['error']
-                db.session.add(test_result)
-        except Exception as e:
-            test_result = ContestTestResult()
-            test_result.submission_id = submission.id
-            test_result.test_case_id = test_case.id
-            test_result.status = 'error'
-            test_result.error_message = str(e)
-            db.session.add(test_result)
-    
-    # Calculate score and status
-    if passed_tests == total_tests:
-        submission.status = 'accepted'
-        submission.score = problem.points
-    elif passed_tests > 0:
-        submission.status = 'partial'
-        submission.score = int((passed_tests / total_tests) * problem.points)
-    else:
-        submission.status = 'wrong_answer'
-        submission.score = 0
+    try:
+        get_admission_controller().admit_submission(user.id, JudgeService.count_pending)
+    except AdmissionRejected as e:
+        return admission_rejected(e)
     
-    db.session.commit()
+    submission = JudgeService.enqueue_submission(contest_id, problem.id, user.id, code, language)
     
     return jsonify({
         'success': True,
+        'submission_id': submission.id,
         'status': submission.status,
-        'score': submission.score,
-        'message': f'{passed_tests}/{total_tests} test cases passed',
-        'passed_tests': passed_tests,
-        'total_tests': total_tests
-    })
-    submission.code = code
-    submission.language = language
-    submission.status = 'pending'
+        'message': 'Submission queued for judging',
+        'status_url': url_for('submission_status', submission_id=submission.id),
+        'events_url': url_for('submission_events', submission_id=submission.id)
+    }), 202
+
+@app.route('/api/contest/submission/<int:submission_id>/status')
+@login_required
+def submission_status(submission_id):
+    """Lightweight polling endpoint for a submission's verdict"""
+    submission = ContestSubmission.query.get_or_404(submission_id)
+    
+    if submission.user_id != session['user_id']:
+        return jsonify({'success': False, 'error': 'Submission not found'}), 404
+    
+    return jsonify(JudgeService.get_submission_status(submission))
+
+# How often an event stream re-reads the submission, sends a keep-alive
+# comment when nothing changed, and how long a stream may stay open
+SSE_POLL_SECONDS = 0.5
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', '600'))
+# Every open stream holds a server thread, so only this many may be open at
+# once; the rest of the threads stay free for ordinary requests
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', '16'))
+open_streams = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+def sse_event(event, data):
+    """One server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def limited_stream(stream, busy):
+    """Serve an event stream if fewer than SSE_MAX_STREAMS are open, else just send busy"""
+    if not open_streams.acquire(blocking=False):
+        yield busy
+        return
+    try:
+        yield from stream
+    finally:
+        open_streams.release()
+
+def submission_event_stream(submission_id):
+    """Progress events for a submission until its verdict (or SSE_MAX_SECONDS) is reached"""
+    started = last_sent = time.monotonic()
+    last_data = None
+    while time.monotonic() - started < SSE_MAX_SECONDS:
+        submission = ContestSubmission.query.get(submission_id)
+        data = JudgeService.get_submission_status(submission)
+        # End the transaction: the connection goes back to the pool while the
+        # stream idles, and the next read sees the judge's updates
+        db.session.rollback()
+        if data['final']:
+            yield sse_event('verdict', data)
+            return
+        if data != last_data:
+            yield sse_event('progress', data)
+            last_data, last_sent = data, time.monotonic()
+        elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+            yield ': keep-alive\n\n'
+            last_sent = time.monotonic()
+        time.sleep(SSE_POLL_SECONDS)
+    # The client falls back to polling the status endpoint
+    yield sse_event('timeout', {})
+
+@app.route('/api/contest/submission/<int:submission_id>/events')
+@login_required
+def submission_events(submission_id):
+    """Server-sent event stream of a submission's per-test progress, ending with its verdict"""
+    submission = ContestSubmission.query.get_or_404(submission_id)
     
-    db.session.add(submission)
-    db.session.commit()
+    if submission.user_id != session['user_id']:
+        return jsonify({'success': False, 'error': 'Submission not found'}), 404
     
-    # Execute code against test cases in background
-    try:
-        executor = CodeExecutor()
-        test_cases = ContestTestCase.query.filter_by(problem_id=problem_id).all()
-        
-        passed_tests = 0
-        total_tests = len(test_cases)
-        
-        for test_case in test_cases:
-            result = executor.execute_code(code, language, test_case.input_data, problem.time_limit)
-            
-            test_result = ContestTestResult()
-            test_result.submission_id = submission.id
-            test_result.test_case_id = test_case.id
-            test_result.execution_time = result['execution_time']
-            
-            if result['status'] == 'success':
-                actual_output = result['output'].strip()
-                expected_output = test_case.expected_output.strip()
-                
-                if actual_output == expected_output:
-                    test_result.status = 'passed'
-                    passed_tests += 1
-                else:
-                    test_result.status = 'failed'
-                    test_result.actual_output = actual_output
-            else:
-                test_result.status = 'error'
-                test_result.error_message = result['error']
-                test_result.actual_output = result['output']
-            
-            db.session.add(test_result)
-        
-        # Update submission status and score
-        if passed_tests == total_tests:
-            submission.status = 'accepted'
-            submission.score = problem.points
-        elif passed_tests > 0:
-            submission.status = 'partial'
-            submission.score = int((passed_tests / total_tests) * problem.points)
-        else:
-            submission.status = 'wrong_answer'
-            submission.score = 0
-        
-        db.session.commit()
-        
-        # Update participant statistics
-        participant = ContestParticipant.query.filter_by(contest_id=contest_id, user_id=user.id).first()
-        if participant:
-            participant.last_submission = datetime.utcnow()
-            # Recalculate total score and problems solved
-            user_submissions = ContestSubmission.query.filter_by(contest_id=contest_id, user_id=user.id).all()
-            problem_scores = {}
-            for sub in user_submissions:
-                if sub.problem_id not in problem_scores or sub.score > problem_scores[sub.problem_id]:
-                    problem_scores[sub.problem_id] = sub.score
-            
-            participant.total_score = sum(problem_scores.values())
-            participant.problems_solved = sum(1 for score in problem_scores.values() if score > 0)
-            db.session.commit()
-        
-        return jsonify({
-            'success': True, 
-            'status': submission.status,
-            'score': submission.score,
-            'passed_tests': passed_tests,
-            'total_tests': total_tests,
-            'message': f'{passed_tests}/{total_tests} test cases passed'
-        })
-        
-    except Exception as e:
-        submission.status = 'error'
-        submission.score = 0
-        db.session.commit()
-        return jsonify({'success': False, 'error': str(e)})
+    # When the server is busy the client falls back to polling right away
+    stream = limited_stream(submission_event_stream(submission.id), sse_event('timeout', {}))
+    return Response(stream_with_context(stream),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 
 
+@app.route('/api/judge/stats')
+@admin_required
+def judge_stats():
+    """Judge resource gauges for admins"""
+    return jsonify({'success': True, 'workspaces': workspace_occupancy(),
+                    'admission': get_admission_controller().stats()})
+
+@app.route('/metrics')
+def judge_metrics():
+    """Judge histograms and gauges in the Prometheus text format
+    
+    Served only when JUDGE_METRICS_TOKEN is set, to requests carrying
+    "Authorization: Bearer <token>".
+    """
+    token = os.environ.get('JUDGE_METRICS_TOKEN')
+    if not token:
+        return 'Not Found', 404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return 'Unauthorized', 401
+    return metrics.render(), 200, {'Content-Type': METRICS_CONTENT_TYPE}
+
+# Standings version whose ranks were last written, per contest
+ranks_saved = {}
+
 @app.route('/contest/<int:contest_id>/results')
 @login_required
 def contest_results(contest_id):
@@ -1916,30 +1861,23 @@ def contest_results(contest_id):
         flash('Contest is still ongoing', 'info')
         return redirect(url_for('contests'))
     
-    # Get all participants with their scores
-    participants = db.session.query(ContestParticipant, User).join(
-        User, ContestParticipant.user_id == User.id
-    ).filter(ContestParticipant.contest_id == contest_id).order_by(
-        ContestParticipant.total_score.desc(),
-        ContestParticipant.problems_solved.desc(),
-        ContestParticipant.last_submission.asc()
-    ).all()
-    
-    # Assign ranks
-    for rank, (participant, user) in enumerate(participants, 1):
-        participant.rank = rank
+    # Get all participants with their scores, in rank order
+    board = leaderboards.get(contest_id)
+    participants = board.top()
     
-    db.session.commit()
+    # Store the final ranks once per change of the standings
+    if ranks_saved.get(contest_id) != board.version:
+        for rank, (participant, user) in enumerate(participants, 1):
+            ContestParticipant.query.filter_by(contest_id=contest_id, user_id=user['id']).update(
+                {ContestParticipant.rank: rank}, synchronize_session=False)
+        db.session.commit()
+        ranks_saved[contest_id] = board.version
     
     # Get current user's rank if they participated
     current_user_rank = None
     current_user = User.query.get(session['user_id'])
     if current_user.is_student():
-        user_participant = ContestParticipant.query.filter_by(
-            contest_id=contest_id, 
-            user_id=current_user.id
-        ).first()
-        current_user_rank = user_participant.rank if user_participant else None
+        current_user_rank = board.rank(current_user.id)
     
     return render_template('contest_results.html',
                          contest=contest,
@@ -1947,6 +1885,69 @@ def contest_results(contest_id):
                          current_user_rank=current_user_rank,
                          user=current_user)
 
+# Rows on the live leaderboard
+LEADERBOARD_TOP = 10
+# How often a contest event stream checks the standings, and sends a clock tick
+STANDINGS_CHECK_SECONDS = 1.0
+CLOCK_TICK_SECONDS = 15
+
+def contest_clock(contest, end_time=None):
+    """Remaining time of a contest, as served to its timers"""
+    if not contest.is_live():
+        return {'remaining_seconds': 0, 'status': 'ended'}
+    remaining_seconds = int(((end_time or contest.get_end_time()) - datetime.utcnow()).total_seconds())
+    return {
+        'remaining_seconds': max(0, remaining_seconds),
+        'status': 'live' if remaining_seconds > 0 else 'ended'
+    }
+
+def contest_event_stream(contest):
+    """
+    The top of a contest's leaderboard, a full 'standings' event first and
+    then 'ranks' events carrying only the rows that changed, plus a clock
+    tick every CLOCK_TICK_SECONDS until the contest ends
+    """
+    end_time = contest.get_end_time()
+    yield 'retry: 3000\n\n'
+    started = time.monotonic()
+    next_tick = 0.0
+    version = sent = None
+    sent_count = 0
+    while time.monotonic() - started < SSE_MAX_SECONDS:
+        if time.monotonic() >= next_tick:
+            clock = contest_clock(contest, end_time)
+            db.session.rollback()  # Reading the contest opened a transaction; end it before idling
+            yield sse_event('clock', clock)
+            if clock['status'] == 'ended':
+                return
+            next_tick = time.monotonic() + CLOCK_TICK_SECONDS
+        
+        board = leaderboards.get(contest.id)
+        db.session.rollback()  # Hand the connection back while the stream idles
+        if board.version != version:
+            version = board.version
+            rows = board.snapshot(LEADERBOARD_TOP)
+            if sent is None:
+                yield sse_event('standings', {'rows': list(rows.values()), 'count': len(board)})
+            else:
+                diff = standings_diff(sent, rows)
+                if diff['rows'] or diff['removed'] or len(board) != sent_count:
+                    yield sse_event('ranks', dict(diff, count=len(board)))
+            sent, sent_count = rows, len(board)
+        time.sleep(STANDINGS_CHECK_SECONDS)
+
+@app.route('/api/contest/<int:contest_id>/events')
+@login_required
+def contest_events(contest_id):
+    """Server-sent event stream of a contest's leaderboard and clock"""
+    contest = Contest.query.get_or_404(contest_id)
+    db.session.rollback()
+    # When the server is busy the leaderboard polls the page instead
+    stream = limited_stream(contest_event_stream(contest), sse_event('busy', {}))
+    return Response(stream_with_context(stream),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/contest/<int:contest_id>/leaderboard')
 @login_required
 def contest_leaderboard(contest_id):
@@ -1956,14 +1957,9 @@ def contest_leaderboard(contest_id):
     if not contest.is_live():
         return redirect(url_for('contest_results', contest_id=contest_id))
     
-    # Get top 10 participants
-    top_participants = db.session.query(ContestParticipant, User).join(
-        User, ContestParticipant.user_id == User.id
-    ).filter(ContestParticipant.contest_id == contest_id).order_by(
-        ContestParticipant.total_score.desc(),
-        ContestParticipant.problems_solved.desc(),
-        ContestParticipant.last_submission.asc()
-    ).limit(10).all()
+    # Top rows and the viewer's rank come from the in-memory standings
+    board = leaderboards.get(contest_id)
+    top_participants = board.top(LEADERBOARD_TOP)
     
     # Calculate remaining time
     end_time = contest.get_end_time()
@@ -1972,6 +1968,8 @@ def contest_leaderboard(contest_id):
     return render_template('contest_leaderboard.html',
                          contest=contest,
                          top_participants=top_participants,
+                         participant_count=len(board),
+                         my_rank=board.rank(session['user_id']),
                          remaining_seconds=max(0, remaining_seconds))
 
 @app.route('/api/contest/<int:contest_id>/time_remaining')
@@ -1979,17 +1977,7 @@ def contest_leaderboard(contest_id):
 def contest_time_remaining(contest_id):
     """API endpoint to get remaining time for contest"""
     contest = Contest.query.get_or_404(contest_id)
-    
-    if not contest.is_live():
-        return jsonify({'remaining_seconds': 0, 'status': 'ended'})
-    
-    end_time = contest.get_end_time()
-    remaining_seconds = int((end_time - datetime.utcnow()).total_seconds())
-    
-    return jsonify({
-        'remaining_seconds': max(0, remaining_seconds),
-        'status': 'live' if remaining_seconds > 0 else 'ended'
-    })
+    return jsonify(contest_clock(contest))
 
 @app.route('/notifications')
 @login_required
@@ -0,0 +1,572 @@
+import os
+import sys
+import fcntl
+import queue
+import time
+import socket
+import logging
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from code_executor import CodeExecutor, CancelToken, skipped_result, cancelled_result, wall_limit
+
+# Extra seconds a worker may take beyond the run's own time limit before the
+# pool assumes it is wedged and replaces it
+WORKER_GRACE_SECONDS = 15
+# Upper bound on compiling a submission inside a worker
+COMPILE_TIMEOUT_SECONDS = 10
+# JVMs need far more memory than other runtimes, so fewer run at once
+DEFAULT_LANGUAGE_CAPS = {'java': 2}
+# How often a job waiting for an idle worker re-checks that the pool still has workers
+WORKER_POLL_SECONDS = 1.0
+# Least time between attempts to replace a worker that could not be restarted
+RESTART_RETRY_SECONDS = 5.0
+# Per-core lock files through which the processes on a host claim disjoint cores
+CPU_LOCK_DIR = os.path.join(tempfile.gettempdir(), 'codetrack-cpu-locks')
+
+
+class SandboxWorker:
+    """A pre-started judge worker process.
+    
+    The worker is a long-lived Python interpreter with CodeExecutor already
+    imported. Each job arrives over a private socket and is executed in an
+    isolated child forked from the worker, so no run pays interpreter startup.
+    When cpus is given the worker, and every run it starts, is restricted to
+    those cores.
+    """
+    
+    def __init__(self, cpus: Optional[List[int]] = None):
+        parent_sock, child_sock = socket.socketpair()
+        child_fd = child_sock.fileno()
+        self.cpus = cpus
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'sandbox_pool', str(child_fd)] + ([','.join(map(str, cpus))] if cpus else []),
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stdin=subprocess.DEVNULL,
+            pass_fds=(child_fd,)
+        )
+        child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+        self.runs = 0
+        self._send_lock = threading.Lock()
+    
+    def call(self, method: str, args: tuple, kwargs: dict, timeout: float,
+             cancel_token: Optional[CancelToken] = None,
+             on_progress: Optional[Callable[[int, Dict[str, Any]], None]] = None,
+             on_check: Optional[Callable[[int, str], Dict[str, Any]]] = None):
+        """Run an executor method in the worker and return its result
+        
+        With on_progress the worker streams ('progress', index, summary)
+        messages ahead of the result, one per finished run. With on_check the
+        worker sends ('check', index, stdout path) after each successful run
+        and waits for the check result, so outputs are checked in this process.
+        """
+        if on_progress is not None:
+            kwargs = dict(kwargs, stream_progress=True)
+        if on_check is not None:
+            kwargs = dict(kwargs, remote_check=True)
+        deadline = time.monotonic() + timeout
+        with self._send_lock:
+            self.conn.send((method, args, kwargs))
+        # Watch the token only once the job is sent, so a cancel message can
+        # never overtake it; unregistering waits for a cancel in progress
+        stop_watching = cancel_token.on_cancel(self.cancel) if cancel_token else None
+        try:
+            if cancel_token is not None and cancel_token.cancelled:
+                self.cancel()
+            while True:
+                if not self.conn.poll(max(0.0, deadline - time.monotonic())):
+                    raise TimeoutError('Sandbox worker did not respond')
+                result = self.conn.recv()
+                if isinstance(result, tuple) and result[0] == 'progress':
+                    on_progress(result[1], result[2])
+                elif isinstance(result, tuple) and result[0] == 'check':
+                    check_start = time.monotonic()
+                    checked = on_check(result[1], result[2])
+                    deadline += time.monotonic() - check_start  # Checking is not the worker's time
+                    with self._send_lock:
+                        self.conn.send(('checked', checked))
+                else:
+                    break
+        finally:
+            if stop_watching:
+                stop_watching()
+        # A batch counts once per run towards recycling
+        self.runs += len(result) if isinstance(result, list) else 1
+        return result
+    
+    def cancel(self):
+        """Ask the worker to kill the run it is executing and skip the rest of the job"""
+        try:
+            with self._send_lock:
+                self.conn.send('cancel')
+        except (OSError, ValueError):
+            pass
+    
+    def is_alive(self) -> bool:
+        return self.process.poll() is None
+    
+    def stop(self):
+        """Stop the worker, killing it if it does not exit promptly"""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        try:
+            self.process.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.conn.close()
+
+
+class ConcurrencyLimits:
+    """Global CPU budget plus per-language caps on concurrent sandbox runs.
+    
+    A run holds one slot of its language and one slot of the global budget
+    for as long as it executes. Language slots are always taken first so
+    runs can never deadlock on each other.
+    """
+    
+    def __init__(self, cpu_budget: int, language_caps: Optional[Dict[str, int]] = None):
+        self.cpu_budget = cpu_budget
+        self.language_caps = language_caps or {}
+        self._global = threading.BoundedSemaphore(cpu_budget)
+        self._languages = {
+            language: threading.BoundedSemaphore(cap)
+            for language, cap in self.language_caps.items()
+        }
+    
+    def max_parallel(self, language: str) -> int:
+        """Most runs of a language that may execute at once"""
+        return min(self.cpu_budget, self.language_caps.get(language, self.cpu_budget))
+    
+    @contextmanager
+    def slot(self, language: str):
+        language_slot = self._languages.get(language)
+        if language_slot:
+            language_slot.acquire()
+        try:
+            with self._global:
+                yield
+        finally:
+            if language_slot:
+                language_slot.release()
+    
+    @staticmethod
+    def from_env(default_budget: int):
+        """Build limits from JUDGE_CPU_BUDGET and JUDGE_LANGUAGE_CAPS ("java=2,cpp=4")"""
+        cpu_budget = int(os.environ.get('JUDGE_CPU_BUDGET', str(default_budget)))
+        caps = dict(DEFAULT_LANGUAGE_CAPS)
+        for item in os.environ.get('JUDGE_LANGUAGE_CAPS', '').split(','):
+            if '=' in item:
+                language, cap = item.split('=', 1)
+                caps[language.strip()] = int(cap)
+        return ConcurrencyLimits(max(1, cpu_budget), {k: max(1, v) for k, v in caps.items()})
+
+
+class WarmWorkerPool:
+    """Pool of warm, isolated sandbox workers for CodeExecutor.
+    
+    Workers are recycled after max_runs jobs so that leaks in a worker cannot
+    accumulate, and are replaced immediately if they crash or hang. A worker
+    that cannot be restarted is retried later; while the pool has no workers
+    at all, jobs fail with an error result instead of waiting. With cpus
+    (one core per worker) each worker is pinned to its own core, and its
+    replacements inherit that core, so parallel runs never share a core.
+    With shared_cpus instead, every worker may run on any of those cores.
+    """
+    
+    def __init__(self, size: int = 2, max_runs: int = 200, limits=None,
+                 cpus: Optional[List[int]] = None, shared_cpus: Optional[List[int]] = None):
+        self.size = size
+        self.max_runs = max_runs
+        self.limits = limits or ConcurrencyLimits(cpu_budget=size)
+        self.cpus = cpus
+        self.shared_cpus = shared_cpus
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._live = 0  # Workers idle or running a job
+        self._missing = []  # Core lists (or None) of workers that could not be restarted
+        self._restart_at = 0.0
+    
+    def start(self):
+        """Pre-start all workers"""
+        with self._lock:
+            if self._started:
+                return
+            for index in range(self.size):
+                self._idle.put(SandboxWorker([self.cpus[index]] if self.cpus else self.shared_cpus))
+            self._live = self.size
+            self._missing = []
+            self._started = True
+        if self.cpus:
+            pinning = f", pinned to cores {self.cpus}"
+        else:
+            pinning = f", sharing cores {self.shared_cpus}" if self.shared_cpus else ''
+        logging.info(f"Sandbox worker pool started with {self.size} workers{pinning}")
+    
+    def shutdown(self):
+        """Stop all idle workers"""
+        with self._lock:
+            self._started = False
+            while True:
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                worker.stop()
+        logging.info("Sandbox worker pool stopped")
+    
+    def execute(self, code: str, language: str, input_data: str = "",
+                time_limit: int = 5, memory_limit: int = 256) -> Dict[str, Any]:
+        """Execute code in a pool worker; same result dict as CodeExecutor"""
+        return self.execute_batch(code, language, [input_data], time_limit, memory_limit)[0]
+    
+    def precompile(self, code: str, language: str):
+        """Compile (or syntax check) a submission in a worker; see CodeExecutor.precompile"""
+        return self._dispatch('precompile', (code, language), {},
+                              COMPILE_TIMEOUT_SECONDS + WORKER_GRACE_SECONDS) or None
+    
+    def execute_batch(self, code: str, language: str, inputs: List[str],
+                      time_limit: int = 5, memory_limit: int = 256,
+                      checker: Optional[Callable[[int, str], Dict[str, Any]]] = None,
+                      stop_on_failure: bool = False,
+                      cancel_token: Optional[CancelToken] = None,
+                      on_progress: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        """
+        Run every input, fanning contiguous chunks out across workers
+        
+        The number of chunks is bounded by the language's concurrency cap, the
+        global CPU budget and the pool size. Results are returned in input
+        order regardless of which chunk finishes first. With stop_on_failure
+        each chunk stops at its own first failure and every result after the
+        first failure overall is reported as skipped, so the outcome does not
+        depend on how the tests were split. on_progress is called from the
+        chunk threads, with indexes into inputs. checker (see
+        CodeExecutor.execute_batch) runs here rather than in the workers:
+        expected outputs never reach a process that submissions are forked
+        from, where user code could read them.
+        """
+        chunk_count = min(len(inputs), self.limits.max_parallel(language), self.size)
+        if chunk_count <= 1:
+            return self._run_chunk(code, language, inputs, time_limit, memory_limit,
+                                   checker, stop_on_failure, cancel_token, on_progress)
+        
+        # Compile once up front so the chunks all hit the compile cache (for
+        # Python this is the syntax check) and a broken submission fails once
+        error = self._dispatch('precompile', (code, language), {},
+                               COMPILE_TIMEOUT_SECONDS + WORKER_GRACE_SECONDS, cancel_token)
+        if error:
+            return [dict(error) for _ in inputs]
+        
+        chunk_size = -(-len(inputs) // chunk_count)  # Ceiling division
+        offsets = range(0, len(inputs), chunk_size)
+        with ThreadPoolExecutor(max_workers=len(offsets)) as chunk_executor:
+            futures = [chunk_executor.submit(self._run_chunk, code, language,
+                                             inputs[i:i + chunk_size], time_limit, memory_limit,
+                                             self._offset_checker(checker, i), stop_on_failure,
+                                             cancel_token, self._offset_progress(on_progress, i))
+                       for i in offsets]
+            results = []
+            for future in futures:
+                results.extend(future.result())
+        
+        if stop_on_failure and checker is not None:
+            for index, result in enumerate(results):
+                if result['status'] != 'success' or not result['passed']:
+                    results[index + 1:] = [skipped_result() for _ in results[index + 1:]]
+                    break
+        return results
+    
+    @staticmethod
+    def _offset_progress(on_progress, offset: int):
+        """Progress callback for a chunk starting at offset, reporting indexes into the whole batch"""
+        if on_progress is None:
+            return None
+        return lambda index, summary: on_progress(offset + index, summary)
+    
+    @staticmethod
+    def _offset_checker(checker, offset: int):
+        """Output checker for a chunk starting at offset"""
+        if checker is None:
+            return None
+        return lambda index, path: checker(offset + index, path)
+    
+    def _run_chunk(self, code: str, language: str, inputs: List[str],
+                   time_limit: int, memory_limit: int,
+                   checker: Optional[Callable[[int, str], Dict[str, Any]]], stop_on_failure: bool,
+                   cancel_token: Optional[CancelToken] = None,
+                   on_progress=None) -> List[Dict[str, Any]]:
+        """Compile once and run inputs in one worker, one isolated run each"""
+        timeout = COMPILE_TIMEOUT_SECONDS + wall_limit(time_limit) * len(inputs) + WORKER_GRACE_SECONDS
+        on_check = None
+        messages = {}
+        if checker is not None:
+            def on_check(index: int, path: str) -> Dict[str, Any]:
+                # Mismatch messages quote the expected output, so the worker
+                # only gets the verdict; messages are attached below
+                try:
+                    checked = checker(index, path)
+                except Exception as e:
+                    # The worker is waiting for a reply, so it must get one
+                    logging.error(f"Output check failed: {e}")
+                    checked = {'passed': False, 'message': 'Could not check the output', 'window': ''}
+                messages[index] = checked['message']
+                return dict(checked, message='')
+        with self.limits.slot(language):
+            if cancel_token is not None and cancel_token.cancelled:
+                return [cancelled_result() for _ in inputs]  # Cancelled while waiting for a slot
+            result = self._dispatch('execute_batch', (code, language, inputs, time_limit, memory_limit,
+                                                      None, stop_on_failure),
+                                    {}, timeout, cancel_token, on_progress, on_check)
+        if isinstance(result, dict):
+            # Worker failure: the same error applies to every run
+            return [dict(result) for _ in inputs]
+        for index, message in messages.items():
+            if result[index].get('passed') is False:
+                result[index]['error'] = message
+        return result
+    
+    def _dispatch(self, method: str, args: tuple, kwargs: dict, timeout: float,
+                  cancel_token: Optional[CancelToken] = None, on_progress=None, on_check=None):
+        if not self._started:
+            self.start()
+        
+        worker = self._acquire()
+        if worker is None:
+            return self._worker_error('No judge worker is available, please try again')
+        try:
+            if cancel_token is not None and cancel_token.cancelled:
+                return cancelled_result()
+            return worker.call(method, args, kwargs, timeout, cancel_token, on_progress, on_check)
+        except (EOFError, OSError, TimeoutError) as e:
+            logging.error(f"Sandbox worker {worker.process.pid} failed: {e}")
+            worker.process.kill()
+            worker.runs = self.max_runs  # Force replacement below
+            return self._worker_error('Judge worker crashed, please try again')
+        finally:
+            self._release(worker)
+    
+    @staticmethod
+    def _worker_error(message: str) -> Dict[str, Any]:
+        return {
+            'success': False,
+            'status': 'error',
+            'output': '',
+            'error': message,
+            'execution_time': 0.0,
+            'memory_used': 0
+        }
+    
+    def _acquire(self) -> Optional[SandboxWorker]:
+        """Wait for an idle worker; None once the pool has no workers and cannot start any"""
+        while True:
+            self._replace_missing()
+            try:
+                return self._idle.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                with self._lock:
+                    if self._live == 0:
+                        return None
+    
+    def _replace_missing(self):
+        """Retry starting workers that could not be restarted, at most every RESTART_RETRY_SECONDS"""
+        with self._lock:
+            if not self._missing or time.monotonic() < self._restart_at:
+                return
+            self._restart_at = time.monotonic() + RESTART_RETRY_SECONDS
+            missing, self._missing = self._missing, []
+        for cpus in missing:
+            try:
+                worker = SandboxWorker(cpus)
+            except Exception as e:
+                logging.error(f"Could not restart sandbox worker: {e}")
+                with self._lock:
+                    self._missing.append(cpus)
+                continue
+            with self._lock:
+                self._live += 1
+            self._idle.put(worker)
+    
+    def _release(self, worker: SandboxWorker):
+        """Return a worker to the pool, recycling it if it is worn out or dead"""
+        if worker.runs >= self.max_runs or not worker.is_alive():
+            worker.stop()
+            try:
+                worker = SandboxWorker(worker.cpus)
+            except Exception as e:
+                logging.error(f"Could not restart sandbox worker: {e}")
+                with self._lock:
+                    self._live -= 1
+                    self._missing.append(worker.cpus)
+                return
+        self._idle.put(worker)
+
+
+def parse_cpu_list(text: str) -> List[int]:
+    """Parse a core list like "2-5,8" into [2, 3, 4, 5, 8]"""
+    cpus = []
+    for item in text.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        first, _, last = item.partition('-')
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def claim_cpus(cpus: List[int], size: Optional[int] = None, shared: bool = False) -> List[int]:
+    """
+    Claim up to size (default: all) of the given cores for this process
+    
+    A core is claimed by holding a lock on its file in CPU_LOCK_DIR for the
+    life of the process, and a process that exits releases its cores with it.
+    Pinned pools take exclusive locks, so a pinned core belongs to a single
+    process on the host (the web app's workers, every judge_worker.py).
+    Unpinned pools take shared locks on the cores they run on: they may share
+    those with each other, but keep pinned pools of other processes off them.
+    Cores another process holds are skipped.
+    """
+    os.makedirs(CPU_LOCK_DIR, exist_ok=True)
+    claimed = []
+    for cpu in cpus:
+        if size is not None and len(claimed) == size:
+            break
+        lock_file = open(os.path.join(CPU_LOCK_DIR, f'cpu-{cpu}.lock'), 'w')
+        try:
+            fcntl.flock(lock_file, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()  # Held by another process
+            continue
+        claimed.append((cpu, lock_file))
+    _cpu_locks.extend(lock_file for _, lock_file in claimed)
+    return [cpu for cpu, _ in claimed]
+
+
+def pool_cpus(size: Optional[int]) -> Tuple[int, List[int], bool]:
+    """
+    Size, cores and pinning of this process's pool, as (size, cores, pinned)
+    
+    JUDGE_PIN_CPUS is "auto" (the cores this process may use; the default),
+    "off", or an explicit core list such as "2-7". Pinned, each worker gets a
+    core of its own that no other process uses (see claim_cpus) and the pool
+    has one worker per core it could claim, never more than size. Unpinned
+    ("off"), the workers share the cores no other process has pinned, with
+    one worker per core unless size is given. Raises RuntimeError when no
+    core is free, rather than running on cores other pools were promised.
+    """
+    setting = os.environ.get('JUDGE_PIN_CPUS', 'auto').strip().lower()
+    if not hasattr(os, 'sched_setaffinity'):
+        return size or os.cpu_count() or 2, [], False  # No core affinity on this platform
+    pinned = setting != 'off'
+    cpus = sorted(os.sched_getaffinity(0)) if setting in ('auto', 'off') else parse_cpu_list(setting)
+    claimed = claim_cpus(cpus, size if pinned else None, shared=not pinned)
+    if not claimed:
+        raise RuntimeError(f"No free cores for sandbox workers: other processes hold all of {cpus}; "
+                           f"set JUDGE_POOL_SIZE or JUDGE_PIN_CPUS so each process gets a share")
+    if not pinned:
+        return size or len(claimed), claimed, False
+    if size is not None and len(claimed) < size:
+        logging.warning(f"Sandbox pool shrunk to {len(claimed)} workers: only cores {claimed} of {cpus} are free")
+    return len(claimed), claimed, True
+
+
+def _worker_main(fd: int, cpus: Optional[List[int]] = None):
+    """Entry point of a sandbox worker process"""
+    if cpus:
+        os.sched_setaffinity(0, cpus)  # Inherited by every run the worker starts
+    conn = Connection(fd)
+    executor = CodeExecutor(fork_python=True)
+    
+    cancel_seen = False
+    
+    def cancel_requested() -> bool:
+        # The parent sends nothing but cancel messages while a job is running,
+        # apart from the reply to a check request (see request_check)
+        nonlocal cancel_seen
+        while not cancel_seen and conn.poll():
+            cancel_seen = conn.recv() == 'cancel'
+        return cancel_seen
+    
+    def request_check(index: int, stdout_path: str) -> Dict[str, Any]:
+        # Expected outputs stay with the pool; it checks the output file and replies
+        nonlocal cancel_seen
+        conn.send(('check', index, stdout_path))
+        while True:
+            message = conn.recv()
+            if message == 'cancel':
+                cancel_seen = True
+            else:
+                return message[1]
+    
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+        if job == 'cancel':
+            continue  # Arrived after its job had already finished
+        
+        method, args, kwargs = job
+        cancel_seen = False
+        if kwargs.pop('stream_progress', False):
+            kwargs['on_progress'] = lambda index, summary: conn.send(('progress', index, summary))
+        if kwargs.pop('remote_check', False):
+            kwargs['checker'] = request_check
+        executor.cancel_token = CancelToken(poll=cancel_requested)
+        try:
+            result = getattr(executor, method)(*args, **kwargs)
+        except Exception as e:
+            result = {
+                'success': False,
+                'status': 'error',
+                'output': '',
+                'error': str(e),
+                'execution_time': 0.0,
+                'memory_used': 0
+            }
+        conn.send(result)
+    
+    conn.close()
+
+
+# Global pool instance
+worker_pool = None
+_pool_lock = threading.Lock()
+_cpu_locks = []  # Lock files of the cores claimed by this process, held until exit
+
+def get_worker_pool() -> Optional[WarmWorkerPool]:
+    """
+    Return this process's worker pool, or None when JUDGE_POOL_SIZE is 0
+    
+    The pool is sized to the cores this process can claim (see pool_cpus);
+    JUDGE_POOL_SIZE caps it. While no core is free this raises RuntimeError,
+    and the next call tries again.
+    """
+    global worker_pool
+    setting = os.environ.get('JUDGE_POOL_SIZE', '').strip()
+    size = int(setting) if setting else None
+    if size is not None and size <= 0:
+        return None
+    with _pool_lock:
+        if worker_pool is None:
+            size, cpus, pinned = pool_cpus(size)
+            worker_pool = WarmWorkerPool(size=size,
+                                         max_runs=int(os.environ.get('JUDGE_WORKER_MAX_RUNS', '200')),
+                                         limits=ConcurrencyLimits.from_env(default_budget=size),
+                                         cpus=cpus if pinned else None,
+                                         shared_cpus=cpus if not pinned and cpus else None)
+    return worker_pool
+
+
+if __name__ == '__main__':
+    _worker_main(int(sys.argv[1]), parse_cpu_list(sys.argv[2]) if len(sys.argv) > 2 else None)
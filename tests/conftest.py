@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Runs in the tests use private temporary directories, never the host's
+# shared caches, workspaces or runner JVMs
+os.environ.setdefault('JUDGE_COMPILE_CACHE_MB', '0')
+os.environ.setdefault('JUDGE_WORKSPACES', '0')
+os.environ.setdefault('JUDGE_JVM_RUNNER', '0')
+
+
+@pytest.fixture
+def database():
+    """
+    The app's database session, for tests of code that runs SQL
+    
+    The app only runs on Postgres, so these tests are skipped unless
+    DATABASE_URL points at one (a throwaway database: tables are created).
+    """
+    pytest.importorskip('flask_sqlalchemy')
+    if not os.environ.get('DATABASE_URL'):
+        pytest.skip('DATABASE_URL is not set')
+    from app import app, db
+    with app.app_context():
+        yield db
+        db.session.rollback()
@@ -0,0 +1,71 @@
+import shutil
+
+import pytest
+
+import code_executor
+from code_executor import CodeExecutor, is_failed_run
+
+ECHO_SUM = 'a, b = map(int, input().split())\nprint(a + b)\n'
+
+
+@pytest.fixture
+def executor():
+    return CodeExecutor()
+
+
+def test_accepted_and_wrong_answer(executor):
+    results = executor.execute_batch(ECHO_SUM, 'python', ['1 2\n', '2 2\n'],
+                                     time_limit=2, expected_outputs=['3', '5'])
+    assert [result['status'] for result in results] == ['success', 'success']
+    assert results[0]['passed'] and results[0]['output'] == '3'
+    assert not results[1]['passed']
+    assert results[1]['error'] == "Wrong answer at token 1: expected '5', got '4'"
+
+
+def test_runtime_error(executor):
+    result = executor.execute_code('raise ValueError("boom")', 'python', time_limit=2)
+    assert result['status'] == 'runtime_error'
+    assert 'ValueError: boom' in result['error']
+
+
+def test_time_limit_exceeded(executor):
+    result = executor.execute_code('while True:\n    pass\n', 'python', time_limit=1)
+    assert result['status'] == 'time_limit_exceeded'
+
+
+def test_memory_limit_exceeded(executor):
+    result = executor.execute_code('data = bytearray(512 * 1024 * 1024)', 'python',
+                                   time_limit=2, memory_limit=64)
+    assert result['status'] == 'memory_limit_exceeded'
+
+
+def test_output_limit_exceeded(executor, monkeypatch):
+    monkeypatch.setattr(code_executor, 'OUTPUT_LIMIT_BYTES', 1024 * 1024)
+    result = executor.execute_code('import sys\nwhile True:\n    sys.stdout.write("x" * 4096)\n',
+                                   'python', time_limit=2)
+    assert result['status'] == 'output_limit_exceeded'
+
+
+def test_stop_on_failure_skips_the_rest(executor):
+    results = executor.execute_batch(ECHO_SUM, 'python', ['1 1\n', '1 2\n', '2 2\n'], time_limit=2,
+                                     expected_outputs=['3', '3', '4'], stop_on_failure=True)
+    assert not results[0]['passed']
+    assert [result['status'] for result in results[1:]] == ['skipped', 'skipped']
+
+
+@pytest.mark.skipif(shutil.which('gcc') is None, reason='gcc is not installed')
+def test_compilation_error_applies_to_every_run(executor):
+    results = executor.execute_batch('int main() { return x; }', 'c', ['', ''], time_limit=2)
+    assert [result['status'] for result in results] == ['compilation_error', 'compilation_error']
+    assert results[0]['error_line'] == 1
+
+
+def test_unsupported_language(executor):
+    result = executor.execute_code('', 'cobol')
+    assert result['status'] == 'error'
+
+
+def test_is_failed_run():
+    assert is_failed_run({'status': 'runtime_error'}, '1')
+    assert is_failed_run({'status': 'success', 'passed': False, 'output': '1'}, '1')
+    assert not is_failed_run({'status': 'success', 'output': '1 \n'}, '1')
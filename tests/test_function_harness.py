@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from code_executor import CodeExecutor
+from function_harness import (build_harness, check_harness_report, parse_harness_results,
+                              parse_signature)
+
+ADD = {'function': 'solution', 'params': [{'name': 'a', 'type': 'int'}, {'name': 'b', 'type': 'int'}]}
+
+
+def run_harness(code, inputs, expected_outputs, stop_on_failure=False):
+    """Judge a function-style solution the way JudgeService.run_tests does"""
+    source, stdin_data = build_harness(code, ADD, inputs, 2, stop_on_failure)
+    report = {}
+    
+    def check_report(index, path):
+        report.update(check_harness_report(path, expected_outputs))
+        return {'passed': True, 'message': '', 'window': ''}
+    
+    result = CodeExecutor().execute_batch(source, 'python', [stdin_data], 2 * len(inputs), 256,
+                                          checker=check_report)[0]
+    return parse_harness_results(result, report, len(inputs), stop_on_failure)
+
+
+def test_parse_signature():
+    assert parse_signature('') is None
+    assert parse_signature(json.dumps(ADD)) == ADD
+    with pytest.raises(ValueError):
+        parse_signature('{"params": [{"name": "a", "type": "matrix"}]}')
+    with pytest.raises(ValueError):
+        parse_signature('{"function": "not valid", "params": []}')
+
+
+def test_verdict_per_call():
+    code = 'def solution(a, b):\n    if a < 0:\n        raise ValueError("negative")\n    return a + b\n'
+    results = run_harness(code, ['1 2', '2 2', '-1 0'], ['3', '5', '0'])
+    assert results[0]['status'] == 'success' and results[0]['passed']
+    assert results[1]['status'] == 'success' and not results[1]['passed']
+    assert results[1]['error'] == 'Wrong answer'
+    assert results[2]['status'] == 'runtime_error'
+
+
+def test_stop_on_failure_skips_after_a_wrong_answer():
+    results = run_harness('def solution(a, b):\n    return a - b\n', ['1 1', '2 1'], ['2', '1'],
+                          stop_on_failure=True)
+    assert not results[0]['passed']
+    assert results[1]['status'] == 'skipped'
+
+
+def test_missing_function_fails_every_test():
+    results = run_harness('def other(a, b):\n    return 0\n', ['1 2', '3 4'], ['3', '7'])
+    assert [result['status'] for result in results] == ['runtime_error', 'runtime_error']
+
+
+def test_unreported_tests_take_the_run_status():
+    run = {'status': 'time_limit_exceeded', 'error': 'Time limit exceeded (2s)', 'memory_used': 0}
+    report = {'tests': [{'i': 0, 'status': 'success', 'passed': True, 'time': 0.1, 'cpu': 0.1}]}
+    results = parse_harness_results(run, report, 2)
+    assert results[0]['passed']
+    assert results[1]['status'] == 'time_limit_exceeded'
+
+
+def test_unreadable_report_is_empty(tmp_path):
+    path = tmp_path / 'report.json'
+    path.write_text('{"tests": [')
+    assert check_harness_report(str(path), ['1']) == {}
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def board(database):
+    from leaderboard_index import LeaderboardIndex
+    return LeaderboardIndex(contest_id=1)
+
+
+def user(user_id):
+    return {'id': user_id, 'username': f'user{user_id}', 'email': f'user{user_id}@example.com'}
+
+
+def standings(board):
+    return [participant['user_id'] for participant, _ in board.top()]
+
+
+def test_ordering(board):
+    board.update(1, 200, 2, START + timedelta(minutes=3), user(1))
+    board.update(2, 300, 2, START + timedelta(minutes=9), user(2))  # Highest score
+    board.update(3, 200, 3, START + timedelta(minutes=8), user(3))  # Same score, more solved
+    board.update(4, 200, 2, START + timedelta(minutes=1), user(4))  # Earlier last submission
+    board.update(5, 200, 2, START + timedelta(minutes=3), user(5))  # Full tie: lower user id first
+    board.update(6, None, None, None, user(6))  # Not scored yet
+    assert standings(board) == [2, 3, 4, 1, 5, 6]
+    assert [board.rank(user_id) for user_id in (2, 4, 6)] == [1, 3, 6]
+    assert board.rank(99) is None
+
+
+def test_moving_a_participant(board):
+    board.update(1, 100, 1, START, user(1))
+    board.update(2, 50, 1, START, user(2))
+    version = board.version
+    assert board.update(2, 150, 2, START + timedelta(minutes=5), user(2))
+    assert standings(board) == [2, 1]
+    assert board.version == version + 1
+    assert len(board) == 2
+    # Rewriting the same standing changes nothing
+    assert not board.update(2, 150, 2, START + timedelta(minutes=5), user(2))
+    assert board.version == version + 1
+
+
+def test_snapshot_and_diff(board):
+    from leaderboard_index import standings_diff
+    board.update(1, 100, 1, START, user(1))
+    board.update(2, 90, 1, START, user(2))
+    board.update(3, 80, 1, START, user(3))
+    before = board.snapshot(2)
+    assert before[1] == [1, 1, 100, 1, '12:00:00', 'user1', 'user1@example.com']
+    
+    board.update(3, 120, 2, START + timedelta(minutes=1), user(3))
+    after = board.snapshot(2)
+    diff = standings_diff(before, after)
+    assert sorted(row[0] for row in diff['rows']) == [1, 3]  # 3 entered, 1 moved down
+    assert diff['removed'] == [2]
@@ -0,0 +1,69 @@
+import io
+
+from output_checker import check_output, iter_tokens, tokens_equal, TOKEN_PREVIEW_CHARS
+
+
+def write_output(tmp_path, data):
+    path = tmp_path / 'stdout.txt'
+    path.write_bytes(data if isinstance(data, bytes) else data.encode())
+    return str(path)
+
+
+def test_whitespace_is_ignored(tmp_path):
+    path = write_output(tmp_path, '1  2\n\n3\t\r\n')
+    assert check_output(path, '1 2 3\n')['passed']
+
+
+def test_empty_output_matches_empty_expected(tmp_path):
+    assert check_output(write_output(tmp_path, '\n'), '')['passed']
+
+
+def test_wrong_token_reports_position_and_window(tmp_path):
+    result = check_output(write_output(tmp_path, '1 2 4\n'), '1 2 3')
+    assert not result['passed']
+    assert result['message'] == "Wrong answer at token 3: expected '3', got '4'"
+    assert '4' in result['window']
+
+
+def test_extra_output(tmp_path):
+    result = check_output(write_output(tmp_path, '1 2 3 4'), '1 2 3')
+    assert not result['passed']
+    assert 'unexpected extra output' in result['message']
+
+
+def test_missing_output(tmp_path):
+    result = check_output(write_output(tmp_path, '1 2'), '1 2 3')
+    assert not result['passed']
+    assert result['message'].startswith('Wrong answer: output ended after 2 tokens')
+
+
+def test_float_tolerance_absolute_and_relative():
+    assert tokens_equal(b'0.3333', b'0.33333333', 1e-3)
+    assert tokens_equal(b'1000001', b'1000000', 1e-6)  # Relative error
+    assert not tokens_equal(b'0.34', b'0.3333', 1e-3)
+    assert not tokens_equal(b'0.3333', b'0.33333333')  # Exact without a tolerance
+    assert not tokens_equal(b'abc', b'abd', 1e-3)
+
+
+def test_float_tolerance_keeps_long_numbers_whole(tmp_path):
+    # With a tolerance tokens are not cut, so extra digits still compare as numbers
+    digits = '0.' + '3' * 200
+    assert check_output(write_output(tmp_path, digits), '0.333333', 1e-6)['passed']
+
+
+def test_over_long_token_is_cut_and_previewed(tmp_path):
+    result = check_output(write_output(tmp_path, 'x' * 100000 + ' 2'), 'y 2')
+    assert not result['passed']
+    assert result['message'].endswith("got '" + 'x' * TOKEN_PREVIEW_CHARS + "...'")
+
+
+def test_tokens_split_across_chunks_keep_their_offsets():
+    data = b'ab  cdef\ng hijk '
+    tokens = list(iter_tokens(io.BytesIO(data), chunk_size=3))
+    assert tokens == [(b'ab', 0), (b'cdef', 4), (b'g', 9), (b'hijk', 11)]
+
+
+def test_over_long_token_across_chunks_is_cut_once():
+    data = b'a ' + b'z' * 50 + b' b'
+    tokens = list(iter_tokens(io.BytesIO(data), chunk_size=4, max_token=5))
+    assert tokens == [(b'a', 0), (b'z' * 6, 2), (b'b', 53)]
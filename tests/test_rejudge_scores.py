@@ -0,0 +1,100 @@
+from datetime import datetime
+from types import SimpleNamespace
+from uuid import uuid4
+
+import pytest
+
+
+@pytest.fixture
+def contest(database):
+    """A contest with two problems and two participants, removed afterwards"""
+    from models import (User, Contest, ContestProblem, ContestParticipant, ContestProblemScore,
+                        ContestSubmission)
+    db = database
+    suffix = uuid4().hex[:8]
+    users = [User(username=f'score-test-{suffix}-{i}', email=f'score-test-{suffix}-{i}@example.com',
+                  password_hash='-') for i in range(2)]
+    db.session.add_all(users)
+    db.session.flush()
+    contest = Contest(title=f'Score test {suffix}', start_date=datetime.utcnow(), duration_minutes=60,
+                      created_by=users[0].id)
+    db.session.add(contest)
+    db.session.flush()
+    problems = [ContestProblem(contest_id=contest.id, title=f'Problem {i}', description='-', points=100)
+                for i in range(2)]
+    db.session.add_all(problems)
+    db.session.add_all(ContestParticipant(contest_id=contest.id, user_id=u.id) for u in users)
+    db.session.commit()
+    
+    yield SimpleNamespace(id=contest.id, users=[u.id for u in users], problems=[p.id for p in problems])
+    
+    db.session.rollback()
+    for model in (ContestProblemScore, ContestSubmission, ContestParticipant):
+        model.query.filter_by(contest_id=contest.id).delete(synchronize_session=False)
+    ContestProblem.query.filter_by(contest_id=contest.id).delete(synchronize_session=False)
+    Contest.query.filter_by(id=contest.id).delete(synchronize_session=False)
+    User.query.filter(User.id.in_([u.id for u in users])).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def judged(contest, user_id, problem_id, score):
+    """A submission with its verdict folded into the scores, as judge_submission does"""
+    from app import db
+    from judge_service import JudgeService
+    from models import ContestSubmission
+    submission = ContestSubmission(contest_id=contest.id, problem_id=problem_id, user_id=user_id,
+                                   code='-', status='accepted' if score else 'wrong_answer',
+                                   score=score, submitted_at=datetime.utcnow())
+    db.session.add(submission)
+    db.session.flush()
+    JudgeService.update_participant_stats(submission)
+    return submission
+
+
+def totals(contest, user_id):
+    from app import db
+    from models import ContestParticipant
+    db.session.expire_all()
+    participant = ContestParticipant.query.filter_by(contest_id=contest.id, user_id=user_id).one()
+    return participant.total_score, participant.problems_solved
+
+
+def test_verdicts_keep_the_best_score_per_problem(contest):
+    first, second = contest.problems
+    user = contest.users[0]
+    judged(contest, user, first, 50)
+    judged(contest, user, first, 100)
+    judged(contest, user, first, 30)  # Lower than the best; no change
+    judged(contest, user, second, 0)
+    assert totals(contest, user) == (100, 1)
+    judged(contest, user, second, 100)
+    assert totals(contest, user) == (200, 2)
+    assert totals(contest, contest.users[1]) == (0, 0)
+
+
+def test_rejudge_lowers_scores_and_later_verdicts_apply_on_top(contest):
+    from app import db
+    from judge_service import JudgeService
+    from models import ContestProblemScore
+    first, second = contest.problems
+    user, other = contest.users
+    accepted = judged(contest, user, first, 100)
+    judged(contest, user, second, 100)
+    judged(contest, other, first, 100)
+    assert totals(contest, user) == (200, 2)
+    
+    # The rejudge finds the first problem's submission wrong
+    accepted.score = 0
+    accepted.status = 'wrong_answer'
+    db.session.commit()
+    JudgeService.recompute_participant_scores(contest.id)
+    db.session.commit()
+    assert totals(contest, user) == (100, 1)
+    assert totals(contest, other) == (100, 1)
+    best = ContestProblemScore.query.filter_by(contest_id=contest.id, user_id=user,
+                                               problem_id=first).one()
+    assert best.best_score == 0
+    
+    # A verdict after the rebuild counts from the rebuilt best score
+    judged(contest, user, first, 40)
+    assert totals(contest, user) == (140, 2)
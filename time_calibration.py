@@ -0,0 +1,93 @@
+import json
+import math
+import statistics
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from code_executor import TIME_LIMIT_MODE, is_failed_run
+
+# A language's limit is at least this many times its slowest reference run
+SAFETY_FACTOR = 2.0
+# Reference times below this mostly measure interpreter/JVM startup, so they
+# are raised to it before comparing languages
+MIN_REFERENCE_SECONDS = 0.05
+# No language gets more than this multiple of the problem's base limit
+MAX_MULTIPLIER = 5.0
+# Derived limits are rounded up to this step, in seconds
+LIMIT_STEP = 0.1
+
+
+def load_calibration(problem) -> Optional[Dict[str, Any]]:
+    """The problem's stored calibration, or None if it was never calibrated"""
+    if not problem.time_limit_calibration:
+        return None
+    return json.loads(problem.time_limit_calibration)
+
+
+def calibrated_limits(problem) -> Dict[str, float]:
+    """Per-language time limits in seconds; empty if the problem was never calibrated"""
+    calibration = load_calibration(problem)
+    return calibration['limits'] if calibration else {}
+
+
+def time_limit_for(problem, language: str) -> float:
+    """Time limit per test for a language: the calibrated one, else the problem's limit"""
+    return calibrated_limits(problem).get(language, problem.time_limit)
+
+
+def reference_seconds(rounds: List[List[Dict[str, Any]]]) -> float:
+    """
+    Slowest test of a reference solution, taking each test's median over the rounds
+    
+    Runs are timed on the clock limits are enforced on (execution_time: CPU
+    time in cpu mode, elapsed time in wall mode).
+    """
+    per_test = zip(*[[result['execution_time'] for result in results] for results in rounds])
+    return max((statistics.median(times) for times in per_test), default=0.0)
+
+
+def derive_limits(base_limit: float, references: Dict[str, float],
+                  safety_factor: float = SAFETY_FACTOR) -> Dict[str, Dict[str, float]]:
+    """
+    Per-language multipliers and limits from reference solution times
+    
+    The fastest language keeps the problem's base limit. Every other language
+    gets the base limit scaled by how much slower its reference solution ran,
+    capped at MAX_MULTIPLIER, and never less than safety_factor times its own
+    reference time.
+    """
+    if not references:
+        return {'limits': {}, 'multipliers': {}}
+    floored = {language: max(seconds, MIN_REFERENCE_SECONDS) for language, seconds in references.items()}
+    baseline = min(floored.values())
+    
+    limits, multipliers = {}, {}
+    for language, seconds in floored.items():
+        multiplier = min(MAX_MULTIPLIER, seconds / baseline)
+        limit = max(base_limit * multiplier, references[language] * safety_factor)
+        multipliers[language] = round(multiplier, 3)
+        limits[language] = round(math.ceil(limit / LIMIT_STEP - 1e-9) * LIMIT_STEP, 3)
+    return {'limits': limits, 'multipliers': multipliers}
+
+
+def measure_solution(run: Callable[[], List[Dict[str, Any]]], expected_outputs: List[str],
+                     rounds: int) -> Tuple[Optional[float], str]:
+    """
+    Run a reference solution rounds times over every test
+    
+    run judges the solution once over all tests and returns a result per
+    test, the way submissions are judged (see JudgeService.run_tests), so
+    function-style problems are measured through their harness.
+    
+    Returns:
+        (reference time in seconds, ''), or (None, reason) if the solution
+        failed a test
+    """
+    measured = []
+    for _ in range(rounds):
+        results = run()
+        for index, result in enumerate(results):
+            if is_failed_run(result, expected_outputs[index]):
+                reason = result['error'] or result['status']
+                return None, f"test {index + 1}: {result['status']}: {reason[:200]}"
+        measured.append(results)
+    return reference_seconds(measured), ''
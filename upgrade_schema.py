@@ -0,0 +1,76 @@
+"""
+Database upgrade script for the contest judge
+
+db.create_all() creates missing tables but never changes existing ones, so a
+database created before the judge queue, verdict cache, rejudges and live
+leaderboard were added lacks their columns. Run this once after deploying
+(it is safe to run again; every step is skipped if already applied):
+    
+    python upgrade_schema.py
+
+It adds the missing columns and indexes, fills in defaults for existing rows
+and builds the per-problem best-score table from existing submissions.
+"""
+from sqlalchemy import select, text
+
+from app import app, db
+from models import ContestProblemScore, ContestSubmission
+from judge_service import JudgeService
+
+# (table, column, type and default) added to tables that predate the judge
+COLUMNS = [
+    ('contest', 'judging_policy', "VARCHAR(30) DEFAULT 'score_all'"),
+    ('contest_problem', 'float_tolerance', 'DOUBLE PRECISION'),
+    ('contest_problem', 'test_version', 'INTEGER DEFAULT 1'),
+    ('contest_problem', 'function_signature', 'TEXT'),
+    ('contest_problem', 'time_limit_calibration', 'TEXT'),
+    ('contest_test_case', 'run_count', 'INTEGER DEFAULT 0'),
+    ('contest_test_case', 'fail_count', 'INTEGER DEFAULT 0'),
+    ('contest_submission', 'compile_error', 'TEXT'),
+    ('contest_submission', 'compile_error_line', 'INTEGER'),
+    ('contest_submission', 'compile_error_column', 'INTEGER'),
+    ('contest_submission', 'passed_tests', 'INTEGER DEFAULT 0'),
+    ('contest_submission', 'total_tests', 'INTEGER DEFAULT 0'),
+    ('contest_submission', 'tests_done', 'INTEGER DEFAULT 0'),
+    ('contest_submission', 'last_test_status', 'VARCHAR(30)'),
+    ('contest_submission', 'judge_worker', 'VARCHAR(100)'),
+    ('contest_submission', 'judge_started_at', 'TIMESTAMP'),
+    ('contest_submission', 'judged_at', 'TIMESTAMP'),
+    ('contest_submission', 'rejudge_job_id', 'INTEGER REFERENCES contest_rejudge_job (id)'),
+    ('contest_participant', 'score_updated_at', 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'),
+]
+
+INDEXES = [
+    ('ix_contest_submission_status', 'contest_submission', 'status'),
+    ('ix_contest_submission_rejudge_job_id', 'contest_submission', 'rejudge_job_id'),
+    ('ix_contest_participant_score_updated_at', 'contest_participant', 'score_updated_at'),
+]
+
+
+def upgrade():
+    """Bring an existing database up to the current models"""
+    # New tables first; added columns reference them
+    db.create_all()
+    
+    for table, column, definition in COLUMNS:
+        # With a DEFAULT, Postgres also fills the column in for existing rows
+        db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}'))
+    for name, table, column in INDEXES:
+        db.session.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})'))
+    db.session.commit()
+    print(f"Columns and indexes up to date ({len(COLUMNS)} columns, {len(INDEXES)} indexes checked)")
+    
+    # Best scores are kept incrementally from here on, so contests judged
+    # before the table existed get theirs rebuilt once
+    scored = select(ContestProblemScore.contest_id)
+    contest_ids = [row[0] for row in db.session.query(ContestSubmission.contest_id).filter(
+        ContestSubmission.contest_id.notin_(scored)).distinct()]
+    for contest_id in contest_ids:
+        JudgeService.recompute_participant_scores(contest_id)
+        db.session.commit()
+    print(f"Rebuilt best scores for {len(contest_ids)} contests")
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        upgrade()
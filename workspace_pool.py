@@ -0,0 +1,219 @@
+import os
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# Suffix of workspace directories currently handed out to a run
+BUSY_SUFFIX = '.busy'
+
+
+def default_workspace_root(required_bytes: int = 0) -> str:
+    """
+    Memory-backed /dev/shm, or the regular temp directory when /dev/shm is
+    missing, not writable or has less than required_bytes free
+    
+    Runs are stopped once their workspace grows past its cap (see
+    CodeExecutor._wait_for_child), which bounds the RAM a pool can take.
+    """
+    shm = '/dev/shm'
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        stats = os.statvfs(shm)
+        if stats.f_bavail * stats.f_frsize >= required_bytes:
+            return os.path.join(shm, 'codetrack-workspaces')
+    return os.path.join(tempfile.gettempdir(), 'codetrack-workspaces')
+
+
+def workspace_usage(path: str, limit: Optional[int] = None) -> int:
+    """Bytes allocated to the files under path; counting stops once past limit"""
+    used = 0
+    pending = [path]
+    while pending:
+        try:
+            entries = list(os.scandir(pending.pop()))
+        except OSError:
+            continue  # Removed or made unreadable by the run
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                else:
+                    used += entry.stat(follow_symlinks=False).st_blocks * 512
+            except OSError:
+                continue
+            if limit is not None and used > limit:
+                return used
+    return used
+
+
+class WorkspacePool:
+    """Pre-created sandbox directories that are wiped and reused between runs.
+    
+    Workspaces live under a shared root, by default on tmpfs, so compiling and
+    running a submission does no disk I/O and no directory churn. A busy
+    workspace is renamed with a '.busy' suffix, which lets any process read the
+    occupancy of every pool under the root (see workspace_occupancy).
+    
+    Each workspace may hold at most max_bytes: one is only handed out while the
+    filesystem has that much free space, runs are stopped once their workspace
+    grows past it (see CodeExecutor._wait_for_child) and a workspace that still
+    ends up larger is replaced. When every workspace is busy or the filesystem
+    is short on space, runs fall back to an ordinary temporary directory.
+    """
+    
+    def __init__(self, root: str, size: int = 2, max_bytes: int = 256 * 1024 * 1024):
+        self.root = root
+        self.size = size
+        self.max_bytes = max_bytes
+        self.overflow_count = 0
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._counter = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._remove_orphans()
+        for _ in range(size):
+            self._idle.put(self._create())
+    
+    def _create(self) -> str:
+        with self._lock:
+            self._counter += 1
+            path = os.path.join(self.root, f"{os.getpid()}-{self._counter}")
+        os.makedirs(path)
+        return path
+    
+    def _remove_orphans(self):
+        """Delete workspaces left behind by processes that no longer exist"""
+        for entry in os.scandir(self.root):
+            pid = entry.name.split('-', 1)[0]
+            if not pid.isdigit():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                shutil.rmtree(entry.path, ignore_errors=True)
+            except PermissionError:
+                pass  # Owned by a live process of another user
+    
+    def cap_for(self, path: str) -> Optional[int]:
+        """Size cap of a workspace handed out by this pool, or None for other directories"""
+        if os.path.dirname(path) == self.root and path.endswith(BUSY_SUFFIX):
+            return self.max_bytes
+        return None
+    
+    def _has_space(self) -> bool:
+        stats = os.statvfs(self.root)
+        return stats.f_bavail * stats.f_frsize >= self.max_bytes
+    
+    @contextmanager
+    def acquire(self):
+        """Yield an empty workspace directory for the duration of a run"""
+        try:
+            path = self._idle.get_nowait() if self._has_space() else None
+        except queue.Empty:
+            path = None
+        
+        if path is None:
+            with self._lock:
+                self.overflow_count += 1
+            with tempfile.TemporaryDirectory() as temp_dir:
+                yield temp_dir
+            return
+        
+        busy_path = path + BUSY_SUFFIX
+        os.rename(path, busy_path)
+        try:
+            yield busy_path
+        finally:
+            self._release(path, busy_path)
+    
+    def _release(self, path: str, busy_path: str):
+        try:
+            used = self._wipe(busy_path)
+            if used > self.max_bytes:
+                logging.warning(f"Workspace {path} held {used} bytes (cap {self.max_bytes}); replacing it")
+                shutil.rmtree(busy_path, ignore_errors=True)
+                path = self._create()
+            else:
+                os.rename(busy_path, path)
+        except OSError as e:
+            logging.error(f"Could not recycle workspace {path}: {e}")
+            shutil.rmtree(busy_path, ignore_errors=True)
+            try:
+                path = self._create()
+            except OSError:
+                return  # The pool shrinks; runs overflow to temporary directories
+        self._idle.put(path)
+    
+    def _wipe(self, path: str) -> int:
+        """Empty a workspace, returning how many bytes it held"""
+        used = 0
+        for entry in os.scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                used += sum(os.path.getsize(os.path.join(dirpath, name))
+                            for dirpath, _, names in os.walk(entry.path) for name in names)
+                shutil.rmtree(entry.path)
+            else:
+                used += entry.stat(follow_symlinks=False).st_size
+                os.unlink(entry.path)
+        return used
+    
+    def stats(self) -> Dict[str, Any]:
+        """Occupancy of this pool"""
+        idle = self._idle.qsize()
+        return {
+            'root': self.root,
+            'size': self.size,
+            'idle': idle,
+            'in_use': self.size - idle,
+            'overflow_total': self.overflow_count
+        }
+
+
+def workspace_occupancy(root: Optional[str] = None) -> Dict[str, Any]:
+    """Occupancy gauge across every pool sharing a workspace root"""
+    if root is None and workspace_pool is not None:
+        root = workspace_pool.root
+    root = root or os.environ.get('JUDGE_WORKSPACE_ROOT') or default_workspace_root()
+    total = busy = 0
+    try:
+        for entry in os.scandir(root):
+            total += 1
+            if entry.name.endswith(BUSY_SUFFIX):
+                busy += 1
+        stats = os.statvfs(root)
+        free_bytes = stats.f_bavail * stats.f_frsize
+    except OSError:
+        free_bytes = 0
+    return {
+        'root': root,
+        'workspaces': total,
+        'in_use': busy,
+        'occupancy': busy / total if total else 0.0,
+        'free_bytes': free_bytes
+    }
+
+
+# Global pool instance (one per process)
+workspace_pool = None
+_pool_lock = threading.Lock()
+
+def get_workspace_pool() -> Optional[WorkspacePool]:
+    """Return this process's workspace pool, or None when JUDGE_WORKSPACES is 0"""
+    global workspace_pool
+    size = int(os.environ.get('JUDGE_WORKSPACES', '2'))
+    if size <= 0:
+        return None
+    with _pool_lock:
+        if workspace_pool is None:
+            max_bytes = int(os.environ.get('JUDGE_WORKSPACE_MB', '256')) * 1024 * 1024
+            # tmpfs only if it can hold every workspace of the pool at its cap
+            root = os.environ.get('JUDGE_WORKSPACE_ROOT') or default_workspace_root(size * max_bytes)
+            try:
+                workspace_pool = WorkspacePool(root, size=size, max_bytes=max_bytes)
+            except OSError as e:
+                logging.error(f"Workspace pool unavailable, using temporary directories: {e}")
+                return None
+    return workspace_pool